@@ -0,0 +1,4 @@
+"""
+This package contains benchmarks for the deckr engine. They can be run
+without the rest of the webapp.
+"""
@@ -0,0 +1,113 @@
+"""
+Measures how much memory each game object costs. This counts the object, its
+attribute dictionary and any containers that belong only to that object;
+anything shared between instances (like card definitions) isn't counted.
+
+Run with:
+
+    python -m benchmarks.memory
+"""
+
+import sys
+
+from engine.card import Card
+from engine.card_set import CardSet
+from engine.game import Game
+from engine.game_object import GameObject
+from engine.player import Player
+from engine.zone import Zone
+
+CONTAINERS = (set, frozenset, dict, list)
+
+
+def object_overhead(obj, other):
+    """
+    Returns the number of bytes used by obj. other should be another instance
+    of the same class, which is used to figure out what is shared. Helper
+    objects that belong to obj (e.g. a zone's CardStack) are included, other
+    GameObjects are not.
+    """
+
+    size = sys.getsizeof(obj)
+    attributes = getattr(obj, "__dict__", {})
+    size += sys.getsizeof(attributes)
+    other_attributes = getattr(other, "__dict__", {})
+    for name, value in attributes.items():
+        other_value = other_attributes.get(name, None)
+        if value is other_value:
+            continue
+        if isinstance(value, CONTAINERS):
+            size += sys.getsizeof(value)
+        elif (hasattr(value, "__dict__") and
+              not isinstance(value, GameObject) and
+              type(value) is type(other_value)):
+            size += object_overhead(value, other_value)
+    return size
+
+
+def make_cards():
+    """
+    Create two registered cards from the same definition.
+    """
+
+    card_set = CardSet()
+    card_set.load_from_list([{"name": "Copper",
+                              "cost": 0,
+                              "card_type": ["treasure"],
+                              "effect": "+1 Money",
+                              "front_face": "/static/deckr/cards/copper.jpg",
+                              "back_face": "/static/deckr/cards/b1fv.png"}])
+    return card_set.create("Copper", 2)
+
+
+def make_players():
+    """
+    Create two players each with a few zones.
+    """
+
+    game = Game()
+    game.load_config({"max_players": 2,
+                      "zones": [{"name": "hand", "owner": "player"},
+                                {"name": "deck", "owner": "player"},
+                                {"name": "discard", "owner": "player"}]})
+    return [game.get_object_with_id("Player", game.add_player())
+            for _ in range(2)]
+
+
+def make_zones():
+    """
+    Create two empty zones.
+    """
+
+    return [Zone({"name": "zone"}), Zone({"name": "zone"})]
+
+
+def run():
+    """
+    Returns a dictionary mapping each class to its per object overhead in
+    bytes.
+    """
+
+    results = {}
+    game = Game()
+    for name, factory in [("Card", make_cards),
+                          ("Player", make_players),
+                          ("Zone", make_zones)]:
+        first, second = factory()
+        if first.game is None:
+            game.register([first, second])
+        results[name] = object_overhead(first, second)
+    return results
+
+
+def main():
+    """
+    Print out the overhead of each class.
+    """
+
+    for name, size in sorted(run().items()):
+        print "{0:<8} {1:>6} bytes".format(name, size)
+
+
+if __name__ == "__main__":
+    main()
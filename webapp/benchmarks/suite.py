@@ -0,0 +1,512 @@
+"""
+Times the hot paths of the engine: registering objects, substituting
+keyword arguments, making actions in real games, building the state, zone
+operations and serializing transitions. Each run is saved as JSON named
+after the current commit so runs can be compared later.
+
+Run with:
+
+    python -m benchmarks.suite run
+    python -m benchmarks.suite compare <old> <new> [--threshold 0.1]
+                                                   [--normalize]
+
+where <old> and <new> are commits (or paths to result files). compare exits
+with a non-zero status if anything got slower by more than the threshold.
+"""
+
+import argparse
+import gc
+import json
+import os.path
+import platform
+import random
+import subprocess
+import sys
+import time
+from timeit import default_timer
+
+from engine.card import Card
+from engine.game import Game
+from engine.game_runner import load_game_definition
+from engine.simulate import RandomAgent
+from engine.transitions import coalesce_transitions
+from engine.zone import Zone
+
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), "results")
+SIZES = (10, 100, 1000)
+STATE_SIZES = (52, 500, 2000)
+
+# Maps the name of a benchmark to a function returning (setup, run, number).
+# setup is called before each timed run and its result is passed to run.
+# number is how many operations one run performs.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    A decorator to add a function to BENCHMARKS.
+    """
+
+    def wrapper(func):
+        """
+        Part of the wrapper to make the decorator work.
+        """
+
+        BENCHMARKS[name] = func
+        return func
+    return wrapper
+
+
+def make_game(num_cards, num_players=2):
+    """
+    Create a game with some players and num_cards cards spread over a few
+    zones.
+    """
+
+    game = Game()
+    game.load_config({"max_players": num_players,
+                      "zones": [{"name": "deck"}, {"name": "discard"},
+                                {"name": "hand", "owner": "player"}]})
+    for _ in range(num_players):
+        game.add_player()
+    cards = [Card() for _ in range(num_cards)]
+    game.register(cards)
+    for i, card in enumerate(cards):
+        card.name = "card" + str(i % 13)
+        (game.deck if i % 2 == 0 else game.discard).push(card)
+    return game
+
+
+def fill_zone(size):
+    """
+    Create a registered zone holding size cards.
+    """
+
+    game = Game()
+    zone = Zone()
+    cards = [Card() for _ in range(size)]
+    game.register([zone] + cards)
+    for card in cards:
+        zone.push(card)
+    return zone, cards
+
+
+def record_game(game_definition, num_players, num_moves, seed=0):
+    """
+    Play the start of a game with random agents. Returns a copy of the game
+    right after set up and the list of moves that were made from there.
+    """
+
+    game, config = load_game_definition(game_definition)
+    game.load_config(config)
+    game.seed_random(seed)
+    for _ in range(num_players):
+        game.add_player()
+    game.set_up_wrapper()
+    start = copy_game(game)
+
+    rng = random.Random(seed)
+    agents = [RandomAgent(random.Random(seed + i))
+              for i in range(num_players)]
+    moves = []
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        while len(moves) < num_moves and not game.is_over():
+            players = list(zip(game.players, agents))
+            rng.shuffle(players)
+            move = None
+            for player, agent in players:
+                move = agent.choose(game, player)
+                if move is not None:
+                    break
+            if move is None:
+                break
+            try:
+                game.make_action(move[0], **dict(move[1]))
+            except Exception:  # pylint: disable=broad-except
+                # Replaying this would just fail again.
+                break
+            moves.append(move)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return start, moves
+
+
+def copy_game(game):
+    """
+    Clone a game, including where its random numbers are up to.
+    """
+
+    result = game.clone()
+    result.random.setstate(game.random.getstate())
+    return result
+
+
+@benchmark("register")
+def bench_register():
+    """
+    Register 1000 new cards with a game.
+    """
+
+    def setup():
+        """
+        A fresh game and fresh cards.
+        """
+        return Game(), [Card() for _ in range(1000)]
+
+    return setup, lambda args: args[0].register(args[1]), 1000
+
+
+@benchmark("substitute_kwargs")
+def bench_substitute_kwargs():
+    """
+    Substitute the ids a client would send in a typical action.
+    """
+
+    game = make_game(100)
+
+    def run(_):
+        """
+        Substitute 1000 sets of arguments.
+        """
+        for _ in range(1000):
+            game.substitute_kwargs({"card": "5", "cards": [1, 2, 3, 4],
+                                    "target_zone": 1, "player": 1,
+                                    "num": 3})
+
+    return lambda: None, run, 1000
+
+
+def bench_replay(game_definition, num_players, num_moves):
+    """
+    Replay recorded moves of a real game.
+    """
+
+    start, moves = record_game(game_definition, num_players, num_moves)
+
+    def run(game):
+        """
+        Make every move.
+        """
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            for name, kwargs in moves:
+                game.make_action(name, **dict(kwargs))
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    return lambda: copy_game(start), run, max(len(moves), 1)
+
+
+BENCHMARKS["make_action_dominion"] = lambda: bench_replay(
+    "game_defs/dominion", 2, 200)
+BENCHMARKS["make_action_hearts"] = lambda: bench_replay(
+    "game_defs/hearts", 4, 40)
+BENCHMARKS["make_action_solitaire"] = lambda: bench_replay(
+    "game_defs/solitaire", 1, 100)
+
+
+def bench_get_state(num_cards, cached):
+    """
+    Build the state a player sees. If cached is False every object has to
+    build its dictionary from scratch.
+    """
+
+    game = make_game(num_cards)
+    player_id = game.players[0].game_id
+    game.get_state(player_id)
+
+    def setup():
+        """
+        Throw away the cached dictionaries if needed.
+        """
+        if not cached:
+            game.state_cache_generation += 1
+
+    return setup, lambda _: game.get_state(player_id), 1
+
+
+for _size in STATE_SIZES:
+    BENCHMARKS["get_state_%d" % _size] = (
+        lambda size=_size: bench_get_state(size, False))
+    BENCHMARKS["get_state_cached_%d" % _size] = (
+        lambda size=_size: bench_get_state(size, True))
+
+
+def bench_zone(size, operation):
+    """
+    Time a zone operation on a zone holding size cards.
+    """
+
+    def run_push_pop(args):
+        """
+        Take the top card off and put it back.
+        """
+        zone = args[0]
+        for _ in range(100):
+            zone.push(zone.pop())
+
+    def run_remove(args):
+        """
+        Remove cards from the middle of the zone and put them back on top.
+        """
+        zone, cards = args
+        for card in cards[size // 4:size // 4 + min(size // 2, 100)]:
+            zone.remove_card(card)
+            zone.push(card)
+
+    def run_contains(args):
+        """
+        Check if cards are in the zone.
+        """
+        zone, cards = args
+        for card in cards[:100]:
+            card in zone  # pylint: disable=pointless-statement
+
+    def run_shuffle(args):
+        """
+        Shuffle the zone.
+        """
+        args[0].shuffle()
+
+    def run_set_cards(args):
+        """
+        Replace every card in the zone.
+        """
+        zone, cards = args
+        zone.set_cards(list(cards))
+
+    runs = {"push_pop": (run_push_pop, 100),
+            "remove": (run_remove, min(size // 2, 100)),
+            "contains": (run_contains, min(size, 100)),
+            "shuffle": (run_shuffle, 1),
+            "set_cards": (run_set_cards, 1)}
+    run, number = runs[operation]
+    # None of these change how many cards are in the zone, so the same zone
+    # can be used for every run.
+    args = fill_zone(size)
+    return lambda: args, run, number
+
+
+for _size in SIZES:
+    for _operation in ("push_pop", "remove", "contains", "shuffle",
+                       "set_cards"):
+        BENCHMARKS["zone_%s_%d" % (_operation, _size)] = (
+            lambda size=_size, operation=_operation: bench_zone(size,
+                                                                operation))
+
+
+@benchmark("serialize_transitions")
+def bench_serialize_transitions():
+    """
+    Coalesce and JSON encode the transitions of a busy action.
+    """
+
+    transitions = []
+    for i in range(50):
+        transitions.append(("remove", "Card", i, 1))
+        transitions.append(("add", "Card", i, 2))
+        transitions.append(("set", "Card", i, "face_up", True))
+        transitions.append(("set", "Player", 1, "money_pool", i))
+    transitions.append(("bulk_move", range(50), 3))
+
+    def run(_):
+        """
+        What happens to transitions between make_action and the socket.
+        """
+        json.dumps(coalesce_transitions(list(transitions)))
+
+    return lambda: None, run, 1
+
+
+@benchmark("calibration")
+def bench_calibration():
+    """
+    A fixed bit of plain Python that doesn't touch the engine. compare can
+    divide by this to take out differences between machines (or a busy
+    machine).
+    """
+
+    def run(_):
+        """
+        Build and sum some dictionaries.
+        """
+        total = 0
+        for i in range(1000):
+            item = {"id": i, "name": str(i)}
+            total += item["id"] + len(item["name"])
+        return total
+
+    return lambda: None, run, 1
+
+
+def measure(setup, run, repeat, min_time=0.05):
+    """
+    Returns the time of a single run in seconds. Runs are repeated until they
+    add up to at least min_time to get past the resolution of the timer, and
+    the best average of repeat tries is taken.
+    """
+
+    best = None
+    for _ in range(repeat):
+        total = 0.0
+        count = 0
+        while count == 0 or total < min_time:
+            args = setup()
+            # Like timeit, keep the garbage collector out of the timings.
+            gc.disable()
+            try:
+                start = default_timer()
+                run(args)
+                total += default_timer() - start
+            finally:
+                gc.enable()
+            count += 1
+        if best is None or total / count < best:
+            best = total / count
+    return best
+
+
+def run_benchmarks(names=None, repeat=5):
+    """
+    Run the given benchmarks (all of them by default). Returns a dictionary
+    mapping each name to the seconds per operation.
+    """
+
+    results = {}
+    for name in sorted(names or BENCHMARKS):
+        setup, run, number = BENCHMARKS[name]()
+        results[name] = measure(setup, run, repeat) / number
+    return results
+
+
+def current_commit():
+    """
+    The short hash of the checked out commit, or "unknown".
+    """
+
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def result_path(name, path=RESULTS_PATH):
+    """
+    Turn a commit (or a path to a result file) into a path.
+    """
+
+    if os.path.exists(name):
+        return name
+    return os.path.join(path, name + ".json")
+
+
+def save_results(results, commit, path=RESULTS_PATH):
+    """
+    Save results as <commit>.json in path. Returns the file name.
+    """
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    file_name = result_path(commit, path)
+    with open(file_name, "w") as fout:
+        json.dump({"commit": commit,
+                   "time": time.time(),
+                   "python": platform.python_version(),
+                   "results": results}, fout, indent=2, sort_keys=True)
+    return file_name
+
+
+def compare(old, new, threshold=0.1, normalize=False):
+    """
+    Compare two dictionaries of results. Returns a list of
+    (name, old, new, change) for every benchmark in both, where change is
+    the relative slowdown, and a list of the names of the regressions. If
+    normalize is True the new results are scaled by how much faster or
+    slower the calibration benchmark was.
+    """
+
+    if normalize and old.get("calibration") and new.get("calibration"):
+        scale = old["calibration"] / new["calibration"]
+        new = dict((x, y * scale) for x, y in new.iteritems())
+
+    rows = []
+    regressions = []
+    for name in sorted(set(old) & set(new)):
+        change = (new[name] - old[name]) / old[name] if old[name] else 0.0
+        rows.append((name, old[name], new[name], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+
+    parser = argparse.ArgumentParser(description="Engine benchmarks.")
+    commands = parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("names", nargs="*",
+                            help="Only run these benchmarks.")
+    run_parser.add_argument("--repeat", type=int, default=5,
+                            help="Take the best of this many runs.")
+    run_parser.add_argument("--commit", default=None,
+                            help="Save the results under this name instead "
+                                 "of the current commit.")
+    run_parser.add_argument("--output", default=RESULTS_PATH,
+                            help="Directory to save results in.")
+
+    compare_parser = commands.add_parser(
+        "compare", help="Compare two saved runs.")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Flag anything this much slower "
+                                     "(0.1 is 10%%).")
+    compare_parser.add_argument("--normalize", action="store_true",
+                                help="Scale by the calibration benchmark to "
+                                     "compare runs from different machines.")
+    compare_parser.add_argument("--output", default=RESULTS_PATH,
+                                help="Directory the results are saved in.")
+
+    options = parser.parse_args(argv)
+
+    if options.command == "run":
+        unknown = [x for x in options.names if x not in BENCHMARKS]
+        if unknown:
+            parser.error("unknown benchmarks: " + ", ".join(unknown))
+        results = run_benchmarks(options.names, options.repeat)
+        for name, seconds in sorted(results.items()):
+            print "{0:<32} {1:>12.3f} us".format(name, seconds * 1e6)
+        file_name = save_results(results, options.commit or current_commit(),
+                                 options.output)
+        print "Saved to " + file_name
+        return 0
+
+    runs = []
+    for name in (options.old, options.new):
+        with open(result_path(name, options.output)) as fin:
+            runs.append(json.load(fin)["results"])
+    rows, regressions = compare(runs[0], runs[1], options.threshold,
+                                options.normalize)
+    for name, old, new, change in rows:
+        flag = " <-- regression" if name in regressions else ""
+        print "{0:<32} {1:>12.3f} {2:>12.3f} {3:>+8.1%}{4}".format(
+            name, old * 1e6, new * 1e6, change, flag)
+    if regressions:
+        print "%d regressions over %.0f%%" % (len(regressions),
+                                              options.threshold * 100)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
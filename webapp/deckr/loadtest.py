@@ -0,0 +1,347 @@
+"""
+This module drives a running deckr server with lots of simulated clients so
+we can see how the socket code holds up under load. Each client speaks the
+socket.io 0.9 protocol over xhr-polling (just like a browser that can't use
+websockets) so all it needs is HTTP. Everything here expects gevent's monkey
+patching so that hundreds of clients can run at the same time.
+
+Use it through the loadtest management command.
+"""
+
+import cookielib
+import httplib
+import os
+import re
+import time
+import urllib
+import urllib2
+
+import gevent
+from gevent.event import Event
+from socketio import packet
+
+from engine.simulate import percentile
+
+NAMESPACE = "/game"
+
+
+def decode_payload(payload):
+    """
+    Split an xhr-polling payload into packets. Several packets are framed as
+    \\ufffd<length>\\ufffd<packet>.
+    """
+
+    payload = payload.decode("utf-8")
+    if not payload.startswith(u"\ufffd"):
+        return [payload]
+
+    packets = []
+    while len(payload) > 0:
+        end = payload.index(u"\ufffd", 1)
+        length = int(payload[1:end])
+        packets.append(payload[end + 1:end + 1 + length])
+        payload = payload[end + 1 + length:]
+    return packets
+
+
+class SocketIOClient(object):
+
+    """
+    A minimal socket.io 0.9 client using the xhr-polling transport. Events
+    for the game namespace are passed to on_event(name, args) along with the
+    time they arrived.
+    """
+
+    def __init__(self, base_url, on_event):
+        self.base_url = base_url.rstrip("/")
+        self.on_event = on_event
+        self.session_id = None
+        self.connected = Event()
+        self.poller = None
+
+    def url(self):
+        """
+        The url for this session.
+        """
+
+        return "%s/socket.io/1/xhr-polling/%s?t=%d" % (
+            self.base_url, self.session_id, int(time.time() * 1000))
+
+    def connect(self):
+        """
+        Handshake with the server, start polling and connect to the game
+        namespace.
+        """
+
+        response = urllib2.urlopen("%s/socket.io/1/?t=%d" % (
+            self.base_url, int(time.time() * 1000)))
+        self.session_id = response.read().split(":")[0]
+        self.poller = gevent.spawn(self.poll)
+        self.send({"type": "connect", "endpoint": NAMESPACE})
+        self.connected.wait(30)
+
+    def close(self):
+        """
+        Disconnect from the server.
+        """
+
+        if self.session_id is not None:
+            try:
+                self.send({"type": "disconnect", "endpoint": NAMESPACE})
+            except urllib2.URLError:
+                pass
+        if self.poller is not None:
+            self.poller.kill()
+
+    def send(self, data):
+        """
+        Send a single packet.
+        """
+
+        urllib2.urlopen(self.url(), packet.encode(data)).read()
+
+    def emit(self, name, *args):
+        """
+        Emit an event to the game namespace.
+        """
+
+        self.send({"type": "event", "name": name, "args": args,
+                   "endpoint": NAMESPACE})
+
+    def poll(self):
+        """
+        Keep polling the server for new packets until we're killed.
+        """
+
+        while True:
+            try:
+                payload = urllib2.urlopen(self.url()).read()
+            except urllib2.URLError:
+                return
+            now = time.time()
+            for raw in decode_payload(payload):
+                self.handle(packet.decode(raw), now)
+
+    def handle(self, data, now):
+        """
+        Deal with a single packet from the server.
+        """
+
+        if data["type"] == "heartbeat":
+            gevent.spawn(self.send, {"type": "heartbeat"})
+        elif data["type"] == "connect" and data["endpoint"] == NAMESPACE:
+            self.connected.set()
+        elif data["type"] == "event" and data["endpoint"] == NAMESPACE:
+            self.on_event(data["name"], data.get("args", []), now)
+
+
+class Stats(object):
+
+    """
+    Collects latencies (in seconds) by name.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = 0
+
+    def add(self, name, latency):
+        """
+        Record a single latency.
+        """
+
+        self.latencies.setdefault(name, []).append(latency)
+
+    def summary(self):
+        """
+        Returns a dictionary of name to (count, p50, p90, p99, max) in
+        milliseconds.
+        """
+
+        result = {}
+        for name, values in self.latencies.items():
+            values = sorted(values)
+            result[name] = (len(values),) + tuple(
+                percentile(values, x) * 1000 for x in (0.5, 0.9, 0.99, 1.0))
+        return result
+
+
+class SimulatedPlayer(object):
+
+    """
+    One player in a room. Sends events and times how long it takes for the
+    matching reply to arrive.
+    """
+
+    # The event that tells us a request has been handled.
+    replies = {"join": ("player_nick",),
+               "start": ("state",),
+               "action": ("action_update", "error"),
+               "request_state": ("state",),
+               "chat": ("chat",)}
+
+    def __init__(self, room, base_url, player_pk, stats):
+        self.room = room
+        self.player_pk = player_pk
+        self.stats = stats
+        self.client = SocketIOClient(base_url, self.on_event)
+        self.pending = {}
+
+    def on_event(self, name, args, now):
+        """
+        Match events up with the request that caused them.
+        """
+
+        if name == "error":
+            self.stats.errors += 1
+        for request, (start, done) in list(self.pending.items()):
+            if name in self.replies[request]:
+                self.stats.add(request, now - start)
+                del self.pending[request]
+                done.set()
+        # Everyone else in the room hears about actions through the same
+        # broadcast.
+        if name == "action_update" and self.room.action_start is not None:
+            self.stats.add("broadcast", now - self.room.action_start)
+
+    def request(self, name, *args):
+        """
+        Emit an event and wait for its reply.
+        """
+
+        done = Event()
+        self.pending[name] = (time.time(), done)
+        self.client.emit(name, *args)
+        if not done.wait(30):
+            self.pending.pop(name, None)
+            self.stats.add("timeout", 30)
+
+
+class SimulatedRoom(object):
+
+    """
+    A game room full of simulated players.
+    """
+
+    def __init__(self, loadtest, room_pk, player_pks):
+        self.loadtest = loadtest
+        self.room_pk = room_pk
+        self.action_start = None
+        self.players = [SimulatedPlayer(self, loadtest.base_url, x,
+                                        loadtest.stats)
+                        for x in player_pks]
+
+    def run(self, num_actions, action, think_time):
+        """
+        Connect everyone, start the game and then have every player make
+        num_actions actions, chatting and asking for the state now and then.
+        """
+
+        for player in self.players:
+            player.client.connect()
+            player.request("join", {"game_room_id": self.room_pk,
+                                    "player_id": player.player_pk})
+        self.players[0].request("start")
+
+        for i in range(num_actions):
+            for player in self.players:
+                gevent.sleep(think_time)
+                self.action_start = time.time()
+                player.request("action", dict(action))
+                if i % 5 == 0:
+                    player.request("chat", {"nickname": "load",
+                                            "message": "hello"})
+                if i % 10 == 0:
+                    player.request("request_state")
+
+        for player in self.players:
+            player.client.close()
+
+
+class LoadTest(object):
+
+    """
+    Creates rooms and players through the normal web pages and then plays
+    them all at once.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.stats = Stats()
+        self.opener = urllib2.build_opener(
+            urllib2.HTTPCookieProcessor(cookielib.CookieJar()))
+
+    def post_form(self, path, data):
+        """
+        Fill in a form like a browser would (including the CSRF token) and
+        return the url we got redirected to.
+        """
+
+        page = self.opener.open(self.base_url + path).read()
+        token = re.search(r"name=['\"]csrfmiddlewaretoken['\"] "
+                          r"value=['\"]([^'\"]+)['\"]", page).group(1)
+        data = dict(data, csrfmiddlewaretoken=token)
+        response = self.opener.open(self.base_url + path,
+                                    urllib.urlencode(data))
+        return response.geturl()
+
+    def create_room(self, game_definition_pk, num_players):
+        """
+        Create a room with some players. Returns (room pk, [player pks]).
+        """
+
+        url = self.post_form("/new_game_room/",
+                             {"game_id": game_definition_pk})
+        room_pk = int(re.search(r"/game_room_staging_area/(\d+)/",
+                                url).group(1))
+        player_pks = []
+        for i in range(num_players):
+            url = self.post_form(
+                "/game_room_staging_area/%d/" % room_pk,
+                {"nickname": "player%d" % i})
+            player_pks.append(int(re.search(r"player_id=(\d+)",
+                                            url).group(1)))
+        return room_pk, player_pks
+
+    def run(self, game_definition_pk, num_rooms, num_players, num_actions,
+            action, think_time=0.1):
+        """
+        Run the load test. Returns the pks of the rooms that were created.
+        """
+
+        rooms = [SimulatedRoom(self, *self.create_room(game_definition_pk,
+                                                       num_players))
+                 for _ in range(num_rooms)]
+        gevent.joinall([gevent.spawn(self.run_room, x, num_actions, action,
+                                     think_time)
+                        for x in rooms])
+        return [x.room_pk for x in rooms]
+
+    def run_room(self, room, num_actions, action, think_time):
+        """
+        Run a single room, counting it as an error if it falls over.
+        """
+
+        try:
+            room.run(num_actions, action, think_time)
+        except (httplib.HTTPException, IOError, ValueError):
+            self.stats.errors += 1
+
+
+def process_usage(pid):
+    """
+    Returns (cpu seconds, resident memory in bytes) for a process. Only works
+    on Linux; returns None elsewhere.
+    """
+
+    try:
+        with open("/proc/%d/stat" % pid) as fin:
+            fields = fin.read().rsplit(")", 1)[1].split()
+        with open("/proc/%d/statm" % pid) as fin:
+            resident = int(fin.read().split()[1])
+    except IOError:
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    # utime and stime are the 14th and 15th fields of stat.
+    cpu = (int(fields[11]) + int(fields[12])) / float(ticks)
+    return cpu, resident * os.sysconf("SC_PAGE_SIZE")
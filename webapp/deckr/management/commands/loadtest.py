@@ -0,0 +1,142 @@
+"""
+A management command to load test the socket server. It starts a
+socketio_runserver (unless --url points at one that's already running),
+creates rooms and players through the normal pages, and then has simulated
+clients join, start, make actions, chat and request the state all at once.
+"""
+
+import json
+from optparse import make_option
+import subprocess
+import sys
+import time
+import urllib2
+
+from django.core.management.base import BaseCommand, CommandError
+from gevent import monkey
+
+from deckr.loadtest import LoadTest, process_usage
+from deckr.models import GameDefinition, GameRoom
+
+
+class Command(BaseCommand):
+
+    """
+    Runs the load test and prints latencies and server usage.
+    """
+
+    help = "Simulate lots of concurrent game rooms against the socket server."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--rooms', type='int', dest='rooms', default=10,
+                    help='Number of game rooms to simulate.'),
+        make_option('--players', type='int', dest='players', default=2,
+                    help='Players in each room.'),
+        make_option('--actions', type='int', dest='actions', default=20,
+                    help='Actions made by each player.'),
+        make_option('--game', dest='game', default='Dominion',
+                    help='Name of the game definition to play.'),
+        make_option('--action', dest='action',
+                    default='{"action_name": "next_phase"}',
+                    help='JSON of the action every player sends.'),
+        make_option('--think-time', type='float', dest='think_time',
+                    default=0.1,
+                    help='Seconds each player waits between actions.'),
+        make_option('--port', type='int', dest='port', default=8765,
+                    help='Port to start the server on.'),
+        make_option('--url', dest='url', default=None,
+                    help='Use an already running server instead.'),
+        make_option('--server-pid', type='int', dest='server_pid',
+                    default=None,
+                    help='Pid of the server given by --url, to report its '
+                         'CPU and memory.'),
+        make_option('--keep-rooms', action='store_true', dest='keep_rooms',
+                    default=False,
+                    help='Do NOT delete the rooms afterwards.'),
+    )
+
+    def handle(self, *args, **options):
+        # Lets hundreds of clients wait on the server at once.
+        monkey.patch_socket()
+
+        try:
+            game_definition = GameDefinition.objects.get(
+                name=options['game'])
+        except GameDefinition.DoesNotExist:
+            raise CommandError('No game definition named "%s".' %
+                               options['game'])
+        try:
+            action = json.loads(options['action'])
+        except ValueError:
+            raise CommandError('--action must be JSON.')
+
+        server = None
+        url = options['url']
+        pid = options['server_pid']
+        if url is None:
+            url = 'http://127.0.0.1:%d' % options['port']
+            server = subprocess.Popen(
+                [sys.executable, sys.argv[0], 'socketio_runserver',
+                 '--noreload', '127.0.0.1:%d' % options['port']])
+            pid = server.pid
+            wait_for_server(url)
+
+        before = process_usage(pid) if pid is not None else None
+        load_test = LoadTest(url)
+        start = time.time()
+        room_pks = []
+        try:
+            room_pks = load_test.run(game_definition.pk, options['rooms'],
+                                     options['players'], options['actions'],
+                                     action, options['think_time'])
+        finally:
+            elapsed = time.time() - start
+            after = process_usage(pid) if pid is not None else None
+            if server is not None:
+                server.terminate()
+                server.wait()
+            if not options['keep_rooms']:
+                GameRoom.objects.filter(pk__in=room_pks).delete()
+
+        self.report(load_test.stats, options, elapsed, before, after)
+
+    def report(self, stats, options, elapsed, before, after):
+        """
+        Print out what we measured.
+        """
+
+        rooms = options['rooms']
+        self.stdout.write("%d rooms x %d players x %d actions in %.1fs "
+                          "(%d errors)" % (rooms, options['players'],
+                                           options['actions'], elapsed,
+                                           stats.errors))
+        self.stdout.write("%-16s %8s %10s %10s %10s %10s" % (
+            "event", "count", "p50 ms", "p90 ms", "p99 ms", "max ms"))
+        for name, row in sorted(stats.summary().items()):
+            self.stdout.write("%-16s %8d %10.2f %10.2f %10.2f %10.2f" % (
+                (name,) + row))
+
+        if before is not None and after is not None:
+            cpu = after[0] - before[0]
+            self.stdout.write(
+                "server cpu %.2fs (%.3fs per room), rss %.1f MB "
+                "(%+.1f MB, %+.1f KB per room)" % (
+                    cpu, cpu / rooms, after[1] / 1e6,
+                    (after[1] - before[1]) / 1e6,
+                    (after[1] - before[1]) / 1e3 / rooms))
+
+
+def wait_for_server(url, timeout=30):
+    """
+    Wait until the server answers.
+    """
+
+    deadline = time.time() + timeout
+    while True:
+        try:
+            urllib2.urlopen(url + '/').read()
+            return
+        except (urllib2.URLError, IOError):
+            if time.time() > deadline:
+                raise CommandError("The server didn't start.")
+            time.sleep(0.2)
@@ -20,6 +20,9 @@ from django.core.management.commands.runserver import DEFAULT_PORT, naiveip_re
 from django.utils.autoreload import code_changed, restart_with_reloader
 
 import coverage
+from deckr import metrics
+from deckr.utils import get_game_runner
+from engine import persistence, profiling, sharded_runner
 from socketio.server import SocketIOServer
 
 RELOAD = False
@@ -65,6 +68,36 @@ class Command(BaseCommand):
             dest='enable_coverage',
             default=False,
             help='Enable coverage on specified modules.'),
+        make_option(
+            '--shards',
+            action='store',
+            type='int',
+            dest='shards',
+            default=None,
+            help='Number of worker processes to run games in. Defaults to '
+                 'the GAME_RUNNER_SHARDS setting.'),
+        make_option(
+            '--state-path',
+            action='store',
+            dest='state_path',
+            default=None,
+            help='Directory to save games in so they survive a restart. '
+                 'Defaults to the GAME_STATE_PATH setting.'),
+        make_option(
+            '--profile',
+            action='store_true',
+            dest='profile',
+            default=False,
+            help='Time every action and print where the time went when '
+                 'the server stops.'),
+        make_option(
+            '--metrics-port',
+            action='store',
+            type='int',
+            dest='metrics_port',
+            default=None,
+            help='Serve metrics for monitoring on this port of localhost. '
+                 'Defaults to the METRICS_PORT setting.'),
     )
 
     def __init__(self):
@@ -105,6 +138,33 @@ class Command(BaseCommand):
         if options.get('use_reloader'):
             start_new_thread(reload_watcher, ())
 
+        if options.get('profile'):
+            # Turn this on before starting any workers so they inherit it.
+            profiling.enable()
+
+        shards = options.get('shards')
+        if shards is None:
+            shards = getattr(settings, 'GAME_RUNNER_SHARDS', 0)
+        if shards > 0:
+            # Start the workers before we bind so they don't hold the socket.
+            print 'Running games in %d worker processes.' % shards
+            sharded_runner.start(shards)
+
+        state_path = (options.get('state_path') or
+                      getattr(settings, 'GAME_STATE_PATH', None))
+        if state_path and shards > 0:
+            print 'Games are not saved when running in worker processes.'
+        elif state_path:
+            restored = persistence.enable(state_path)
+            print 'Restored %d games from %s.' % (len(restored), state_path)
+
+        metrics_port = (options.get('metrics_port') or
+                        getattr(settings, 'METRICS_PORT', None))
+        metrics_server = None
+        if metrics_port:
+            metrics_server = metrics.serve(metrics_port)
+            print 'Serving metrics on 127.0.0.1:%d' % metrics_port
+
         try:
             bind = (self.addr, int(self.port))
             print 'SocketIOServer running on %s:%s\n\n' % bind
@@ -114,6 +174,14 @@ class Command(BaseCommand):
             server.serve_forever()
         except KeyboardInterrupt:
             server.stop()
+            if metrics_server is not None:
+                metrics_server.stop()
+            if options.get('profile'):
+                profile = profiling.Profiler()
+                profile.merge(get_game_runner().get_profile())
+                print profile.report()
+            sharded_runner.stop()
+            persistence.disable()
             if options.get('enable_coverage'):
                 cov.stop()
                 cov.save()
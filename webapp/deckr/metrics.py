@@ -0,0 +1,233 @@
+"""
+This module keeps operational counters for the socket server and serves them
+over HTTP in the Prometheus text format, so that monitoring can scrape them.
+The socket code calls count_received, count_sent and observe_event as it
+goes; everything else (games, rooms, queues) is read when we're scraped.
+
+Counters only ever go up. Monitoring works out events per second from them
+(e.g. rate(deckr_socket_events_received_total[1m])).
+"""
+
+import time
+
+from gevent.pywsgi import WSGIServer
+
+from deckr.utils import get_game_runner
+from engine.profiling import BUCKETS, Histogram
+
+START_TIME = time.time()
+# Maps event names to the number of events received from clients
+EVENTS_RECEIVED = {}
+# Maps event names to the number of events sent to clients
+EVENTS_SENT = {}
+# Maps event names to the number of bytes sent to clients
+BYTES_SENT = {}
+# Maps event names to a Histogram of how long we took to handle them
+EVENT_LATENCY = {}
+# Maps (reason, event name) to the number of events we didn't send. See
+# deckr.outbound.
+EVENTS_DROPPED = {}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def count_received(event):
+    """
+    Count an event received from a client.
+    """
+
+    EVENTS_RECEIVED[event] = EVENTS_RECEIVED.get(event, 0) + 1
+
+
+def count_sent(event, num_bytes):
+    """
+    Count an event sent to a client and its size once encoded.
+    """
+
+    EVENTS_SENT[event] = EVENTS_SENT.get(event, 0) + 1
+    BYTES_SENT[event] = BYTES_SENT.get(event, 0) + num_bytes
+
+
+def count_dropped(reason, event):
+    """
+    Count an event that was queued for a client but never sent, either
+    because a newer one superseded it ("coalesced") or because the client
+    fell too far behind ("evicted").
+    """
+
+    key = (reason, event)
+    EVENTS_DROPPED[key] = EVENTS_DROPPED.get(key, 0) + 1
+
+
+def observe_event(event, seconds):
+    """
+    Record how long handling an event took.
+    """
+
+    histogram = EVENT_LATENCY.get(event, None)
+    if histogram is None:
+        histogram = EVENT_LATENCY[event] = Histogram()
+    histogram.add(seconds)
+
+
+def reset():
+    """
+    Start every counter over. Only meant for tests.
+    """
+
+    EVENTS_RECEIVED.clear()
+    EVENTS_SENT.clear()
+    BYTES_SENT.clear()
+    EVENT_LATENCY.clear()
+    EVENTS_DROPPED.clear()
+
+
+def escape(value):
+    """
+    Escape a label value.
+    """
+
+    return (unicode(value).replace("\\", "\\\\").replace("\"", "\\\"")
+            .replace("\n", "\\n"))
+
+
+def format_metric(lines, name, metric_type, help_text, samples):
+    """
+    Add a metric to lines. samples is a list of (suffix, labels, value) where
+    labels is a list of (name, value) tuples and suffix is added to the name
+    (e.g. "_bucket" for histograms).
+    """
+
+    lines.append("# HELP %s %s" % (name, help_text))
+    lines.append("# TYPE %s %s" % (name, metric_type))
+    for suffix, labels, value in samples:
+        if labels:
+            label_text = "{%s}" % ",".join(
+                "%s=\"%s\"" % (key, escape(label)) for key, label in labels)
+        else:
+            label_text = ""
+        lines.append("%s%s%s %s" % (name, suffix, label_text,
+                                    format_value(value)))
+
+
+def format_value(value):
+    """
+    Format a number the way Prometheus expects.
+    """
+
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def histogram_samples(histograms, label):
+    """
+    Turn a dictionary of label value to Histogram into the (suffix, labels,
+    value) samples of a Prometheus histogram.
+    """
+
+    samples = []
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+            cumulative += count
+            samples.append(("_bucket", [(label, key),
+                                        ("le", format_value(bound))],
+                            cumulative))
+        samples.append(("_sum", [(label, key)], histogram.total))
+        samples.append(("_count", [(label, key)], histogram.count))
+    return samples
+
+
+def render(rooms=None, runner=None):
+    """
+    Returns every metric in the Prometheus text format. rooms defaults to
+    deckr.sockets.ROOMS and runner to the game runner in use.
+    """
+
+    if rooms is None:
+        # The sockets module counts things through us, so we can't import it
+        # up top.
+        from deckr.sockets import ROOMS as rooms
+    if runner is None:
+        runner = get_game_runner()
+
+    queue_depths = [connection.socket.client_queue.qsize()
+                    for connections in rooms.values()
+                    for connection in connections]
+
+    lines = []
+    format_metric(lines, "deckr_start_time_seconds", "gauge",
+                  "When the server started, in seconds since the epoch.",
+                  [("", [], START_TIME)])
+    format_metric(lines, "deckr_games", "gauge",
+                  "Games that are currently running.",
+                  [("", [], runner.get_num_games())])
+    format_metric(lines, "deckr_rooms", "gauge",
+                  "Rooms with at least one connection.",
+                  [("", [], len(rooms))])
+    format_metric(lines, "deckr_room_connections", "gauge",
+                  "Connections in each room.",
+                  [("", [("room", key)], len(value))
+                   for key, value in sorted(rooms.items())])
+    format_metric(lines, "deckr_emit_queue_depth", "gauge",
+                  "Messages waiting to be sent, over every connection.",
+                  [("", [], sum(queue_depths))])
+    format_metric(lines, "deckr_emit_queue_depth_max", "gauge",
+                  "Messages waiting to be sent to the most backed up "
+                  "connection.",
+                  [("", [], max(queue_depths) if queue_depths else 0)])
+    format_metric(lines, "deckr_socket_events_received_total", "counter",
+                  "Events received from clients.",
+                  [("", [("event", key)], value)
+                   for key, value in sorted(EVENTS_RECEIVED.items())])
+    format_metric(lines, "deckr_socket_events_sent_total", "counter",
+                  "Events sent to clients.",
+                  [("", [("event", key)], value)
+                   for key, value in sorted(EVENTS_SENT.items())])
+    format_metric(lines, "deckr_socket_bytes_sent_total", "counter",
+                  "Bytes of encoded events sent to clients.",
+                  [("", [("event", key)], value)
+                   for key, value in sorted(BYTES_SENT.items())])
+    format_metric(lines, "deckr_socket_events_dropped_total", "counter",
+                  "Events queued for clients but never sent.",
+                  [("", [("reason", reason), ("event", event)], value)
+                   for (reason, event), value in sorted(
+                       EVENTS_DROPPED.items())])
+    format_metric(lines, "deckr_socket_event_seconds", "histogram",
+                  "Time taken to handle each event, including anything it "
+                  "sends.",
+                  histogram_samples(EVENT_LATENCY, "event"))
+    format_metric(lines, "deckr_socket_event_latency_seconds", "gauge",
+                  "Percentiles of the time taken to handle each event, "
+                  "estimated from deckr_socket_event_seconds.",
+                  [("", [("event", key), ("quantile", str(fraction))],
+                    histogram.percentile(fraction))
+                   for key, histogram in sorted(EVENT_LATENCY.items())
+                   for fraction in (0.5, 0.9, 0.99)])
+
+    return "\n".join(lines) + "\n"
+
+
+def application(environ, start_response):
+    """
+    A WSGI application that serves the metrics on any path.
+    """
+
+    body = render().encode("utf-8")
+    start_response("200 OK", [("Content-Type", CONTENT_TYPE),
+                              ("Content-Length", str(len(body)))])
+    return [body]
+
+
+def serve(port, host="127.0.0.1"):
+    """
+    Start serving the metrics in the background. Returns the server so it can
+    be stopped.
+    """
+
+    server = WSGIServer((host, port), application, log=None)
+    server.start()
+    return server
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def count_players(apps, schema_editor):
+    """
+    Fill in num_players for the rooms that already exist.
+    """
+
+    GameRoom = apps.get_model('deckr', 'GameRoom')
+    for room in GameRoom.objects.annotate(count=models.Count('player')):
+        GameRoom.objects.filter(pk=room.pk).update(num_players=room.count)
+
+
+def dedupe_nicknames(apps, schema_editor):
+    """
+    Rename players who share a nickname with someone else in their room so
+    the unique index can be created. The first player keeps the nickname.
+    """
+
+    Player = apps.get_model('deckr', 'Player')
+    taken = set(Player.objects.values_list('game_room_id', 'nickname'))
+    seen = set()
+    for player in Player.objects.order_by('pk'):
+        key = (player.game_room_id, player.nickname)
+        if key not in seen:
+            seen.add(key)
+            continue
+
+        suffix = 2
+        while True:
+            tail = " (%d)" % suffix
+            nickname = player.nickname[:128 - len(tail)] + tail
+            if (player.game_room_id, nickname) not in taken:
+                break
+            suffix += 1
+        taken.add((player.game_room_id, nickname))
+        seen.add((player.game_room_id, nickname))
+        Player.objects.filter(pk=player.pk).update(nickname=nickname)
+
+
+def nothing(apps, schema_editor):
+    """
+    There's nothing to undo for the data steps when rolling back.
+    """
+
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deckr', '0005_auto_20141112_1332'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameroom',
+            name='num_players',
+            field=models.IntegerField(default=0),
+            preserve_default=True,
+        ),
+        migrations.RunPython(count_players, nothing),
+        migrations.RunPython(dedupe_nicknames, nothing),
+        migrations.AlterUniqueTogether(
+            name='player',
+            unique_together=set([('game_room', 'nickname')]),
+        ),
+    ]
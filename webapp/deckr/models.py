@@ -3,8 +3,9 @@ Contains definitions of all models for deckr.
 """
 
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import pre_save
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
 from django.dispatch import receiver
 
 
@@ -36,6 +37,9 @@ class GameRoom(models.Model):
     room_id = models.IntegerField()
     max_players = models.IntegerField(default=8)
     game_definition = models.ForeignKey(GameDefinition, null=True)
+    # Only ever changed with a single UPDATE (see take_seat and
+    # release_seat) so concurrent joins can't miscount.
+    num_players = models.IntegerField(default=0)
 
     def __unicode__(self):
         """
@@ -44,17 +48,38 @@ class GameRoom(models.Model):
         return "Game room {0} for the game {1}".format(
             str(self.room_id), self.game_definition.name)
 
+    def save(self, *args, **kwargs):
+        """
+        Save the room without writing num_players over the database's count,
+        which may have changed since this copy was loaded.
+        """
+        if not self._state.adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [
+                x.name for x in self._meta.concrete_fields
+                if not x.primary_key and x.name != 'num_players']
+        super(GameRoom, self).save(*args, **kwargs)
+
     def maximum_occupancy(self):
         """
         Compare room occupancy with maximum limit
         """
-        return self.max_players == self.player_set.all().count()
+        return self.num_players >= self.max_players
 
     def existing_nickname(self, nickname):
         """
         Check for duplicate nickname in room
         """
-        return nickname in [x.nickname for x in self.player_set.all()]
+        return self.player_set.filter(nickname=nickname).exists()
+
+    def take_seat(self):
+        """
+        Count another player in the room, unless it's full. Returns True if
+        there was a seat.
+        """
+        taken = GameRoom.objects.filter(
+            pk=self.pk, num_players__lt=self.max_players).update(
+                num_players=F('num_players') + 1)
+        return taken > 0
 
 
 class Player(models.Model):
@@ -66,22 +91,44 @@ class Player(models.Model):
     game_room = models.ForeignKey(GameRoom)
     nickname = models.CharField(max_length=128)
 
+    class Meta(object):
+        unique_together = (('game_room', 'nickname'),)
+
     def __unicode__(self):
         """
         Unicode representation of Player class
         """
         return self.nickname
 
-
-@receiver(pre_save, sender=Player)
-def validate_save(instance, **kwargs):  # pylint: disable=unused-argument
+    def save(self, *args, **kwargs):
+        """
+        Validate player object and ability to join game room. The database
+        enforces both the unique nicknames and the room limit, so joining
+        doesn't have to look at the other players.
+        """
+        if not 0 < len(self.nickname) <= 128:
+            raise ValueError("Nickname must be between 1 and 128 characters")
+
+        joining = self.pk is None
+        try:
+            with transaction.atomic():
+                if joining and not self.game_room.take_seat():
+                    # A taken nickname is the more useful thing to hear.
+                    if self.game_room.existing_nickname(self.nickname):
+                        raise ValueError("Nickname is already in use")
+                    raise ValueError("Cannot join full room")
+                super(Player, self).save(*args, **kwargs)
+        except IntegrityError:
+            raise ValueError("Nickname is already in use")
+
+        if joining:
+            self.game_room.num_players += 1
+
+
+@receiver(post_delete, sender=Player)
+def release_seat(instance, **kwargs):  # pylint: disable=unused-argument
     """
-    Validate player object and ability to join game room
+    Give up the seat of a player that's been deleted.
     """
-    if instance.game_room.existing_nickname(instance.nickname):
-        raise ValueError("Nickname is already in use")
-    elif not 0 < len(instance.nickname) <= 128:
-        raise ValueError("Nickname must be between 1 and 128 characters")
-    elif (instance.game_room.maximum_occupancy() and
-          instance.pk is None):
-        raise ValueError("Cannot join full room")
+    GameRoom.objects.filter(pk=instance.game_room_id).update(
+        num_players=F('num_players') - 1)
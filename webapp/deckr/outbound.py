@@ -0,0 +1,187 @@
+"""
+This module bounds what we keep waiting to be sent to each client. gevent-
+socketio puts every outgoing packet on the socket's client_queue, which has no
+limit, so a client that can't keep up (e.g. a phone on a bad connection)
+would make the server hold on to everything ever sent to it. We swap that
+queue for an OutboundQueue, which:
+
+    * drops queued events that a newer event supersedes (an older copy of the
+      state, the transitions and action updates leading up to a new state,
+      an older player list)
+    * evicts the connection once too many messages or bytes are waiting.
+      Everything queued is thrown away and the client is told to resync,
+      which it does by joining again and asking for the state.
+
+Packets gevent-socketio sends itself (heartbeats, acks, etc.) are small and
+always queued.
+"""
+
+from collections import deque
+
+from django.conf import settings
+from gevent.event import Event
+from gevent.queue import Empty
+
+from deckr import metrics
+
+# Maps an event to the queued events it makes pointless to send.
+SUPERSEDES = {
+    "state": frozenset(("state", "state_transitions", "action_update")),
+    "player_names": frozenset(("player_names",)),
+}
+
+# A socket.io packet that does nothing, used to wake up anything waiting on
+# a queue we've replaced.
+NOOP = "8::"
+
+
+class OutboundQueue(object):
+
+    """
+    A queue of packets waiting to be sent to a single client. It offers the
+    parts of gevent.queue.Queue that gevent-socketio uses, plus put_frame for
+    events that we may coalesce or drop.
+    """
+
+    def __init__(self, max_messages, max_bytes):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        # [event, data] pairs. event is None for packets we didn't send.
+        self.messages = deque()
+        self.num_bytes = 0
+        # Set once the limits have been hit, until reset is called. Nothing
+        # sent with put_frame is queued in the meantime.
+        self.evicted = False
+        self.ready = Event()
+
+    def put_frame(self, event, data):
+        """
+        Queue an encoded event. Returns False if it was dropped because the
+        connection has been evicted (or is evicted by this).
+        """
+
+        if self.evicted:
+            return False
+
+        superseded = SUPERSEDES.get(event, None)
+        if superseded is not None:
+            kept = deque()
+            for message in self.messages:
+                if message[0] in superseded:
+                    self.num_bytes -= len(message[1])
+                    metrics.count_dropped("coalesced", message[0])
+                else:
+                    kept.append(message)
+            self.messages = kept
+
+        self.messages.append([event, data])
+        self.num_bytes += len(data)
+        if (len(self.messages) > self.max_messages or
+                self.num_bytes > self.max_bytes):
+            self.evict()
+            return False
+
+        self.ready.set()
+        return True
+
+    def evict(self):
+        """
+        Throw away everything that's queued and stop queueing events until
+        reset is called.
+        """
+
+        for event, _ in self.messages:
+            if event is not None:
+                metrics.count_dropped("evicted", event)
+        # Keep the packets gevent-socketio queued itself (heartbeats, acks,
+        # the None that stops the transport, etc.).
+        self.messages = deque(x for x in self.messages if x[0] is None)
+        self.num_bytes = sum(len(x[1]) for x in self.messages
+                             if x[1] is not None)
+        self.evicted = True
+
+    def reset(self):
+        """
+        Start queueing events again after an eviction.
+        """
+
+        self.evicted = False
+
+    def put_nowait(self, data):
+        """
+        Queue a packet that can't be dropped.
+        """
+
+        self.messages.append([None, data])
+        if data is not None:
+            self.num_bytes += len(data)
+        self.ready.set()
+
+    def put(self, data, block=True, timeout=None):
+        """
+        Queue a packet. This never blocks.
+        """
+
+        # pylint: disable=unused-argument
+        self.put_nowait(data)
+
+    def get(self, block=True, timeout=None):
+        """
+        Take the oldest packet off the queue, waiting for one if block is
+        True. Raises Empty if there isn't one.
+        """
+
+        while len(self.messages) == 0:
+            if not block:
+                raise Empty
+            self.ready.clear()
+            if not self.ready.wait(timeout):
+                raise Empty
+
+        _, data = self.messages.popleft()
+        if data is not None:
+            self.num_bytes -= len(data)
+        return data
+
+    def get_nowait(self):
+        """
+        Take the oldest packet off the queue without waiting.
+        """
+
+        return self.get(False)
+
+    def qsize(self):
+        """
+        Returns the number of packets waiting.
+        """
+
+        return len(self.messages)
+
+    def empty(self):
+        """
+        Returns True if nothing is waiting.
+        """
+
+        return len(self.messages) == 0
+
+
+def install(socket):
+    """
+    Replace the client queue of a socket with an OutboundQueue (if it doesn't
+    have one already) and return it. Anything already queued is moved over.
+    """
+
+    old_queue = socket.client_queue
+    if isinstance(old_queue, OutboundQueue):
+        return old_queue
+
+    queue = OutboundQueue(
+        getattr(settings, 'SOCKET_QUEUE_MAX_MESSAGES', 256),
+        getattr(settings, 'SOCKET_QUEUE_MAX_BYTES', 4 * 1024 * 1024))
+    while not old_queue.empty():
+        queue.put_nowait(old_queue.get_nowait())
+    socket.client_queue = queue
+    # The transport may be waiting on the old queue, so give it something
+    # to send. It'll use the new queue from then on.
+    old_queue.put_nowait(NOOP)
+    return queue
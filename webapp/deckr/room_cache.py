@@ -0,0 +1,156 @@
+"""
+This module keeps game rooms and their players in memory so that the socket
+handlers don't have to go to the database for every event. A room (and all of
+its players) is loaded the first time it's asked for; after that the model
+signals keep it up to date whenever a room or player is saved or deleted.
+
+This only works when a single process serves the site, which is how
+socketio_runserver runs it: the web pages and the sockets share a process, so
+every change made through them fires the signals here. Signals only fire in
+the process that made the change, so changes made anywhere else (a second
+server process, a management command, the admin running elsewhere) aren't
+seen. The one exception is a player added elsewhere, who is looked up in the
+database the first time they're asked for. Renamed or deleted rooms and
+players stay stale until the server restarts, so don't run more than one
+server process against the same database.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from deckr.models import GameRoom, Player
+
+# Maps GameRoom pks to CachedRooms
+CACHE = {}
+
+
+class CachedRoom(object):
+
+    """
+    A game room along with its players.
+    """
+
+    def __init__(self, game_room, players):
+        self.game_room = game_room
+        # Maps Player pks to Players
+        self.players = dict((x.pk, x) for x in players)
+
+    def get_players(self):
+        """
+        Returns every player in the room in the order they were created.
+        """
+
+        return [self.players[x] for x in sorted(self.players)]
+
+
+def get_cached_room(game_room_pk):
+    """
+    Returns the CachedRoom for a game room, loading it if we have to, or
+    None if there is no such room.
+    """
+
+    cached = CACHE.get(game_room_pk, None)
+    if cached is None:
+        try:
+            game_room = GameRoom.objects.get(pk=game_room_pk)
+        except GameRoom.DoesNotExist:
+            return None
+        cached = CACHE[game_room_pk] = CachedRoom(
+            game_room, game_room.player_set.all())
+    return cached
+
+
+def get_room(game_room_pk):
+    """
+    Returns the GameRoom with the given pk, or None if there isn't one.
+    """
+
+    cached = get_cached_room(game_room_pk)
+    if cached is None:
+        return None
+    return cached.game_room
+
+
+def get_players(game_room_pk):
+    """
+    Returns the players in a game room (an empty list if there is no such
+    room).
+    """
+
+    cached = get_cached_room(game_room_pk)
+    if cached is None:
+        return []
+    return cached.get_players()
+
+
+def get_player(game_room_pk, player_pk):
+    """
+    Returns the player with the given pk if they are in the given game room,
+    otherwise None.
+    """
+
+    cached = get_cached_room(game_room_pk)
+    if cached is None:
+        return None
+
+    player = cached.players.get(player_pk, None)
+    if player is None:
+        # They might have joined through another process.
+        try:
+            player = Player.objects.get(pk=player_pk,
+                                        game_room_id=game_room_pk)
+        except Player.DoesNotExist:
+            return None
+        cached.players[player_pk] = player
+    return player
+
+
+def clear():
+    """
+    Forget everything. The cache doesn't see transactions being rolled back,
+    so tests need to call this.
+    """
+
+    CACHE.clear()
+
+
+@receiver(post_save, sender=GameRoom)
+def game_room_saved(instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Keep the cached copy of a game room current.
+    """
+
+    cached = CACHE.get(instance.pk, None)
+    if cached is not None:
+        cached.game_room = instance
+
+
+@receiver(post_delete, sender=GameRoom)
+def game_room_deleted(instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Forget a game room once it's deleted.
+    """
+
+    CACHE.pop(instance.pk, None)
+
+
+@receiver(post_save, sender=Player)
+def player_saved(instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Add new players to the cache and keep the existing ones current.
+    """
+
+    cached = CACHE.get(instance.game_room_id, None)
+    if cached is not None:
+        cached.players[instance.pk] = instance
+
+
+@receiver(post_delete, sender=Player)
+def player_deleted(instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Forget a player once they're deleted.
+    """
+
+    cached = CACHE.get(instance.game_room_id, None)
+    if cached is not None:
+        cached.players.pop(instance.pk, None)
@@ -2,12 +2,12 @@
 Stores all the socket logic for the deckr webapp.
 """
 
+import time
 import traceback
 
-from django.core.exceptions import ObjectDoesNotExist
-
-from deckr.models import GameRoom, Player
-from engine import game_runner
+from deckr import metrics, outbound, room_cache, wire
+from deckr.utils import get_game_runner
+from socketio import packet as socketio_packet
 from socketio.mixins import BroadcastMixin, RoomsMixin
 from socketio.namespace import BaseNamespace
 from socketio.sdjango import namespace
@@ -36,6 +36,17 @@ class ChatNamespace(BaseNamespace, RoomsMixin, BroadcastMixin):
 ROOMS = {}
 
 
+def encode_frame(event, encoded_args, endpoint='/game'):
+    """
+    Build a socket.io event packet from arguments that have already been
+    JSON encoded. This lets us encode something once and reuse it in every
+    packet it's part of.
+    """
+
+    return '5::%s:{"name":"%s","args":[%s]}' % (endpoint, event,
+                                                 ",".join(encoded_args))
+
+
 @namespace('/game')
 class GameNamespace(BaseNamespace, BroadcastMixin):
 
@@ -51,15 +62,98 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
         self.game_room = None
         self.player = None
         self.room = None
-        self.runner = game_runner
+        self.runner = get_game_runner()
+        # The last version of the game state this connection holds. None
+        # means the client needs a full copy of the state.
+        self.state_version = None
+        # How we encode the state and transitions for this connection. See
+        # deckr.wire.
+        self.encoding = "verbose"
+        # The version of the card catalog the client has, if any.
+        self.catalog_version = None
+        # Everything we send waits here until the client takes it.
+        self.outbound = outbound.install(self.socket)
+
+    def process_event(self, packet):
+        """
+        Count every event we handle and time how long it takes.
+        """
+
+        name = packet['name']
+        # Clients can send any name they like, so don't keep counters for
+        # events we don't handle.
+        if not hasattr(self, 'on_' + name):
+            name = 'unknown'
+        metrics.count_received(name)
+        # The client is talking to us again, so it can be sent things.
+        self.outbound.reset()
+        start = time.time()
+        try:
+            return super(GameNamespace, self).process_event(packet)
+        finally:
+            metrics.observe_event(name, time.time() - start)
+
+    def emit(self, event, *args, **kwargs):
+        """
+        Send an event to this client, keeping count of what we send.
+        """
+
+        if kwargs:
+            return super(GameNamespace, self).emit(event, *args, **kwargs)
+
+        self.send_frame(event, self.encode_event(event, *args))
+
+    def encode_event(self, event, *args):
+        """
+        Encode an event as a socket.io packet for this namespace.
+        """
+
+        return socketio_packet.encode({'type': 'event', 'name': event,
+                                       'args': args,
+                                       'endpoint': self.ns_name},
+                                      self.socket.json_dumps)
+
+    def send_frame(self, event, data):
+        """
+        Send an already encoded event to this client. If the client has
+        fallen too far behind we stop sending it anything and tell it to
+        resync.
+        """
+
+        if self.outbound.put_frame(event, data):
+            metrics.count_sent(event, len(data))
+        elif self in ROOMS.get(self.room, ()):
+            # We only just went over the limit.
+            self.evict()
+
+    def evict(self):
+        """
+        Stop sending room broadcasts to this client and tell it to resync.
+        It'll join the room again and ask for the state once it catches up.
+        """
+
+        # Keep self.room so that anything the client does in the meantime
+        # still goes to the right game.
+        self.remove_from_room()
+        # Whatever it had of the state is out of date now.
+        self.state_version = None
+        data = self.encode_event('resync')
+        self.outbound.put_nowait(data)
+        metrics.count_sent('resync', len(data))
 
     def emit_to_room(self, room, event, *args):
         """
-        We override this so that it will actually broadcast to self.
+        We override this so that it will actually broadcast to self. The
+        event is only encoded once for the whole room.
         """
 
-        for connection in ROOMS.get(room, []):
-            connection.emit(event, *args)
+        connections = ROOMS.get(room, None)
+        if not connections:
+            return
+        data = self.encode_event(event, *args)
+        # Sending can evict a connection from the room, so go over a copy.
+        for connection in list(connections):
+            connection.send_frame(event, data)
 
     def on_start(self):
         """
@@ -72,16 +166,21 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
 
         self.emit_to_room(self.room, 'start')
 
+        # Setting up the game changes everything so everybody gets a fresh
+        # copy of the state.
+        frames = {}
+        for ns in list(ROOMS.get(self.room, [])):
+            ns.send_state(frames)
+
         trans = self.runner.get_public_transitions(self.game_room.room_id)
-        state = self.runner.get_state(self.game_room.room_id,
-                                      self.player.player_id)
+        version = self.runner.get_state_version(self.game_room.room_id)
 
         self.emit_to_room(
             self.room,
             'textbox_data',
             (self.player.nickname,
              trans,
-             state))
+             version))
 
     def recv_disconnect(self):
         """
@@ -96,12 +195,7 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
         """
 
         super(GameNamespace, self).disconnect(silent)
-        if self.room is None:
-            return
-
-        ROOMS[self.room].remove(self)
-        if len(ROOMS[self.room]) == 0:
-            del ROOMS[self.room]
+        self.leave_room()
 
     def join_room(self, room):
         """
@@ -109,11 +203,32 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
         value.
         """
 
+        self.leave_room()
         self.room = room
         if ROOMS.get(room, None) is None:
             ROOMS[room] = set()
         ROOMS[room].add(self)
 
+    def leave_room(self):
+        """
+        Remove the current socket from its room, if it's in one.
+        """
+
+        self.remove_from_room()
+        self.room = None
+
+    def remove_from_room(self):
+        """
+        Remove the current socket from the ROOMS list for its room, so that
+        it isn't sent anything broadcast to the room.
+        """
+
+        connections = ROOMS.get(self.room, None)
+        if connections is not None:
+            connections.discard(self)
+            if len(connections) == 0:
+                del ROOMS[self.room]
+
     def on_join(self, join_request):
         """
         Triggers when a client joins this room. Each room corresponds
@@ -137,15 +252,13 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
             return False
 
         # Get the game room object
-        try:
-            game_room = GameRoom.objects.get(pk=int(game_room_id))
-        except ObjectDoesNotExist:
+        game_room = room_cache.get_room(game_room_id)
+        if game_room is None:
             self.emit("error", "Can not find game room")
             return False
 
-        try:
-            player = Player.objects.get(pk=int(player_id))
-        except ObjectDoesNotExist:
+        player = room_cache.get_player(game_room_id, player_id)
+        if player is None:
             self.emit("error", "Can not find player")
             return False
 
@@ -166,7 +279,8 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
 
         if self.game_room is not None:
             player_names = [{'id': p.player_id, 'nickname': p.nickname}
-                            for p in self.game_room.player_set.all()]
+                            for p in room_cache.get_players(
+                                self.game_room.pk)]
             self.emit_to_room(self.room, 'player_names', player_names)
 
     def on_action(self, data):
@@ -198,29 +312,158 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
             self.emit("error", msg)
             return False
 
-        trans = self.runner.get_public_transitions(self.game_room.room_id)
-        self.emit_to_room(self.room, 'state_transitions', trans)
+        # Bring every connection up to date and tell it about the action in
+        # a single frame. We get everything from the game in one call and
+        # encode everything shared by the room once.
+        connections = list(ROOMS.get(self.room, []))
+        recipients = [ns.get_recipient() for ns in connections]
+        update = self.runner.get_action_update(self.game_room.room_id,
+                                               recipients)
+        version = update['version']
+        json_dumps = self.socket.json_dumps
+        shared = (json_dumps((self.player.nickname,
+                              update['public_transitions'], version)),
+                  json_dumps(update['expected_action']))
+        frames = {}
+        for ns, recipient in zip(connections, recipients):
+            ns.send_action_update(version, update['transitions'][recipient],
+                                  shared, frames)
 
-        state = self.runner.get_state(self.game_room.room_id,
-                                      self.player.player_id)
-        self.emit_to_room(
-            self.room,
-            'textbox_data',
-            (self.player.nickname,
-             trans,
-             state))
+        return True
 
-        # Get all the private transitions for all players
-        for ns in ROOMS[self.room]:
-            if ns.player is not None:
-                trans = self.runner.get_player_transitions(ns.game_room.room_id,
-                                                           ns.player.player_id)
-                ns.emit('state_transitions', trans)
+    def get_recipient(self):
+        """
+        Returns (the state version we hold, the id of our player) for
+        runner.get_action_update.
+        """
 
-        # Broadcast what the Game is expecting
-        expected = self.runner.get_expected_action(self.game_room.room_id)
-        self.emit_to_room(self.room, 'expected_action', expected)
+        if self.player is None:
+            return (self.state_version, None)
+        return (self.state_version, self.player.player_id)
+
+    def send_action_update(self, version, trans, shared, frames):
+        """
+        Send this connection everything it needs after an action in a single
+        'action_update' event: trans, the transitions that bring it up to
+        version (or None if it needs the whole state, which is sent first),
+        the textbox data and the expected action. shared holds the last two
+        already encoded. frames caches the frames built for the rest of the
+        room; connections given the same transitions get the same frame.
+        """
+
+        if self.game_room is None:
+            return False
+
+        if trans is None:
+            self.send_state(frames)
+            key = ('action_update', None)
+        else:
+            # The transitions are kept alive by the update, so their id
+            # can't be reused while the frames are.
+            key = ('action_update', id(trans), self.encoding)
+
+        if key not in frames:
+            if trans is None:
+                encoded = 'null'
+            else:
+                encoded = self.socket.json_dumps(
+                    wire.encode_transitions(trans, self.encoding))
+            update = ('{"transitions":%s,"version":%d,"textbox_data":%s,'
+                      '"expected_action":%s}' % ((encoded, version) + shared))
+            frames[key] = encode_frame('action_update', [update],
+                                       self.ns_name)
+
+        self.state_version = version
+        self.send_frame('action_update', frames[key])
+        return True
 
+    def send_state(self, frames=None):
+        """
+        Send the entire game state to this connection along with the version
+        of the state that it corresponds to. frames can be given to share
+        the encoded state with the rest of the room.
+        """
+
+        if self.game_room is None:
+            self.emit("error", "Please connect to a game room first.")
+            return False
+
+        # Spectators see the public state, just like the transitions they're
+        # sent.
+        if self.player is None:
+            player_id = None
+        else:
+            player_id = self.player.player_id
+
+        self.state_version = self.runner.get_state_version(
+            self.game_room.room_id)
+        if frames is None:
+            frames = {}
+        key = ('state', player_id, self.encoding, self.catalog_version,
+               self.state_version)
+        if key not in frames:
+            frames[key] = self.encode_event('state', self.get_state(player_id),
+                                            self.state_version)
+        self.send_frame('state', frames[key])
+        return True
+
+    def get_state(self, player_id):
+        """
+        Get the state of our game as seen by player_id, encoded for this
+        connection.
+        """
+
+        if self.encoding == "verbose":
+            return self.runner.get_state(self.game_room.room_id, player_id)
+        state = self.runner.get_state(self.game_room.room_id, player_id, True)
+        if state.get('catalog_version') != self.catalog_version:
+            # The client doesn't have the right catalog so it needs the
+            # definitions as well.
+            state = dict(state, definitions=self.runner.get_card_catalog(
+                self.game_room.room_id)['cards'])
+        return wire.encode_state(state, self.encoding)
+
+    def send_state_update(self):
+        """
+        Bring this connection up to the current version of the game state.
+        This sends only the transitions since the last version we sent; if
+        those aren't available (or we never sent anything) it falls back to
+        sending the entire state.
+        """
+
+        if self.game_room is None:
+            return False
+
+        if self.state_version is not None:
+            if self.player is None:
+                player_id = None
+            else:
+                player_id = self.player.player_id
+            trans = self.runner.get_transitions_since(self.game_room.room_id,
+                                                      self.state_version,
+                                                      player_id)
+            if trans is not None:
+                self.state_version = self.runner.get_state_version(
+                    self.game_room.room_id)
+                self.emit('state_transitions',
+                          wire.encode_transitions(trans, self.encoding),
+                          self.state_version)
+                return True
+
+        return self.send_state()
+
+    def on_set_encoding(self, encoding, catalog_version=None):
+        """
+        The client can call this to ask for a different encoding of the state
+        and transitions (see deckr.wire), along with the version of the card
+        catalog it has cached. We reply with the encoding we'll actually use,
+        which is the verbose one if we don't know the one that was asked for.
+        """
+
+        if encoding in wire.ENCODINGS:
+            self.encoding = encoding
+            self.catalog_version = catalog_version
+        self.emit("encoding", self.encoding)
         return True
 
     def on_request_state(self):
@@ -229,24 +472,29 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
         game state.
         """
 
+        return self.send_state()
+
+    def on_ack_state(self, version):
+        """
+        The client will call this to tell us what version of the state it
+        holds (e.g. after reconnecting). We send back whatever it needs to
+        catch up.
+        """
+
         if self.game_room is None:
             self.emit("error", "Please connect to a game room first.")
             return False
-        elif self.player is None:
-            # Spectator is requesting state
-            other_players = self.game_room.player_set.all()
-            if len(other_players) > 0:
-                state = self.runner.get_state(self.game_room.room_id,
-                                              other_players[0].player_id)
-            else:
-                self.emit("error", "There are no actual players in the room.")
-                return False
-        else:
-            state = self.runner.get_state(self.game_room.room_id,
-                                          self.player.player_id)
 
-        self.emit("state", state)
-        return True
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            self.emit("error", "State version is not an integer.")
+            return False
+
+        # If we've already sent something newer it's still on its way.
+        if self.state_version is None or version > self.state_version:
+            self.state_version = version
+        return self.send_state_update()
 
     def on_update_nickname(self, nickname):
         """
@@ -258,6 +506,10 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
             return False
 
         old_nickname = self.player.nickname
+        if nickname == old_nickname:
+            # Nothing to change
+            return True
+
         self.player.nickname = nickname
         try:
             self.player.save()
@@ -278,7 +530,7 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
             self.emit("error", "Please connect to a game room first.")
             return False
 
-        for player in self.game_room.player_set.all():
+        for player in room_cache.get_players(self.game_room.pk):
             player.delete()
 
         self.game_room.delete()
@@ -287,7 +539,7 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
 
         self.game_room = None
         self.player = None
-        self.room = None
+        self.leave_room()
 
         return True
 
@@ -308,9 +560,9 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
             self.update_player_list()
             self.emit('leave_game')
 
-            if not self.game_room.player_set.all():
+            if not room_cache.get_players(self.game_room.pk):
                 self.game_room.delete()
-                self.room = None
+                self.leave_room()
                 self.game_room = None
 
             self.player = None
@@ -344,9 +596,8 @@ class GameNamespace(BaseNamespace, BroadcastMixin):
             return False
 
         # Get the game room object
-        try:
-            game_room = GameRoom.objects.get(pk=int(game_room_id))
-        except ObjectDoesNotExist:
+        game_room = room_cache.get_room(game_room_id)
+        if game_room is None:
             self.emit("error", "Can not find game room")
             return False
 
@@ -49,10 +49,13 @@ function addToEventBox(eventbox, text, without_newline, extra) {
 }
 
 function getEventData(data) {
+    // The server only sends the version of the state; by the time this
+    // arrives our local copy of the state is already up to date.
     return {
         nickname: data[0],
         transitions: data[1],
-        state: data[2]
+        version: data[2],
+        state: game_state
     };
 }
 
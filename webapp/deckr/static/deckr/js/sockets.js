@@ -6,6 +6,185 @@ var player_mapping = {};
 var player_ids = [];
 var my_game_id = 0;
 
+// Our local copy of the game state and the version it corresponds to. The
+// server sends a full copy of the state once and after that only sends the
+// transitions, which we apply here.
+var game_state = null;
+var state_version = null;
+var state_index = {};
+var join_request = null;
+// The encoding the server uses for the state and transitions (see
+// deckr/wire.py). We ask for the compact one whenever we join.
+var wire_encoding = 'verbose';
+// Every card definition in the game. With the compact encoding cards only
+// refer to these. The page sets card_catalog_url.
+var card_catalog_url = null;
+var card_catalog = null;
+
+// Look at every event before it gets to any of the handlers so that the local
+// state is up to date by the time they run. Compact payloads are decoded here
+// so the handlers only ever see the verbose encoding.
+var dispatchEvent = socket.$emit;
+socket.$emit = function (name) {
+    if (name === 'encoding') {
+        wire_encoding = arguments[1];
+    } else if (name === 'state') {
+        if (wire_encoding === 'compact') {
+            arguments[1] = decodeCompactState(arguments[1]);
+        }
+        setGameState(arguments[1], arguments[2]);
+    } else if (name === 'state_transitions') {
+        if (wire_encoding === 'compact') {
+            arguments[1] = decodeCompactTransitions(arguments[1]);
+        }
+        updateGameState(arguments[1], arguments[2]);
+    } else if (name === 'action_update') {
+        // Everything about an action comes in one event; hand each part to
+        // the usual handlers.
+        var update = arguments[1];
+        if (update.transitions !== null) {
+            socket.$emit('state_transitions', update.transitions,
+                         update.version);
+        }
+        socket.$emit('textbox_data', update.textbox_data);
+        socket.$emit('expected_action', update.expected_action);
+    }
+    return dispatchEvent.apply(this, arguments);
+};
+
+function decodeCompactObject(strings, shapes, row) {
+    var shape = shapes[row[0]];
+    var obj = {};
+    for (var i = 0; i < shape.length; i++) {
+        obj[strings[shape[i]]] = row[i + 1];
+    }
+    return obj;
+}
+
+function decodeCompactState(data) {
+    var decode = function (row) {
+        return decodeCompactObject(data.strings, data.shapes, row);
+    };
+    var definitions;
+    // The server only sends the definitions if we don't have the right
+    // catalog.
+    if (data.definitions.length > 0 || card_catalog === null) {
+        definitions = _.map(data.definitions, decode);
+    } else {
+        definitions = card_catalog.cards;
+    }
+    return {
+        'cards': _.map(data.cards, function (row) {
+            var card = decode(row);
+            if (card.definition === undefined) return card;
+            var definition = definitions[card.definition];
+            delete card.definition;
+            return _.extend({}, definition, card);
+        }),
+        'players': _.map(data.players, decode),
+        'zones': _.map(data.zones, decode)
+    };
+}
+
+function decodeCompactTransitions(data) {
+    var strings = data[0];
+    return _.map(data[1], function (row) {
+        if (!_.isArray(row)) return row.raw;
+        var t = row.slice(0);
+        t[0] = strings[t[0]];
+        if (t[0] === 'set' && t.length === 5) {
+            t[1] = strings[t[1]];
+            t[3] = strings[t[3]];
+        }
+        return t;
+    });
+}
+
+socket.on('reconnect', function () {
+    if (join_request !== null) sendJoin();
+});
+
+// The server stops sending us anything if we fall too far behind. Once we
+// catch up we start over with a fresh copy of the state.
+socket.on('resync', function () {
+    game_state = null;
+    state_version = null;
+    if (join_request !== null) sendJoin();
+});
+
+function joinGame(event, data) {
+    /* Join a game room (either as a player or a spectator) and remember how
+       we did it so that we can rejoin if the connection drops. We fetch the
+       card catalog first (the browser should have it cached). */
+    join_request = [event, data];
+    if (card_catalog_url === null) {
+        sendJoin();
+        return;
+    }
+    $.getJSON(card_catalog_url).done(function (catalog) {
+        card_catalog = catalog;
+    }).always(sendJoin);
+}
+
+function sendJoin() {
+    var version = (card_catalog === null) ? null : card_catalog.version;
+    socket.emit('set_encoding', 'compact', version);
+    socket.emit(join_request[0], join_request[1]);
+    requestState();
+}
+
+function requestState() {
+    /* Ask the server for the state. If we already have a copy we only
+       need whatever changed since then. */
+    if (state_version === null) {
+        socket.emit('request_state');
+    } else {
+        socket.emit('ack_state', state_version);
+    }
+}
+
+function setGameState(state, version) {
+    game_state = state;
+    state_version = (version === undefined) ? null : version;
+    state_index = {'Card': {}, 'Player': {}, 'Zone': {}};
+    _.each(state.cards, function(x) { state_index.Card[x.game_id] = x; });
+    _.each(state.players, function(x) { state_index.Player[x.game_id] = x; });
+    _.each(state.zones, function(x) { state_index.Zone[x.game_id] = x; });
+}
+
+function updateGameState(transitions, version) {
+    if (game_state === null) return;
+    _.each(transitions, applyTransitionToState);
+    if (version !== undefined) state_version = version;
+}
+
+function moveCardInState(card_id, zone_id) {
+    var card, zone;
+    card = state_index.Card[card_id];
+    if (!card) return;
+    zone = state_index.Zone[card.zone];
+    if (zone) zone.cards = _.without(zone.cards, card_id);
+    card.zone = (zone_id === undefined) ? null : zone_id;
+    zone = state_index.Zone[card.zone];
+    if (zone) zone.cards.push(card_id);
+}
+
+function applyTransitionToState(t) {
+    var obj;
+    if (t[0] === 'set') {
+        obj = (state_index[t[1]] || {})[t[2]];
+        if (obj) obj[t[3]] = t[4];
+    } else if (t[0] === 'add' || t[0] === 'move') {
+        moveCardInState(t[1], t[2]);
+    } else if (t[0] === 'remove') {
+        moveCardInState(t[1]);
+    } else if (t[0] === 'bulk_move') {
+        _.each(t[1], function(card_id) {
+            moveCardInState(card_id, (t[2] === null) ? undefined : t[2]);
+        });
+    }
+}
+
 function setupSockets() {
     console.log('Setting up sockets.');
     var socket_fn_mapping = {
@@ -30,7 +209,7 @@ function setupSockets() {
 }
 
 function onStart() {
-    socket.emit('request_state');
+    // The server sends everyone the new state once the game has started.
     $("#start-btn").hide();
 }
 
@@ -70,6 +249,14 @@ function transitionAdd(transition) {
     moveCard("card" + transition[1], "zone" + transition[2]);
 }
 
+function transitionBulkMove(transition) {
+    // A null zone means the cards were just taken out of their zone.
+    if (transition[2] === null) return;
+    _.each(transition[1], function(card_id) {
+        moveCard("card" + card_id, "zone" + transition[2]);
+    });
+}
+
 function transitionSet(transition) {
     // Could we make transition objects, instead of just magically knowing
     // which indices means what?
@@ -99,6 +286,8 @@ function performTransition(t) {
     var fn = t[0];
     var transition_fn_map = {
         'add': transitionAdd,
+        'move': transitionAdd,
+        'bulk_move': transitionBulkMove,
         'set': transitionSet,
         'is_over': transitionGameOver
     };
@@ -0,0 +1,49 @@
+"""
+Test the pieces of the load tester that don't need a server.
+"""
+
+import os
+
+from django.test import TestCase
+
+from deckr.loadtest import Stats, decode_payload, process_usage
+
+
+class LoadTestTestCase(TestCase):
+
+    """
+    Test the socket.io payload parsing and the statistics.
+    """
+
+    def test_decode_payload(self):
+        """
+        Make sure single and framed payloads are split into packets.
+        """
+
+        self.assertEqual(decode_payload("1::/game"), [u"1::/game"])
+        framed = u"\ufffd8\ufffd1::/game\ufffd3\ufffd2::".encode("utf-8")
+        self.assertEqual(decode_payload(framed), [u"1::/game", u"2::"])
+
+    def test_stats(self):
+        """
+        Make sure the summary is in milliseconds and sorted properly.
+        """
+
+        stats = Stats()
+        for latency in (0.003, 0.001, 0.002):
+            stats.add("action", latency)
+        count, p50, _, _, high = stats.summary()["action"]
+        self.assertEqual(count, 3)
+        self.assertAlmostEqual(p50, 2)
+        self.assertAlmostEqual(high, 3)
+
+    def test_process_usage(self):
+        """
+        Make sure we can read our own cpu and memory usage.
+        """
+
+        usage = process_usage(os.getpid())
+        if usage is None:
+            self.skipTest("No /proc on this platform.")
+        self.assertGreaterEqual(usage[0], 0)
+        self.assertGreater(usage[1], 0)
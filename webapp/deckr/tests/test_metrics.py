@@ -0,0 +1,121 @@
+"""
+Unit tests for the socket server's metrics.
+"""
+
+from django.test import TestCase
+
+from deckr import metrics
+from deckr.sockets import GameNamespace
+from deckr.tests.test_sockets import SocketTestCase
+from mock import MagicMock
+
+
+class MetricsTestCase(TestCase):
+
+    """
+    Test the counters and the text format.
+    """
+
+    def setUp(self):
+        metrics.reset()
+        self.runner = MagicMock()
+        self.runner.get_num_games.return_value = 3
+
+        connection = MagicMock()
+        connection.socket.client_queue.qsize.return_value = 4
+        self.rooms = {"1": set([connection]), "2": set([MagicMock()])}
+
+    def tearDown(self):
+        metrics.reset()
+
+    def test_render(self):
+        """
+        Make sure every metric shows up in the text format.
+        """
+
+        metrics.count_received("action")
+        metrics.count_received("action")
+        metrics.count_sent("state", 100)
+        metrics.observe_event("action", 0.003)
+        metrics.count_dropped("coalesced", "state")
+
+        text = metrics.render(self.rooms, self.runner)
+        lines = text.splitlines()
+        self.assertIn("deckr_games 3", lines)
+        self.assertIn("deckr_rooms 2", lines)
+        self.assertIn('deckr_room_connections{room="1"} 1', lines)
+        self.assertIn("deckr_emit_queue_depth_max 4", lines)
+        self.assertIn('deckr_socket_events_received_total{event="action"} 2',
+                      lines)
+        self.assertIn('deckr_socket_events_sent_total{event="state"} 1',
+                      lines)
+        self.assertIn('deckr_socket_bytes_sent_total{event="state"} 100',
+                      lines)
+        self.assertIn('deckr_socket_events_dropped_total{reason="coalesced",'
+                      'event="state"} 1', lines)
+        self.assertIn("# TYPE deckr_socket_event_seconds histogram", lines)
+        self.assertIn('deckr_socket_event_seconds_bucket{event="action",'
+                      'le="+Inf"} 1', lines)
+        self.assertIn('deckr_socket_event_seconds_count{event="action"} 1',
+                      lines)
+        self.assertIn('deckr_socket_event_latency_seconds{event="action",'
+                      'quantile="0.99"} 0.003', lines)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_escape(self):
+        """
+        Label values can't break out of their quotes.
+        """
+
+        self.assertEqual(metrics.escape('a"b\\c\nd'), 'a\\"b\\\\c\\nd')
+
+    def test_application(self):
+        """
+        The WSGI application serves the metrics as text.
+        """
+
+        start_response = MagicMock()
+        body = "".join(metrics.application({}, start_response))
+        self.assertIn("deckr_games", body)
+        status, headers = start_response.call_args[0]
+        self.assertEqual(status, "200 OK")
+        self.assertIn(("Content-Type", metrics.CONTENT_TYPE), headers)
+
+
+class SocketMetricsTestCase(SocketTestCase):
+
+    """
+    Make sure the socket code keeps the counters up to date.
+    """
+
+    def setUp(self):
+        super(SocketMetricsTestCase, self).setUp()
+        metrics.reset()
+        self.namespace = GameNamespace(self.environ, '/game')
+
+    def tearDown(self):
+        metrics.reset()
+
+    def test_emit(self):
+        """
+        Everything we emit is counted along with its size.
+        """
+
+        self.namespace.emit("error", "Oops")
+        data = self.socket.client_queue.get_nowait()
+        self.assertEqual(metrics.EVENTS_SENT, {"error": 1})
+        self.assertEqual(metrics.BYTES_SENT, {"error": len(data)})
+
+    def test_process_event(self):
+        """
+        Every event we receive is counted and timed. Events we don't handle
+        are lumped together.
+        """
+
+        self.namespace.emit_to_room = MagicMock()
+        self.namespace.process_event({"type": "event", "name": "chat",
+                                      "args": [{}], "endpoint": "/game"})
+        self.namespace.process_event({"type": "event", "name": "bogus",
+                                      "args": [], "endpoint": "/game"})
+        self.assertEqual(metrics.EVENTS_RECEIVED, {"chat": 1, "unknown": 1})
+        self.assertEqual(metrics.EVENT_LATENCY["chat"].count, 1)
@@ -113,6 +113,49 @@ class GameRoomTestCase(TestCase):
         self.assertTrue(self.game_room.existing_nickname("Bob"))
         self.assertFalse(self.game_room.existing_nickname("Alice"))
 
+    def test_num_players(self):
+        """
+        Make sure the player count follows players joining and leaving, and
+        isn't overwritten by saving an old copy of the room.
+        """
+
+        stale_room = GameRoom.objects.get(pk=self.game_room.pk)
+        player1 = Player.objects.create(player_id=1,
+                                        nickname="Bob",
+                                        game_room=self.game_room)
+        Player.objects.create(player_id=2,
+                              nickname="Carol",
+                              game_room=self.game_room)
+        self.assertEqual(self.game_room.num_players, 2)
+
+        # A room that's already full still reports a taken nickname first.
+        self.assertRaisesMessage(ValueError, "Nickname is already in use",
+                                 Player.objects.create, player_id=3,
+                                 nickname="Bob", game_room=self.game_room)
+        self.assertRaisesMessage(ValueError, "Cannot join full room",
+                                 Player.objects.create, player_id=3,
+                                 nickname="Alice", game_room=self.game_room)
+
+        stale_room.save()
+        player1.delete()
+        room = GameRoom.objects.get(pk=self.game_room.pk)
+        self.assertEqual(room.num_players, 1)
+
+    def test_join_queries(self):
+        """
+        Make sure joining a room doesn't look at the other players.
+        """
+
+        Player.objects.create(player_id=1,
+                              nickname="Bob",
+                              game_room=self.game_room)
+
+        # The seat and the insert, inside a savepoint.
+        with self.assertNumQueries(4):
+            Player.objects.create(player_id=2,
+                                  nickname="Carol",
+                                  game_room=self.game_room)
+
 
 class PlayerTestCase(TestCase):
 
@@ -139,6 +182,9 @@ class PlayerTestCase(TestCase):
         Make sure that the nickname will reject invalid values.
         """
 
+        # Saving without changing the nickname is fine
+        self.player.save()
+
         # Nicknames can't be empty
         self.player.nickname = ""
         self.assertRaises(ValueError, self.player.save)
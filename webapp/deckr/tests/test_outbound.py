@@ -0,0 +1,187 @@
+"""
+Unit tests for the bounded queues of messages waiting to go to clients.
+"""
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+import gevent
+from deckr import metrics, outbound
+from deckr.outbound import OutboundQueue
+from deckr.sockets import GameNamespace, ROOMS
+from deckr.tests.test_sockets import SocketTestCase
+from gevent.queue import Empty, Queue
+from mock import MagicMock
+from socketio import packet
+
+
+class OutboundQueueTestCase(TestCase):
+
+    """
+    Test the queue on its own.
+    """
+
+    def setUp(self):
+        metrics.reset()
+        self.queue = OutboundQueue(5, 100)
+
+    def tearDown(self):
+        metrics.reset()
+
+    def drain(self):
+        """
+        Take everything off the queue.
+        """
+
+        result = []
+        while not self.queue.empty():
+            result.append(self.queue.get_nowait())
+        return result
+
+    def test_fifo(self):
+        """
+        Make sure packets come out in the order they went in.
+        """
+
+        self.assertTrue(self.queue.put_frame("chat", "a"))
+        self.queue.put_nowait("2::")
+        self.assertTrue(self.queue.put_frame("chat", "b"))
+        self.assertEqual(self.queue.qsize(), 3)
+        self.assertEqual(self.queue.num_bytes, 5)
+        self.assertEqual(self.drain(), ["a", "2::", "b"])
+        self.assertEqual(self.queue.num_bytes, 0)
+        self.assertRaises(Empty, self.queue.get_nowait)
+        self.assertRaises(Empty, self.queue.get, timeout=0.01)
+
+    def test_blocking_get(self):
+        """
+        Make sure a get waits for something to be put.
+        """
+
+        getter = gevent.spawn(self.queue.get)
+        gevent.sleep(0)
+        self.queue.put_frame("chat", "a")
+        self.assertEqual(getter.get(timeout=1), "a")
+
+    def test_coalesce(self):
+        """
+        Make sure a new state replaces the old one and any transitions that
+        came before it, but nothing else.
+        """
+
+        self.queue.put_frame("state", "s1")
+        self.queue.put_frame("state_transitions", "t1")
+        self.queue.put_frame("action_update", "a1")
+        self.queue.put_frame("chat", "c1")
+        self.queue.put_frame("player_names", "p1")
+        self.queue.put_frame("state", "s2")
+        self.queue.put_frame("action_update", "a2")
+        self.queue.put_frame("player_names", "p2")
+        self.assertEqual(self.drain(), ["c1", "s2", "a2", "p2"])
+        self.assertEqual(metrics.EVENTS_DROPPED[("coalesced", "state")], 1)
+        self.assertEqual(
+            metrics.EVENTS_DROPPED[("coalesced", "action_update")], 1)
+        self.assertEqual(
+            metrics.EVENTS_DROPPED[("coalesced", "player_names")], 1)
+
+    def test_evict(self):
+        """
+        Make sure going over either limit throws everything away until the
+        queue is reset.
+        """
+
+        for _ in range(5):
+            self.assertTrue(self.queue.put_frame("chat", "a"))
+        self.queue.put_nowait(None)
+        self.assertFalse(self.queue.put_frame("chat", "a"))
+        self.assertTrue(self.queue.evicted)
+        # The transport still gets told to stop
+        self.assertEqual(self.drain(), [None])
+        self.assertEqual(metrics.EVENTS_DROPPED[("evicted", "chat")], 6)
+
+        self.assertFalse(self.queue.put_frame("chat", "a"))
+        self.queue.reset()
+        self.assertTrue(self.queue.put_frame("chat", "a" * 100))
+        self.assertFalse(self.queue.put_frame("chat", "a"))
+        self.assertEqual(self.queue.num_bytes, 0)
+
+    def test_evict_keeps_heartbeats(self):
+        """
+        Make sure packets gevent-socketio queued itself survive an eviction.
+        """
+
+        self.queue.put_frame("chat", "a")
+        self.queue.put_nowait("2::")
+        self.queue.put_frame("state", "s" * 100)
+        self.assertTrue(self.queue.evicted)
+        self.assertEqual(self.queue.num_bytes, 3)
+        self.assertEqual(self.drain(), ["2::"])
+        self.assertEqual(self.queue.num_bytes, 0)
+
+    def test_install(self):
+        """
+        Make sure installing moves over anything queued and wakes up whatever
+        is waiting on the old queue.
+        """
+
+        socket = MagicMock()
+        old_queue = socket.client_queue = Queue()
+        old_queue.put_nowait("1::/game")
+        with override_settings(SOCKET_QUEUE_MAX_MESSAGES=7):
+            queue = outbound.install(socket)
+        self.assertIs(socket.client_queue, queue)
+        self.assertEqual(queue.max_messages, 7)
+        self.assertEqual(queue.get_nowait(), "1::/game")
+        self.assertEqual(old_queue.get_nowait(), outbound.NOOP)
+        self.assertIs(outbound.install(socket), queue)
+
+
+class EvictionTestCase(SocketTestCase):
+
+    """
+    Test what happens to a connection that falls behind.
+    """
+
+    def setUp(self):
+        super(EvictionTestCase, self).setUp()
+        self.namespace = GameNamespace(self.environ, '/game')
+        self.namespace.outbound.max_messages = 3
+        self.namespace.join_room('1')
+        self.other = GameNamespace(self.environ, '/game')
+        self.other.socket = MagicMock()
+        self.other.outbound = OutboundQueue(100, 10000)
+        self.other.join_room('1')
+
+    def tearDown(self):
+        self.namespace.disconnect()
+        self.other.disconnect()
+
+    def test_evict(self):
+        """
+        A connection that can't keep up is taken out of the room and told to
+        resync, without holding up anyone else. Once it talks to us again it
+        can be sent things.
+        """
+
+        self.namespace.state_version = 4
+        for _ in range(4):
+            self.namespace.emit_to_room('1', 'chat', 'hello')
+
+        self.assertNotIn(self.namespace, ROOMS['1'])
+        self.assertEqual(self.namespace.room, '1')
+        self.assertIsNone(self.namespace.state_version)
+        self.assertEqual(self.other.outbound.qsize(), 4)
+        queue = self.namespace.socket.client_queue
+        names = []
+        while not queue.empty():
+            data = queue.get_nowait()
+            if data.startswith('5:'):
+                names.append(packet.decode(data)['name'])
+        self.assertEqual(names, ['resync'])
+
+        self.namespace.emit('error', 'dropped')
+        self.assertTrue(queue.empty())
+        self.namespace.process_event({'type': 'event',
+                                      'name': 'join_as_spectator',
+                                      'args': ['foo']})
+        self.assertFalse(queue.empty())
@@ -0,0 +1,105 @@
+"""
+Test cases for the room cache.
+"""
+
+from django.test import TestCase
+
+from deckr import room_cache
+from deckr.models import GameDefinition, GameRoom, Player
+
+
+class RoomCacheTestCase(TestCase):
+
+    """
+    Make sure the cache loads rooms once and follows changes to them.
+    """
+
+    def setUp(self):
+        room_cache.clear()
+        self.game_def = GameDefinition.objects.create(name="Foo",
+                                                      path="/bar")
+        self.game_room = GameRoom.objects.create(room_id=1,
+                                                 max_players=4,
+                                                 game_definition=self.game_def)
+        self.player1 = Player.objects.create(player_id=1, nickname="one",
+                                             game_room=self.game_room)
+        self.player2 = Player.objects.create(player_id=2, nickname="two",
+                                             game_room=self.game_room)
+
+    def tearDown(self):
+        room_cache.clear()
+
+    def test_load_once(self):
+        """
+        Make sure a room and its players are only queried the first time.
+        """
+
+        with self.assertNumQueries(2):
+            room = room_cache.get_room(self.game_room.pk)
+        self.assertEqual(room, self.game_room)
+
+        with self.assertNumQueries(0):
+            players = room_cache.get_players(self.game_room.pk)
+            player = room_cache.get_player(self.game_room.pk,
+                                           self.player2.pk)
+        self.assertEqual(players, [self.player1, self.player2])
+        self.assertEqual(player, self.player2)
+
+    def test_missing(self):
+        """
+        Make sure we get nothing back for rooms and players that don't
+        exist, or players from another room.
+        """
+
+        other_room = GameRoom.objects.create(room_id=2,
+                                             game_definition=self.game_def)
+        other_player = Player.objects.create(player_id=1, nickname="other",
+                                             game_room=other_room)
+
+        self.assertIsNone(room_cache.get_room(0))
+        self.assertEqual(room_cache.get_players(0), [])
+        self.assertIsNone(room_cache.get_player(0, self.player1.pk))
+        self.assertIsNone(room_cache.get_player(self.game_room.pk, 0))
+        self.assertIsNone(room_cache.get_player(self.game_room.pk,
+                                                other_player.pk))
+
+    def test_signals(self):
+        """
+        Make sure saving and deleting rooms and players updates the cache.
+        """
+
+        room_cache.get_room(self.game_room.pk)
+
+        player3 = Player.objects.create(player_id=3, nickname="three",
+                                        game_room=self.game_room)
+        self.player1.nickname = "uno"
+        self.player1.save()
+        self.player2.delete()
+        with self.assertNumQueries(0):
+            players = room_cache.get_players(self.game_room.pk)
+        self.assertEqual(players, [self.player1, player3])
+        self.assertEqual(players[0].nickname, "uno")
+
+        self.game_room.max_players = 3
+        self.game_room.save()
+        self.assertEqual(room_cache.get_room(self.game_room.pk).max_players,
+                         3)
+
+        self.game_room.delete()
+        self.assertNotIn(self.game_room.pk, room_cache.CACHE)
+        self.assertIsNone(room_cache.get_room(self.game_room.pk))
+
+    def test_player_from_elsewhere(self):
+        """
+        Make sure a player the signals didn't tell us about is still found.
+        """
+
+        room_cache.get_room(self.game_room.pk)
+        room_cache.CACHE[self.game_room.pk].players.pop(self.player1.pk)
+
+        with self.assertNumQueries(1):
+            player = room_cache.get_player(self.game_room.pk,
+                                           self.player1.pk)
+        self.assertEqual(player, self.player1)
+        with self.assertNumQueries(0):
+            room_cache.get_player(self.game_room.pk, self.player1.pk)
@@ -4,9 +4,11 @@ Unit tests for deckr websockets.
 
 from django.test import TestCase
 
+from deckr import room_cache, wire
 from deckr.models import GameDefinition, GameRoom, Player
-from deckr.sockets import ChatNamespace, GameNamespace, ROOMS
+from deckr.sockets import ChatNamespace, GameNamespace, ROOMS, encode_frame
 from mock import MagicMock
+from socketio import packet
 from socketio.virtsocket import Socket
 
 
@@ -54,6 +56,8 @@ class SocketTestCase(TestCase):
     """
 
     def setUp(self):
+        # Rolling back each test doesn't tell the cache anything.
+        room_cache.clear()
         self.server = MockSocketIOServer()
         self.environ = {}
         self.socket = MockSocket(self.server, {})
@@ -99,6 +103,7 @@ class GameNamespaceTestCase(SocketTestCase):
         self.namespace.broadcast_event = MagicMock()
         self.namespace.emit = MagicMock()
         self.namespace.emit_to_room = MagicMock()
+        self.namespace.send_frame = MagicMock()
         # Mock out the game runner
         self.namespace.runner = MockGameRunner()
         self.namespace.runner.add_player = MagicMock()
@@ -109,6 +114,10 @@ class GameNamespaceTestCase(SocketTestCase):
         self.namespace.runner.get_public_transitions = MagicMock()
         self.namespace.runner.get_player_transitions = MagicMock()
         self.namespace.runner.get_expected_action = MagicMock()
+        self.namespace.runner.get_state_version = MagicMock()
+        self.namespace.runner.get_state_version.return_value = 1
+        self.namespace.runner.get_transitions_since = MagicMock()
+        self.namespace.runner.get_action_update = MagicMock()
         self.game_def = GameDefinition.objects.create(name="test",
                                                       path="test")
         self.game_room = GameRoom.objects.create(room_id=0,
@@ -127,6 +136,19 @@ class GameNamespaceTestCase(SocketTestCase):
     def tearDown(self):
         self.namespace.flush()
 
+    def sent_events(self, namespace=None):
+        """
+        Decode every frame sent to a namespace into a list of (event, args).
+        """
+
+        namespace = namespace or self.namespace
+        result = []
+        for args, _ in namespace.send_frame.call_args_list:
+            data = packet.decode(args[1])
+            self.assertEqual(data['name'], args[0])
+            result.append((data['name'], data.get('args', [])))
+        return result
+
     def test_join(self):
         """
         Make sure that when we get a socket connection we create a player
@@ -194,19 +216,28 @@ class GameNamespaceTestCase(SocketTestCase):
 
         valid_move = {"action": "valid move"}
         transitions = [{}]
-        self.namespace.runner.make_action.return_value = (True, None)
-        self.namespace.runner.get_public_transitions.return_value = transitions
+        runner = self.namespace.runner
+        runner.make_action.return_value = (True, None)
+        recipient = (0, self.namespace.player.player_id)
+        runner.get_action_update.return_value = {
+            'version': 1, 'public_transitions': transitions,
+            'expected_action': ["select", "card"],
+            'transitions': {recipient: transitions}}
+        self.namespace.state_version = 0
 
         self.namespace.on_action(valid_move)
-        self.namespace.emit_to_room.assert_any_call(self.namespace.room,
-                                                    "state_transitions",
-                                                    transitions)
-
-        expected_text_box_data = (self.namespace.player.nickname, transitions,
-                                  self.namespace.runner.get_state())
-        self.namespace.emit_to_room.assert_any_call(self.namespace.room,
-                                                    "textbox_data",
-                                                    expected_text_box_data)
+        runner.get_action_update.assert_called_with(self.game_room.room_id,
+                                                    [recipient])
+        self.assertEqual(self.namespace.state_version, 1)
+
+        # Everything comes in one event
+        self.assertEqual(self.sent_events(), [
+            ('action_update', [{
+                'transitions': transitions,
+                'version': 1,
+                'textbox_data': [self.namespace.player.nickname,
+                                 transitions, 1],
+                'expected_action': ["select", "card"]}])])
 
     def test_private_transitions(self):
         """
@@ -215,37 +246,146 @@ class GameNamespaceTestCase(SocketTestCase):
         """
 
         valid_move = {"action": "valid move"}
-        transitions = [("move", 1, 1)]
-        player_1_transitions = [("set", "Card", 1, "face_up", True)]
+        transitions = [["move", 1, 1]]
+        player_1_transitions = transitions + [["set", "Card", 1, "face_up",
+                                               True]]
 
-        def per_player_transitions(_, player_id):
-            """
-            Turn Card1 face up for player 1 only.
-            """
+        spectator = GameNamespace(self.environ, '/game')
+        spectator.send_frame = MagicMock()
+        spectator.runner = self.namespace.runner
+        spectator.join_room(self.namespace.room)
+        spectator.game_room = self.game_room
+        spectator.state_version = 0
 
-            if player_id == self.player.player_id:
-                return player_1_transitions
+        runner = self.namespace.runner
+        runner.make_action.return_value = (True, None)
+        runner.get_action_update.return_value = {
+            'version': 1, 'public_transitions': transitions,
+            'expected_action': None,
+            'transitions': {(0, self.player.player_id): player_1_transitions,
+                            (0, None): transitions}}
+        self.namespace.state_version = 0
+
+        self.namespace.on_action(valid_move)
+        # A single call for the whole room
+        self.assertEqual(runner.get_action_update.call_count, 1)
+        self.assertEqual(
+            sorted(runner.get_action_update.call_args[0][1]),
+            [(0, None), (0, self.player.player_id)])
+
+        # Make sure that we emit private information
+        update = self.sent_events()[0][1][0]
+        self.assertEqual(update['transitions'], player_1_transitions)
+        self.assertEqual(update['textbox_data'],
+                         [self.namespace.player.nickname, transitions, 1])
+        # but only to the player
+        update = self.sent_events(spectator)[0][1][0]
+        self.assertEqual(update['transitions'], transitions)
+        spectator.disconnect()
+
+    def test_move_without_history(self):
+        """
+        If a connection doesn't have a copy of the state, or the game can't
+        tell us what changed since its version, we send the whole state.
+        """
 
+        state = {'foo': 'bar'}
+        valid_move = {"action": "valid move"}
+        player_id = self.namespace.player.player_id
         runner = self.namespace.runner
         runner.make_action.return_value = (True, None)
-        runner.get_public_transitions.return_value = transitions
-        runner.get_player_transitions.side_effect = per_player_transitions
+        runner.get_state.return_value = state
+        runner.get_action_update.return_value = {
+            'version': 1, 'public_transitions': [], 'expected_action': None,
+            'transitions': {(None, player_id): None}}
 
         self.namespace.on_action(valid_move)
-        # Make sure that we broadcast public information
-        self.namespace.emit_to_room.assert_any_call(self.namespace.room,
-                                                    "state_transitions",
-                                                    transitions)
+        self.assertEqual([x[0] for x in self.sent_events()],
+                         ['state', 'action_update'])
+        self.assertEqual(self.sent_events()[0][1], [state, 1])
+        self.assertIsNone(self.sent_events()[1][1][0]['transitions'])
+
+        runner.get_state_version.return_value = 2
+        runner.get_action_update.return_value = {
+            'version': 2, 'public_transitions': [], 'expected_action': None,
+            'transitions': {(1, player_id): None}}
+        self.namespace.on_action(valid_move)
+        runner.get_action_update.assert_called_with(
+            self.game_room.room_id, [(1, player_id)])
+        self.assertEqual(self.sent_events()[2][1], [state, 2])
+        self.assertEqual(self.namespace.state_version, 2)
 
-        expected_text_box_data = (self.namespace.player.nickname, transitions,
-                                  self.namespace.runner.get_state())
-        self.namespace.emit_to_room.assert_any_call(self.namespace.room,
-                                                    "textbox_data",
-                                                    expected_text_box_data)
+    def test_broadcast_frames_shared(self):
+        """
+        Connections that are given the same transitions are sent the very
+        same frame.
+        """
 
-        # Make sure that we emit private information
-        self.namespace.emit.assert_any_call("state_transitions",
-                                            player_1_transitions)
+        transitions = [["move", 1, 1]]
+        runner = self.namespace.runner
+        runner.make_action.return_value = (True, None)
+        # Nothing private happened, so everyone gets the public transitions
+        runner.get_action_update.return_value = {
+            'version': 1, 'public_transitions': transitions,
+            'expected_action': None,
+            'transitions': {(0, self.player.player_id): transitions,
+                            (0, None): transitions}}
+        self.namespace.state_version = 0
+
+        spectators = [GameNamespace(self.environ, '/game') for _ in range(3)]
+        for spectator in spectators:
+            spectator.send_frame = MagicMock()
+            spectator.join_room(self.namespace.room)
+            spectator.game_room = self.game_room
+            spectator.state_version = 0
+
+        self.namespace.on_action({"action": "valid move"})
+        frame = self.namespace.send_frame.call_args[0][1]
+        for spectator in spectators:
+            self.assertIs(spectator.send_frame.call_args[0][1], frame)
+            self.assertEqual(spectator.state_version, 1)
+            spectator.disconnect()
+
+    def test_encode_frame(self):
+        """
+        Frames built from encoded arguments are the same as the packets
+        socket.io builds.
+        """
+
+        frame = encode_frame('foo', ['1', '{"a":[2]}'])
+        self.assertEqual(packet.decode(frame),
+                         packet.decode(self.namespace.encode_event(
+                             'foo', 1, {'a': [2]})))
+
+    def test_ack_state(self):
+        """
+        A client can tell us what version it holds and get back only the
+        transitions it's missing.
+        """
+
+        transitions = [("set", "Card", 1, "face_up", True)]
+        runner = self.namespace.runner
+        runner.get_transitions_since.return_value = transitions
+
+        self.assertTrue(self.namespace.on_ack_state("0"))
+        runner.get_transitions_since.assert_called_with(
+            self.game_room.room_id, 0, self.namespace.player.player_id)
+        self.namespace.emit.assert_called_with("state_transitions",
+                                               transitions, 1)
+
+        # An older version than we've already sent shouldn't rewind us.
+        self.namespace.on_ack_state(0)
+        runner.get_transitions_since.assert_called_with(
+            self.game_room.room_id, 1, self.namespace.player.player_id)
+
+        self.assertFalse(self.namespace.on_ack_state("foo"))
+        self.namespace.emit.assert_called_with(
+            "error", "State version is not an integer.")
+
+        self.namespace.game_room = None
+        self.assertFalse(self.namespace.on_ack_state(1))
+        self.namespace.emit.assert_called_with(
+            "error", "Please connect to a game room first.")
 
     def test_request_state(self):
         """
@@ -260,9 +400,10 @@ class GameNamespaceTestCase(SocketTestCase):
         runner.get_state.return_value = state
 
         self.assertTrue(self.namespace.on_request_state())
-        self.namespace.emit.assert_called_with("state", state)
+        self.assertEqual(self.sent_events(), [("state", [state, 1])])
         runner.get_state.assert_called_with(self.game_room.room_id,
                                             self.namespace.player.player_id)
+        self.assertEqual(self.namespace.state_version, 1)
 
         # Test that we get an error if we call this without a room
         self.namespace.game_room = None
@@ -270,6 +411,47 @@ class GameNamespaceTestCase(SocketTestCase):
 
         self.namespace.emit.assert_called_with("error", error)
 
+    def test_compact_encoding(self):
+        """
+        A client can ask for the compact encoding, and gets the verbose one
+        if it asks for something we don't know.
+        """
+
+        runner = self.namespace.runner
+        state = {'cards': [{'game_id': 1, 'definition': 0}],
+                 'catalog_version': 'abc'}
+        runner.get_state.return_value = state
+        runner.get_card_catalog = MagicMock(return_value={
+            'version': 'abc', 'cards': [{'name': 'Copper'}]})
+        self.assertTrue(self.namespace.on_set_encoding('compact'))
+        self.namespace.emit.assert_called_with('encoding', 'compact')
+
+        # Without the catalog the definitions come with the state
+        self.assertTrue(self.namespace.on_request_state())
+        runner.get_state.assert_called_with(self.game_room.room_id,
+                                            self.namespace.player.player_id,
+                                            True)
+        self.assertEqual(self.sent_events()[-1], (
+            'state', [wire.encode_state(
+                dict(state, definitions=[{'name': 'Copper'}])), 1]))
+
+        # With it they don't
+        self.assertTrue(self.namespace.on_set_encoding('compact', 'abc'))
+        self.assertTrue(self.namespace.on_request_state())
+        self.assertEqual(self.sent_events()[-1],
+                         ('state', [wire.encode_state(state), 1]))
+
+        runner.get_transitions_since.return_value = [('move', 1, 2)]
+        self.assertTrue(self.namespace.send_state_update())
+        self.namespace.emit.assert_called_with(
+            'state_transitions', [['move'], [[0, 1, 2]]], 1)
+
+        self.assertTrue(self.namespace.on_set_encoding('msgpack'))
+        self.namespace.emit.assert_called_with('encoding', 'compact')
+        self.namespace.encoding = 'verbose'
+        self.assertTrue(self.namespace.on_set_encoding('msgpack'))
+        self.namespace.emit.assert_called_with('encoding', 'verbose')
+
     def test_update_player_list(self):
         """
         If a game room player list changes, broadcast the updated information
@@ -303,9 +485,22 @@ class GameNamespaceTestCase(SocketTestCase):
                                                        'player_names',
                                                        player_names)
 
+        # Keeping the same nickname doesn't save or broadcast anything
+        self.namespace.emit_to_room.reset_mock()
+        self.namespace.emit.reset_mock()
         same_nickname = self.namespace.player.nickname
-        self.assertFalse(self.namespace.on_update_nickname(same_nickname))
+        self.assertTrue(self.namespace.on_update_nickname(same_nickname))
+        self.assertFalse(self.namespace.emit_to_room.called)
+        self.assertFalse(self.namespace.emit.called)
+
+        # A nickname someone else has is rejected
+        self.game_room.max_players = 2
+        self.game_room.save()
+        Player.objects.create(player_id=2, nickname="taken",
+                              game_room=self.game_room)
+        self.assertFalse(self.namespace.on_update_nickname("taken"))
         self.namespace.emit.assert_called_with("error", "Invalid nickname")
+        self.assertEqual(self.namespace.player.nickname, same_nickname)
 
         self.namespace.game_room = None
         new_nickname = self.namespace.player.nickname + "_new"
@@ -327,7 +522,9 @@ class GameNamespaceTestCase(SocketTestCase):
 
         self.assertEqual(Player.objects.all().count(), 1)
         self.assertEqual(GameRoom.objects.all().count(), 1)
+        room = self.namespace.room
         self.assertTrue(self.namespace.on_destroy_game())
+        self.assertNotIn(room, ROOMS)
         self.assertEqual(Player.objects.all().count(), 0)
         self.assertEqual(GameRoom.objects.all().count(), 0)
         self.namespace.emit.assert_called_with('leave_game')
@@ -362,8 +559,11 @@ class GameNamespaceTestCase(SocketTestCase):
         self.assertEqual(GameRoom.objects.all().count(), 1)
         self.namespace.emit.assert_called_with('leave_game')
 
+        room = self.namespace.room
         self.namespace.player = self.game_room.player_set.all()[0]
         self.assertTrue(self.namespace.on_leave_game())
+        # Nobody is left so nobody should be sent anything
+        self.assertNotIn(room, ROOMS)
         self.assertEqual(Player.objects.all().count(), 0)
         self.assertEqual(GameRoom.objects.all().count(), 0)
         self.namespace.emit.assert_called_with('leave_game')
@@ -385,9 +585,12 @@ class GameNamespaceTestCase(SocketTestCase):
                                      "Not enough players have joined yet")
 
         self.namespace.runner.start_game.return_value = True
+        self.namespace.runner.get_state.return_value = {'foo': 'bar'}
         self.namespace.on_start()
-        self.namespace.emit_to_room.expect_any_call(self.namespace.room,
+        self.namespace.emit_to_room.assert_any_call(self.namespace.room,
                                                     'start')
+        # Everybody gets a fresh copy of the state
+        self.assertIn(("state", [{'foo': 'bar'}, 1]), self.sent_events())
 
     def test_room_functionality(self):
         """
@@ -399,8 +602,8 @@ class GameNamespaceTestCase(SocketTestCase):
         namespace1 = GameNamespace(self.environ, '/game')
         namespace2 = GameNamespace(self.environ, '/game')
 
-        namespace1.emit = MagicMock()
-        namespace2.emit = MagicMock()
+        namespace1.send_frame = MagicMock()
+        namespace2.send_frame = MagicMock()
         namespace1.broadcast_event = MagicMock()
         namespace2.broadcast_event = MagicMock()
 
@@ -409,9 +612,12 @@ class GameNamespaceTestCase(SocketTestCase):
 
         self.assertEqual(len(ROOMS[room_name]), 2)
 
-        namespace1.emit_to_room(room_name, 'foo')
-        namespace1.emit.assert_any_call('foo')
-        namespace2.emit.assert_any_call('foo')
+        namespace1.emit_to_room(room_name, 'foo', 1)
+        self.assertEqual(self.sent_events(namespace1), [('foo', [1])])
+        self.assertEqual(self.sent_events(namespace2), [('foo', [1])])
+        # The event is only encoded once
+        self.assertIs(namespace1.send_frame.call_args[0][1],
+                      namespace2.send_frame.call_args[0][1])
 
         # Try both ways of disconnecting
         namespace1.disconnect()
@@ -434,7 +640,7 @@ class GameNamespaceTestCase(SocketTestCase):
 
     def test_spectator_request_state(self):
         """
-        If a spectator requests the state, send back another player 1's state
+        If a spectator requests the state, send back the public state
         """
         state = {'foo': 'bar'}
 
@@ -449,13 +655,12 @@ class GameNamespaceTestCase(SocketTestCase):
         self.player = None
         self.namespace.player = None
         self.assertTrue(self.namespace.on_request_state())
-        self.namespace.emit.assert_called_with("state", state)
-        runner.get_state.assert_called_with(self.game_room.room_id,
-                                            player.player_id)
+        self.assertEqual(self.sent_events(), [("state", [state, 1])])
+        runner.get_state.assert_called_with(self.game_room.room_id, None)
 
-        # When no one is in the room
+        # Even when no one is in the room
         player.delete()
-        self.assertFalse(self.namespace.on_request_state())
+        self.assertTrue(self.namespace.on_request_state())
 
     def test_spectator_leave_room(self):
         """
@@ -2,6 +2,7 @@
 Test all of the Django views used by deckr.
 """
 
+import json
 import tempfile
 
 from django.core.urlresolvers import reverse
@@ -10,7 +11,8 @@ from django.test.utils import override_settings
 
 import deckr.views
 from deckr.models import GameDefinition, GameRoom, Player
-from mock import MagicMock
+from engine import game_runner
+from mock import MagicMock, patch
 
 MOCK_GAME = "engine/tests/mock_game"
 
@@ -100,7 +102,8 @@ class CreatePlayerTestCase(TestCase):
                                                  max_players=1)
 
         # Mock out the add player function
-        deckr.views.game_runner = MagicMock()
+        self.runner = MagicMock()
+        deckr.views.get_game_runner = MagicMock(return_value=self.runner)
 
     def test_can_access(self):
         """
@@ -119,7 +122,7 @@ class CreatePlayerTestCase(TestCase):
         """
 
         error_msg = "Failed to join"
-        deckr.views.game_runner.add_player.side_effect = ValueError(error_msg)
+        self.runner.add_player.side_effect = ValueError(error_msg)
         form_data = {'nickname': "Player 1"}
         response = self.client.post(reverse('deckr.game_room_staging_area',
                                             args=(self.game_room.pk,)),
@@ -132,7 +135,7 @@ class CreatePlayerTestCase(TestCase):
         Check form validations and player creation
         """
 
-        deckr.views.game_runner.add_player.return_value = 1
+        self.runner.add_player.return_value = 1
 
         form_data = {'nickname': "Player 1"}
 
@@ -200,6 +203,86 @@ class GamePageTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class CardCatalogTestCase(TestCase):
+
+    """
+    Test the card catalog that clients cache.
+    """
+
+    def setUp(self):
+        deckr.views.CATALOGS.clear()
+        self.client = Client()
+        self.game_def = GameDefinition.objects.create(
+            name="dominion", path="game_defs/dominion")
+
+    def tearDown(self):
+        deckr.views.CATALOGS.clear()
+
+    def test_can_access(self):
+        """
+        Make sure we get every card and can cache them.
+        """
+
+        url = reverse('deckr.card_catalog', args=(self.game_def.pk,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        catalog = json.loads(response.content)
+        self.assertIn("Copper", [x["name"] for x in catalog["cards"]])
+        self.assertEqual(response["ETag"], '"%s"' % catalog["version"])
+        self.assertIn("max-age=3600", response["Cache-Control"])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(reverse('deckr.card_catalog',
+                                           args=(self.game_def.pk + 1,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_built_once(self):
+        """
+        Make sure the catalog is only built again once the definition
+        changes.
+        """
+
+        url = reverse('deckr.card_catalog', args=(self.game_def.pk,))
+        catalogs = deckr.views.CATALOGS
+        wrapped = game_runner.get_definition_card_catalog
+        with patch.object(game_runner, 'get_definition_card_catalog',
+                          wraps=wrapped) as get_catalog:
+            content = self.client.get(url).content
+            self.assertEqual(self.client.get(url).content, content)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"foo"')
+            self.assertEqual(response.content, content)
+            self.assertEqual(get_catalog.call_count, 1)
+
+            # Pretend the files changed since it was built.
+            _, etag, content = catalogs[self.game_def.path]
+            catalogs[self.game_def.path] = ((0,), etag, content)
+            self.client.get(url)
+            self.assertEqual(get_catalog.call_count, 2)
+
+
+    def test_uses_runner(self):
+        """
+        Make sure everything comes from the runner, which may be running
+        the definitions in other processes.
+        """
+
+        runner = MagicMock()
+        runner.get_definition_version.return_value = (1,)
+        runner.get_definition_card_catalog.return_value = {"version": "abc",
+                                                           "cards": []}
+        url = reverse('deckr.card_catalog', args=(self.game_def.pk,))
+        with patch.object(deckr.views, 'get_game_runner',
+                          return_value=runner), \
+                patch.object(game_runner, 'get_game_definition') as load:
+            response = self.client.get(url)
+        self.assertEqual(json.loads(response.content),
+                         {"version": "abc", "cards": []})
+        self.assertEqual(response["ETag"], '"abc"')
+        self.assertFalse(load.called)
+
+
 class UploadGameDefTestCase(TestCase):
 
     """
@@ -0,0 +1,73 @@
+"""
+Unit tests for the encodings we send the state and transitions in.
+"""
+
+from django.test import TestCase
+
+from deckr import wire
+
+
+def decode_object(data, row):
+    """
+    Decode a compact object the same way sockets.js does.
+    """
+
+    shape = data["shapes"][row[0]]
+    return dict((data["strings"][key], value)
+                for key, value in zip(shape, row[1:]))
+
+
+class WireTestCase(TestCase):
+
+    """
+    Make sure the compact encoding holds everything the verbose one does.
+    """
+
+    def test_encode_state(self):
+        """
+        Objects share their attribute names, and cards keep pointing at their
+        definitions.
+        """
+
+        state = {"definitions": [{"name": "Copper", "value": 1}],
+                 "cards": [{"game_id": 1, "face_up": False, "definition": 0},
+                           {"game_id": 2, "face_up": True, "definition": 0},
+                           {"game_id": 3, "face_up": True}],
+                 "players": [{"game_id": 1, "zones": {}}],
+                 "zones": []}
+
+        data = wire.encode_state(state)
+        for key in ("definitions", "cards", "players", "zones"):
+            self.assertEqual([decode_object(data, x) for x in data[key]],
+                             state[key])
+        # Both cards with definitions have the same shape.
+        self.assertEqual(data["cards"][0][0], data["cards"][1][0])
+        self.assertEqual(len(data["shapes"]), 4)
+        self.assertEqual(len(data["strings"]),
+                         len(set(data["strings"])))
+
+        self.assertIs(wire.encode_state(state, "verbose"), state)
+
+    def test_encode_transitions(self):
+        """
+        Transition and attribute names are sent once per payload.
+        """
+
+        transitions = [("set", "Card", 1, "face_up", True),
+                       ("set", "Card", 2, "face_up", False),
+                       ("move", 1, 2),
+                       ("is_over", [1]),
+                       (),
+                       (1, "odd")]
+        strings, rows = wire.encode_transitions(transitions)
+        self.assertEqual(strings, ["set", "Card", "face_up", "move",
+                                   "is_over"])
+        self.assertEqual(rows, [[0, 1, 1, 2, True],
+                                [0, 1, 2, 2, False],
+                                [3, 1, 2],
+                                [4, [1]],
+                                {"raw": ()},
+                                {"raw": (1, "odd")}])
+
+        self.assertIs(wire.encode_transitions(transitions, "verbose"),
+                      transitions)
@@ -22,6 +22,11 @@ GAME_ROOM = url(r'^game_room/(?P<game_room_id>[0-9]+)/',
                 'deckr.views.game_room',
                 name='deckr.game_room')
 
+CARD_CATALOG = url(r'^game_definition/(?P<game_definition_id>[0-9]+)/'
+                   r'card_catalog/',
+                   'deckr.views.card_catalog',
+                   name='deckr.card_catalog')
+
 UPLOAD_GAME_DEFINITION = url(r'^upload_game_definition/',
                              'deckr.views.upload_game_definition',
                              name='deckr.upload_game_definition')
@@ -35,4 +40,5 @@ urlpatterns = patterns(  # pylint: disable=C0103
     STAGING_AREA,
     CREATE_GAME_ROOM,
     UPLOAD_GAME_DEFINITION,
+    CARD_CATALOG,
     GAME_ROOM)
\ No newline at end of file
@@ -8,6 +8,8 @@ import re
 
 from django.conf import settings
 
+from engine import game_runner, sharded_runner
+
 
 def process_uploaded_file(game_name, fin):
     """
@@ -42,3 +44,14 @@ def process_uploaded_file(game_name, fin):
         return game_def_path
     else:
         raise ValueError('Zipped file fails to match expected structure')
+
+
+def get_game_runner():
+    """
+    Returns the runner that holds the games. This is the sharded runner if its
+    worker processes have been started and the plain game_runner otherwise.
+    """
+
+    if sharded_runner.is_running():
+        return sharded_runner
+    return game_runner
@@ -6,20 +6,28 @@ Stores all the view logic for deckr.
 # form. So we disable the no-value-for-parameter here.
 # pylint: disable=no-value-for-parameter
 
+import json
 from os.path import join as pjoin
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.urlresolvers import reverse
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template import Template
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 from deckr.forms import (CreateGameRoomForm, PlayerForm,
                          UploadGameDefinitionForm)
 from deckr.models import GameDefinition, GameRoom, Player
 from deckr.sockets import ChatNamespace  # pylint: disable=unused-import
-from deckr.utils import process_uploaded_file
-from engine import game_runner
+from deckr.utils import get_game_runner, process_uploaded_file
 from zipfile import BadZipfile, LargeZipFile
 
+# Maps game definition paths to (definition version, ETag, JSON) for their
+# card catalogs, so each is only built once per version of the definition.
+CATALOGS = {}
+
 
 def index(request):
     """
@@ -43,7 +51,7 @@ def game_room_staging_area(request, game_room_id):
             player = form.save(commit=False)
             player.game_room = room
             try:
-                player.player_id = game_runner.add_player(room.room_id)
+                player.player_id = get_game_runner().add_player(room.room_id)
                 player.save()
                 url = (reverse("deckr.game_room", args=(game_room_id,)) +
                        "?player_id=" + str(player.pk))
@@ -89,6 +97,50 @@ def game_room(request, game_room_id):
                    'player': player})
 
 
+def get_card_catalog(game_definition_id):
+    """
+    Returns the ETag and the JSON of the card catalog for a game definition.
+    These are kept in CATALOGS until the runner reports that the definition's
+    files have changed.
+    """
+
+    path = get_object_or_404(GameDefinition, pk=game_definition_id).path
+    runner = get_game_runner()
+    # Check the version before building the catalog so a change made while
+    # we're building it isn't missed.
+    version = runner.get_definition_version(path)
+    cached = CATALOGS.get(path, None)
+    if cached is not None and cached[0] == version:
+        return cached[1:]
+
+    catalog = runner.get_definition_card_catalog(path)
+    etag = catalog['version']
+    content = json.dumps(catalog, cls=DjangoJSONEncoder)
+    CATALOGS[path] = (version, etag, content)
+    return (etag, content)
+
+
+def card_catalog_etag(request, game_definition_id):
+    """
+    The catalog's version makes a good ETag.
+    """
+
+    return get_card_catalog(game_definition_id)[0]
+
+
+@condition(etag_func=card_catalog_etag)
+@cache_control(public=True, max_age=3600)
+def card_catalog(request, game_definition_id):
+    """
+    Returns every card definition of a game definition as JSON. Clients
+    cache this so that the state they're sent doesn't need to include the
+    definitions.
+    """
+
+    return HttpResponse(get_card_catalog(game_definition_id)[1],
+                        content_type='application/json')
+
+
 def upload_game_definition(request):
     """
     Returns the view to upload a new game.
@@ -105,6 +157,7 @@ def upload_game_definition(request):
                 try:
                     path = process_uploaded_file(game_name,
                                                  request.FILES['file'])
+                    get_game_runner().invalidate_game_definition(path)
                     # Create a new GameDefinition
                     GameDefinition.objects.create(name=game_name,
                                                   path=path)
@@ -136,7 +189,7 @@ def create_game_room(request):
             # Create a game object in the engine
             game_def = form.cleaned_data['game_id']
             path = game_def.path
-            engine_id = game_runner.create_game(path)
+            engine_id = get_game_runner().create_game(path)
             # Crate the GameRoom in the webapp
             room = GameRoom.objects.create(room_id=engine_id,
                                            game_definition=game_def)
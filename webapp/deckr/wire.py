@@ -0,0 +1,128 @@
+"""
+This module encodes the state and transitions we send to clients. Clients
+get the "verbose" encoding (plain dictionaries and lists, exactly as the
+engine gives them to us) unless they ask for something else with the
+set_encoding event. The "compact" encoding makes payloads smaller by:
+
+    * sending each string used as an attribute name, object type or
+      transition type once per payload and referring to it by index after
+      that,
+    * sending the names of the attributes of an object once per distinct set
+      of names (a "shape") instead of once per object,
+    * leaving card definitions out of the state. Clients fetch the card
+      catalog of the game definition once (over HTTP, so it can be cached)
+      and each card refers to its definition by index in the catalog.
+
+A compact state looks like
+
+    {"strings": [...], "shapes": [[string index, ...], ...],
+     "catalog_version": "...", "definitions": [object, ...],
+     "cards": [object, ...], "players": [object, ...], "zones": [object, ...]}
+
+where each object is [shape index, value, value, ...] with one value for each
+attribute in its shape, and cards may have a "definition" attribute giving
+the index of their definition in the catalog. "definitions" is only filled in
+when the client doesn't have the right version of the catalog. Compact
+transitions look like
+
+    [[string, ...], [transition, ...]]
+
+where the type of each transition (and the object type and attribute name of
+a "set") is an index into the strings. A transition that doesn't start with
+its type is sent as {"raw": transition}. sockets.js decodes both back into
+the verbose encoding.
+"""
+
+ENCODINGS = ("verbose", "compact")
+
+
+class StringTable(object):
+
+    """
+    Gives each distinct string an index.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self.indexes = {}
+
+    def index(self, string):
+        """
+        Returns the index of a string, adding it if it's new.
+        """
+
+        index = self.indexes.get(string, None)
+        if index is None:
+            index = self.indexes[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+
+class ShapeTable(object):
+
+    """
+    Turns dictionaries into lists of values by giving each distinct set of
+    keys an index.
+    """
+
+    def __init__(self, strings):
+        self.strings = strings
+        self.shapes = []
+        self.indexes = {}
+
+    def encode(self, obj):
+        """
+        Returns [shape index, value, ...] for a dictionary.
+        """
+
+        keys = tuple(sorted(obj))
+        index = self.indexes.get(keys, None)
+        if index is None:
+            index = self.indexes[keys] = len(self.shapes)
+            self.shapes.append([self.strings.index(x) for x in keys])
+        return [index] + [obj[x] for x in keys]
+
+
+def encode_state(state, encoding="compact"):
+    """
+    Encode the result of Game.get_state. The state should have been made
+    with share_definitions for the compact encoding to leave out the card
+    definitions.
+    """
+
+    if encoding != "compact":
+        return state
+
+    strings = StringTable()
+    shapes = ShapeTable(strings)
+    result = {"catalog_version": state.get("catalog_version", None)}
+    for key in ("definitions", "cards", "players", "zones"):
+        result[key] = [shapes.encode(x) for x in state.get(key, [])]
+    result["strings"] = strings.strings
+    result["shapes"] = shapes.shapes
+    return result
+
+
+def encode_transitions(transitions, encoding="compact"):
+    """
+    Encode a list of transitions.
+    """
+
+    if encoding != "compact":
+        return transitions
+
+    strings = StringTable()
+    rows = []
+    for trans in transitions:
+        if len(trans) == 0 or not isinstance(trans[0], basestring):
+            # Games can add whatever they like, so anything that doesn't
+            # start with a type is passed along as is.
+            rows.append({"raw": trans})
+            continue
+        row = list(trans)
+        row[0] = strings.index(row[0])
+        if trans[0] == "set" and len(row) == 5:
+            row[1] = strings.index(row[1])
+            row[3] = strings.index(row[3])
+        rows.append(row)
+    return [strings.strings, rows]
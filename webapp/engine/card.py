@@ -11,13 +11,48 @@ class Card(StatefulGameObject):
     A Card represents a single instance of a card in the game.
     This class doesn't really have any logic associated with it
     and will mainly act as a container for data about the card.
+
+    A card can be given a definition: a dictionary of attributes (name, cost,
+    etc.) that is shared by every instance of that card. Those attributes can
+    be read like any other attribute but only take up space once. Setting one
+    of them only changes this instance.
     """
 
-    def __init__(self):
+    game_object_type = "Card"
+    no_track_attributes = StatefulGameObject.no_track_attributes | frozenset((
+        "zone",
+        "definition"))
+    exclude_from_dict = StatefulGameObject.exclude_from_dict | frozenset((
+        "definition",))
+
+    def __init__(self, definition=None):
         super(Card, self).__init__()
 
         self.zone = None
-        self.game_object_type = "Card"
-        self.no_track_attributes = set(("zone",))
+        self.definition = definition
 
         self.face_up = False
+
+    def __getattr__(self, name):
+        # Only called when the attribute isn't set on the instance, so fall
+        # back to the shared definition.
+        definition = self.__dict__.get("definition", None)
+        if definition is not None and name in definition:
+            return definition[name]
+        raise AttributeError(name)
+
+    def to_dict(self, player=None, include_definition=True):
+        """
+        This extends the StatefulGameObject to_dict by including all the
+        attributes from the card definition. Anything set on the instance
+        overrides the definition. If include_definition is False only the
+        attributes of this instance are included.
+        """
+
+        result = super(Card, self).to_dict(player)
+        if self.definition is None or not include_definition:
+            return result
+
+        full_result = self.replace_game_objects(self.definition)
+        full_result.update(result)
+        return full_result
@@ -2,20 +2,20 @@
 This module contains the CardSet class.
 """
 
+import hashlib
+import json
+
 from engine.card import Card
 
 
 def create_card_from_dict(card_def):
     """
     This is a simple function that will make a card from a dictionary of
-    attributes.
+    attributes. The dictionary is shared with the card rather than copied
+    onto it, so it shouldn't be changed afterwards.
     """
 
-    card = Card()
-    for attribute in card_def:
-        setattr(card, attribute, card_def[attribute])
-
-    return card
+    return Card(card_def)
 
 
 class CardSet(object):
@@ -23,11 +23,23 @@ class CardSet(object):
     """
     A card set is simply a set of cards. This could be anything from
     52 playing cards to every magic card created. These can be loaded
-    from a configuration file or defined via python.
+    from a configuration file or defined via python. The card definitions are
+    kept here and shared by every card created from them.
     """
 
     def __init__(self):
         self.cards = {}
+        # The result of catalog, once it has been worked out. Maps card names
+        # to their index in the catalog as well.
+        self.catalog_cache = None
+        self.catalog_indexes = None
+
+    def __getstate__(self):
+        # The catalog is worked out again when it's next needed.
+        state = dict(self.__dict__)
+        state["catalog_cache"] = None
+        state["catalog_indexes"] = None
+        return state
 
     def load_from_list(self, card_list):
         """
@@ -43,6 +55,8 @@ class CardSet(object):
             card_name = card_def.get('name', None)
             if card_name is not None:
                 self.cards[card_name] = card_def
+        self.catalog_cache = None
+        self.catalog_indexes = None
 
     def all_cards(self):
         """
@@ -51,6 +65,36 @@ class CardSet(object):
 
         return self.cards.values()
 
+    def catalog(self):
+        """
+        Returns a dictionary with every card definition in the set ("cards",
+        sorted by name) and a "version" that changes whenever any of them do.
+        This is what clients cache so that the state doesn't have to repeat
+        the definitions.
+        """
+
+        if self.catalog_cache is None:
+            cards = [self.cards[x] for x in sorted(self.cards)]
+            data = json.dumps(cards, sort_keys=True, default=repr)
+            self.catalog_cache = {
+                "version": hashlib.sha1(data).hexdigest()[:16],
+                "cards": cards}
+            self.catalog_indexes = dict((x["name"], i)
+                                        for i, x in enumerate(cards))
+        return self.catalog_cache
+
+    def catalog_index(self, card_def):
+        """
+        Returns the index of a card definition in the catalog, or None if it
+        isn't part of this set.
+        """
+
+        catalog = self.catalog()
+        index = self.catalog_indexes.get(card_def.get("name", None), None)
+        if index is None or catalog["cards"][index] is not card_def:
+            return None
+        return index
+
     def create(self, card_name, number=1):
         """
         Create an instance of the card with card_name. If number == 1 then this
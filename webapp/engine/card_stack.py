@@ -0,0 +1,152 @@
+"""
+This module provides the CardStack class.
+"""
+
+import random
+
+# Marks a position in the stack whose card has been removed.
+_REMOVED = object()
+
+
+class CardStack(object):
+
+    """
+    A CardStack is an ordered collection of cards (the last card is the top of
+    the stack). Alongside the order it keeps the position of every card so
+    that checking if a card is in the stack and removing a card from anywhere
+    in the stack are both constant time. Removed cards leave a hole behind
+    that is cleaned up once there are enough of them.
+    """
+
+    def __init__(self, cards=None):
+        self.cards = []
+        self.positions = {}
+        self.num_removed = 0
+
+        if cards is not None:
+            for card in cards:
+                self.append(card)
+
+    def append(self, card):
+        """
+        Put a card on top of the stack. The card must not already be in the
+        stack.
+        """
+
+        self.positions[card] = len(self.cards)
+        self.cards.append(card)
+
+    def remove(self, card):
+        """
+        Remove a card from anywhere in the stack. Raises a ValueError if the
+        card isn't in the stack.
+        """
+
+        position = self.positions.pop(card, None)
+        if position is None:
+            raise ValueError("Card is not in the stack")
+
+        self.cards[position] = _REMOVED
+        self.num_removed += 1
+        self._trim()
+        if self.num_removed > len(self.positions):
+            self._compact()
+
+    def pop(self):
+        """
+        Remove and return the top card of the stack. Raises an IndexError if
+        the stack is empty.
+        """
+
+        if len(self.positions) == 0:
+            raise IndexError("pop from empty stack")
+
+        card = self.cards.pop()
+        del self.positions[card]
+        self._trim()
+        return card
+
+    def peek(self):
+        """
+        Return the top card of the stack, or None if it is empty.
+        """
+
+        if len(self.positions) == 0:
+            return None
+        return self.cards[-1]
+
+    def shuffle(self, shuffler=random.shuffle):
+        """
+        Shuffle the stack in place.
+        """
+
+        self._compact()
+        shuffler(self.cards)
+        self._reindex()
+
+    def clear(self):
+        """
+        Remove every card from the stack.
+        """
+
+        self.cards = []
+        self.positions = {}
+        self.num_removed = 0
+
+    def to_list(self):
+        """
+        Get a list of all the cards, from the bottom of the stack to the top.
+        """
+
+        if self.num_removed == 0:
+            return list(self.cards)
+        return [x for x in self.cards if x is not _REMOVED]
+
+    def _trim(self):
+        """
+        Make sure the top of the stack is an actual card.
+        """
+
+        while len(self.cards) > 0 and self.cards[-1] is _REMOVED:
+            self.cards.pop()
+            self.num_removed -= 1
+
+    def _compact(self):
+        """
+        Get rid of all the holes left behind by removed cards.
+        """
+
+        if self.num_removed > 0:
+            self.cards = self.to_list()
+            self.num_removed = 0
+            self._reindex()
+
+    def _reindex(self):
+        """
+        Rebuild the position of every card.
+        """
+
+        self.positions = dict((card, i) for i, card in enumerate(self.cards))
+
+    def __getstate__(self):
+        # The hole marker is only meaningful in this process, so pickle the
+        # cards alone.
+        return self.to_list()
+
+    def __setstate__(self, state):
+        self.clear()
+        for card in state:
+            self.append(card)
+
+    def __getitem__(self, index):
+        self._compact()
+        return self.cards[index]
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, card):
+        return card in self.positions
@@ -2,11 +2,22 @@
 This module defines everything needed for the base Game class.
 """
 
-from engine.card import Card
+import copy
+import random
+from functools import wraps
+from inspect import getargspec
+
 from engine.card_set import CardSet
+from engine.card_stack import CardStack
+from engine.game_object import GameObject
 from engine.has_zones import HasZones
 from engine.player import Player
-from engine.zone import Zone
+from engine.registry import Registry, type_name
+from engine.transitions import coalesce_transitions
+
+
+# Values of these types are never copied by Game.clone.
+ATOMIC_TYPES = frozenset((type(None), bool, int, long, float, str, unicode))
 
 
 class InvalidMoveException(Exception):
@@ -51,15 +62,32 @@ def action(restriction=None):
         Part of the wrapper to make the decorator work.
         """
 
+        @wraps(func)
         def inner(*args, **kwargs):
             """
             Yet another part of the decorator.
             """
 
-            if restriction is None or restriction(*args, **kwargs):
+            if restriction is None:
+                return func(*args, **kwargs)
+            # Actions are normally methods of a game, so the game is first.
+            profiler = getattr(args[0], "profiler", None) if args else None
+            if profiler is None:
+                allowed = restriction(*args, **kwargs)
+            else:
+                start = profiler.clock()
+                allowed = restriction(*args, **kwargs)
+                profiler.add("restriction", func.__name__,
+                             profiler.clock() - start)
+            if allowed:
                 return func(*args, **kwargs)
             else:
                 raise InvalidMoveException("Invalid Move")
+        # Let anyone looking at the game (see Game.get_actions) know this is
+        # an action and what it takes.
+        inner.is_action = True
+        inner.action_arguments = getargspec(func).args[1:]
+        inner.restriction = restriction
         return inner
     return wrapper
 
@@ -89,6 +117,7 @@ def game_step(requires=None):
         Part of the wrapper to make the decorator work.
         """
 
+        @wraps(func)
         def inner(*args, **kwargs):
             """
             Yet another part of the decorator.
@@ -109,6 +138,21 @@ def game_step(requires=None):
     return wrapper
 
 
+def kwarg_type(key):
+    """
+    Returns the type of object that Game.substitute_kwargs replaces the given
+    keyword argument with, or None if it isn't replaced.
+    """
+
+    if "card" == key or "_card" in key or "cards" == key or "_cards" in key:
+        return "Card"
+    elif "zone" in key:
+        return "Zone"
+    elif "player" in key:
+        return "Player"
+    return None
+
+
 class Game(HasZones):
 
     """
@@ -117,16 +161,15 @@ class Game(HasZones):
     caused by specific actions.
     """
 
+    # An engine.profiling.Profiler to time actions with, or None. Set it here
+    # to profile every game or on a single game to profile just that one.
+    profiler = None
+
     def __init__(self):
         super(Game, self).__init__()
 
-        # registered_objects is a dictionary of all objects that have been
-        # registered with this game. It takes the following form.
-        # { class1 : [next_id, {1 : object1, ...}],
-        #   class2 : [next_id, {1 : object1, ...}]
-        #   ...
-        # }
-        self.registered_objects = {}
+        # Every object that has been registered with this game, by id.
+        self.registry = Registry()
         self.player_zones = []
         self.max_players = 0
         self.min_players = 0
@@ -141,6 +184,29 @@ class Game(HasZones):
         # Where action is one of "move", "add", "remove", "set", "over"
         self.transitions = {}
 
+        # state_version is bumped every time a batch of transitions is
+        # committed. transition_history keeps the last few committed batches
+        # as (version, transitions) tuples so that clients holding an older
+        # version can be sent just the changes since then.
+        self.state_version = 0
+        self.transition_history = []
+        self.max_transition_history = 64
+        # Set whenever the state changes in a way that isn't captured by
+        # transitions (e.g. registering new objects). The next commit will
+        # clear the history so everyone falls back to a full snapshot.
+        self.untracked_changes = False
+        # Objects cache their dictionaries between calls to get_state. Since a
+        # dictionary refers to other objects by id, any change in ids bumps
+        # this generation and makes every cached dictionary stale.
+        self.state_cache_generation = 0
+
+        # Everything random in a game (shuffling, picking cards, etc.) should
+        # draw from this so that replaying the same actions on a game with the
+        # same seed always ends up in the same state.
+        self.random = random.Random()
+        self.seed = None
+        self.seed_random()
+
         # steps are atomic units of what happens in a game.
         self.steps = []
         self.expected_action = None
@@ -169,6 +235,93 @@ class Game(HasZones):
         # Register all zones
         self.register(self.zones.values())
 
+    def __getstate__(self):
+        # The history of transitions is only there to save clients from
+        # fetching the whole state, so it isn't worth pickling.
+        state = dict(self.__dict__)
+        state["transition_history"] = []
+        return state
+
+    def __setstate__(self, state):
+        # Attributes added to Game since this was pickled get their defaults.
+        self.__dict__.update(Game().__dict__)
+        self.__dict__.update(state)
+
+    def clone(self):
+        """
+        Returns a copy of this game. This is meant to be used on a game that
+        has been configured but not started, so that new games don't have to
+        load the configuration again. Everything is copied apart from the card
+        definitions, which are shared with the copy.
+        """
+
+        game = object.__new__(type(self))
+        memo = {id(self): game}
+        # Cards share their definitions so the copies should too.
+        for card_def in self.card_set.all_cards():
+            memo[id(card_def)] = card_def
+        # The copy gets a new generator below, so don't copy this one.
+        memo[id(self.random)] = None
+        game.__dict__.update(self.clone_value(self.__dict__, memo))
+        # Every game gets its own random numbers.
+        game.random = random.Random()
+        game.seed_random()
+        return game
+
+    def seed_random(self, seed=None):
+        """
+        Seed the random number generator of this game. If no seed is given a
+        new one is picked at random. The seed is kept in self.seed.
+        """
+
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        self.seed = seed
+        self.random.seed(seed)
+
+    def clone_value(self, value, memo):
+        """
+        Copy a single value for clone. memo maps the id of everything that has
+        already been copied to its copy.
+        """
+
+        if type(value) in ATOMIC_TYPES:
+            return value
+        if id(value) in memo:
+            return memo[id(value)]
+
+        if isinstance(value, GameObject):
+            result = object.__new__(type(value))
+            memo[id(value)] = result
+            # Go through __dict__ so stateful objects don't track this.
+            result.__dict__.update(
+                (key, self.clone_value(item, memo))
+                for key, item in value.__dict__.iteritems()
+                if key != "dict_cache")
+        elif isinstance(value, dict):
+            result = {}
+            memo[id(value)] = result
+            for key, item in value.iteritems():
+                result[self.clone_value(key, memo)] = self.clone_value(item,
+                                                                       memo)
+        elif isinstance(value, list):
+            result = []
+            memo[id(value)] = result
+            result.extend(self.clone_value(x, memo) for x in value)
+        elif isinstance(value, tuple):
+            result = tuple(self.clone_value(x, memo) for x in value)
+        elif isinstance(value, CardStack):
+            result = CardStack(self.clone_value(value.to_list(), memo))
+            memo[id(value)] = result
+        elif isinstance(value, Registry):
+            result = value.clone(lambda x: self.clone_value(x, memo))
+            memo[id(value)] = result
+        else:
+            # Sets, the card set and anything else a game keeps. deepcopy
+            # shares the card definitions and copied objects through memo.
+            result = copy.deepcopy(value, memo)
+        return result
+
     def substitute_kwargs(self, kwargs):
         """
         This function will perform some keyword argument substitutions. All the
@@ -188,21 +341,15 @@ class Game(HasZones):
         substitutions on each item of the list.
         """
 
+        get = self.registry.get
         for key, value in kwargs.items():
-            if ("card" == key or "_card" in key or
-                    "cards" == key or "_cards" in key):
-                object_type = "Card"
-            elif "zone" in key:
-                object_type = "Zone"
-            elif "player" in key:
-                object_type = "Player"
-            else:
+            object_type = kwarg_type(key)
+            if object_type is None:
                 continue
-            if isinstance(kwargs[key], list):
-                kwargs[key] = [self.get_object_with_id(object_type, int(x))
-                               for x in kwargs[key]]
+            if isinstance(value, list):
+                kwargs[key] = [get(object_type, int(x)) for x in value]
             else:
-                kwargs[key] = self.get_object_with_id(object_type, int(value))
+                kwargs[key] = get(object_type, int(value))
 
     def make_action(self, action_name, **kwargs):
         """
@@ -212,22 +359,48 @@ class Game(HasZones):
         matches. If the action is invalid this could throw an exception.
         """
 
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start_action(action_name)
+
         # Flush the old transitions
         self.flush_transitions()
 
-        if (not hasattr(self, action_name) or
-                (self.expected_action is not None and
-                 action_name != self.expected_action[0])):
-            raise InvalidMoveException
-
-        self.substitute_kwargs(kwargs)
-        getattr(self, action_name)(**kwargs)
-
-        # Run any steps that we can
-        self.run()
-
-        if self.is_over():
-            self.add_transition(('is_over', self.winners()))
+        try:
+            if (not hasattr(self, action_name) or
+                    (self.expected_action is not None and
+                     action_name != self.expected_action[0])):
+                raise InvalidMoveException
+
+            self.substitute_kwargs(kwargs)
+            if profiler is not None:
+                profiler.lap("substitute_kwargs")
+            getattr(self, action_name)(**kwargs)
+            if profiler is not None:
+                profiler.lap("action")
+
+            # Run any steps that we can
+            self.run()
+            if profiler is not None:
+                profiler.lap("run")
+
+            is_over = self.is_over()
+            if profiler is not None:
+                profiler.lap("is_over")
+            if is_over:
+                self.add_transition(('is_over', self.winners()))
+        except Exception:
+            # Whatever the action changed before it failed isn't in the
+            # history, so anyone holding an older version has to fetch the
+            # whole state.
+            if self.untracked_changes or any(self.transitions.values()):
+                self.reset_transition_history()
+            raise
+
+        self.commit_transitions()
+        if profiler is not None:
+            profiler.lap("commit")
+            profiler.finish_action()
 
     def convert_type_to_string(self, obj):
         """
@@ -236,29 +409,23 @@ class Game(HasZones):
         Otherwise it just returns the class name.
         """
 
-        if isinstance(obj, Card):
-            return"Card"
-        elif isinstance(obj, Zone):
-            return "Zone"
-        elif isinstance(obj, Player):
-            return "Player"
-        else:
-            return type(obj).__name__
+        return type_name(type(obj))
 
     def deregister(self, objects):
         """
         This function will deregister objects in the game, cleaning up anything
-        that register created.
+        that register created. Their ids are freed and will be given to
+        objects registered later.
         """
 
-        for obj in objects:
-            if obj.game_id is None:
-                continue
-
-            object_type = self.convert_type_to_string(obj)
-            if object_type in self.registered_objects:
-                del self.registered_objects[object_type][1][obj.game_id]
-                self.registered_objects[object_type][0] -= 1
+        deregistered = self.registry.deregister(objects)
+        for obj in deregistered:
+            # Go through __dict__ so stateful objects don't track this.
+            obj.__dict__["game"] = None
+        if deregistered:
+            # Clients may still refer to the freed ids.
+            self.untracked_changes = True
+            self.state_cache_generation += 1
 
     def register(self, objects):
         """
@@ -267,23 +434,20 @@ class Game(HasZones):
         have an id will not be assigned a new one.
         """
 
-        for obj in objects:
-            # Don't bother re registering
-            if obj.game_id is not None:
-                continue
-
-            object_type = self.convert_type_to_string(obj)
+        registered = self.registry.register(objects)
+        for obj in registered:
+            # Go through __dict__ so stateful objects don't track this.
+            obj.__dict__["game"] = self
+        if registered:
+            self.untracked_changes = True
+            self.state_cache_generation += 1
 
-            if object_type not in self.registered_objects:
-                self.registered_objects[object_type] = [2, {1: obj}]
-                obj.game_id = 1
-            else:
-                next_id = self.registered_objects[object_type][0]
-                self.registered_objects[object_type][1][next_id] = obj
-                self.registered_objects[object_type][0] = next_id + 1
-                obj.game_id = next_id
+    def get_objects(self, klass):
+        """
+        Returns every registered object of the given class, in order of id.
+        """
 
-            obj.game = self
+        return self.registry.all(klass)
 
     def get_object_with_id(self, klass, game_id):
         """
@@ -291,10 +455,7 @@ class Game(HasZones):
         the object isn't found this just return None.
         """
 
-        try:
-            return self.registered_objects[klass][1][game_id]
-        except KeyError:
-            return None
+        return self.registry.get(klass, game_id)
 
     def add_transition(self, trans, player=None):
         """
@@ -331,6 +492,89 @@ class Game(HasZones):
 
         self.transitions = {}
 
+    def commit_transitions(self):
+        """
+        Marks the current transitions as a new version of the game state and
+        stores them in the transition history. If anything happened that the
+        transitions don't describe the history is cleared instead. Redundant
+        transitions are coalesced first so nobody has to send them.
+        """
+
+        self.transitions = dict((key, coalesce_transitions(value))
+                                for key, value in self.transitions.items())
+
+        if self.untracked_changes:
+            self.reset_transition_history()
+            return
+
+        self.state_version += 1
+        self.transition_history.append((self.state_version, self.transitions))
+        while len(self.transition_history) > self.max_transition_history:
+            self.transition_history.pop(0)
+
+    def reset_transition_history(self):
+        """
+        Start a new version without any history. Anybody holding an older
+        version will need a full copy of the state to catch up.
+        """
+
+        self.state_version += 1
+        self.transition_history = []
+        self.untracked_changes = False
+
+    def get_transitions_since(self, version, player_id=None):
+        """
+        Get all the transitions (public and those for player_id) that happened
+        after the given version, in order. Returns None if the history doesn't
+        go back far enough, in which case the full state should be used.
+        """
+
+        if version == self.state_version:
+            return []
+        if (version > self.state_version or
+                len(self.transition_history) == 0 or
+                self.transition_history[0][0] > version + 1):
+            return None
+
+        result = []
+        for entry_version, transitions in self.transition_history:
+            if entry_version <= version:
+                continue
+            result.extend(transitions.get(None, []))
+            if player_id is not None:
+                result.extend(transitions.get(player_id, []))
+        return result
+
+    def get_transitions_for(self, recipients):
+        """
+        Get the transitions for many clients at once. recipients is a list of
+        (version, player_id) tuples and the result maps each of them to what
+        get_transitions_since would return (None if version is None). Anyone
+        without private transitions since their version gets the very same
+        list as the public, so callers can tell who sees the same thing.
+        """
+
+        result = {}
+        public = {}
+        for version, player_id in recipients:
+            key = (version, player_id)
+            if key in result:
+                continue
+            if version is None:
+                result[key] = None
+                continue
+
+            if version not in public:
+                public[version] = self.get_transitions_since(version)
+            if public[version] is None or player_id is None or not any(
+                    transitions.get(player_id)
+                    for entry_version, transitions in self.transition_history
+                    if entry_version > version):
+                result[key] = public[version]
+            else:
+                result[key] = self.get_transitions_since(version, player_id)
+        return result
+
     def remove_player(self, player_id):
         """
         Removes a player if possible and returns a
@@ -344,6 +588,7 @@ class Game(HasZones):
         for name in player.zones:
             del self.zones[name + '_' + str(player.game_id)]
         self.players.remove(player)
+        self.reset_transition_history()
         return True
 
     def add_player(self):
@@ -371,13 +616,19 @@ class Game(HasZones):
             zone_name = name + '_' + str(player.game_id)
             self.zones[zone_name] = zone
             setattr(self, zone_name, zone)
+        self.reset_transition_history()
         return player.game_id
 
-    def get_state(self, player_id=None):
+    def get_state(self, player_id=None, share_definitions=False):
         """
         This will return a dictonary containg the game state. This includes
         all cards and all their data, all zones, all players and their
         attributes, etc.
+
+        If share_definitions is True the attributes from card definitions
+        aren't repeated in every card. Instead each card from the card set
+        gives the index of its definition in the card set's catalog as its
+        'definition', and the state gives the 'catalog_version' it refers to.
         """
 
         if player_id is not None:
@@ -386,21 +637,83 @@ class Game(HasZones):
             player = None
 
         # Get all of my objects
-        _, cards = self.registered_objects.get("Card", (1, {}))
-        _, zones = self.registered_objects.get("Zone", (1, {}))
-        _, players = self.registered_objects.get("Player", (1, {}))
+        cards = self.registry.all("Card")
+        zones = self.registry.all("Zone")
+        players = self.registry.all("Player")
 
         # Convert to a dictionary
         result = {}
 
-        result['cards'] = [x.to_dict(player) for x in cards.values()]
-        result['players'] = [x.to_dict(player) for x in players.values()]
+        if share_definitions:
+            result['catalog_version'] = self.card_set.catalog()['version']
+            result['cards'] = [self.get_shared_card_dict(x, player)
+                               for x in cards]
+        else:
+            result['cards'] = [self.get_object_dict(x, player)
+                               for x in cards]
+        result['players'] = [self.get_object_dict(x, player)
+                             for x in players]
         # Note that zones aren't StatefulGameObjects but just base game
         # objects.
-        result['zones'] = [x.to_dict() for x in zones.values()]
+        result['zones'] = [self.get_object_dict(x) for x in zones]
+
+        return result
+
+    def get_object_dict(self, obj, player=None, include_definition=True):
+        """
+        Gets the dictionary for a single object as seen by player. This reuses
+        the dictionary from the last call unless the object has changed since
+        then, so the result should be treated as read only. include_definition
+        is passed on to Card.to_dict, so only give it for cards.
+        """
+
+        # Objects without anything specific to this player look the same to
+        # everyone, so they can share the public dictionary.
+        specific = getattr(obj, "player_specific_attributes", None) or {}
+        key = player if player in specific else None
+        if not include_definition:
+            key = (key, "no_definition")
+
+        if obj.dict_cache is None:
+            obj.dict_cache = {}
+        cached = obj.dict_cache.get(key, None)
+        if cached is not None and cached[0] == self.state_cache_generation:
+            return cached[1]
+
+        if include_definition:
+            result = obj.to_dict(player)
+        else:
+            result = obj.to_dict(player, include_definition=False)
+        obj.dict_cache[key] = (self.state_cache_generation, result)
+        return result
+
+    def get_shared_card_dict(self, card, player):
+        """
+        Gets the dictionary for a card for get_state with share_definitions.
+        A card whose definition is in the card set's catalog refers to it by
+        index instead of including its attributes. Any other card gets its
+        usual dictionary.
+        """
+
+        if card.definition is None:
+            return self.get_object_dict(card, player)
+        index = self.card_set.catalog_index(card.definition)
+        if index is None:
+            return self.get_object_dict(card, player)
 
+        result = dict(self.get_object_dict(card, player,
+                                           include_definition=False))
+        result['definition'] = index
         return result
 
+    def get_card_catalog(self):
+        """
+        Returns the catalog of the card set of this game (see
+        CardSet.catalog).
+        """
+
+        return self.card_set.catalog()
+
     def add_step(self, player, step, save_result_as=None, kwargs=None):
         """
         Registers a step that should be run.
@@ -426,6 +739,9 @@ class Game(HasZones):
                 all_kwargs = dict(kwargs.items() + self.current_kwargs.items())
             # Try to run the step, catching any NeedsMoreInfo execptions that
             # are raised
+            profiler = self.profiler
+            if profiler is not None:
+                start = profiler.clock()
             try:
                 result = step(player, **all_kwargs)
             except NeedsMoreInfo as exception:
@@ -439,6 +755,10 @@ class Game(HasZones):
                                         player.game_id,
                                         message)
                 return
+            finally:
+                if profiler is not None:
+                    profiler.add("step", getattr(step, "__name__", "step"),
+                                 profiler.clock() - start)
 
             if save_result_as is not None:
                 self.current_kwargs[save_result_as] = result
@@ -460,6 +780,41 @@ class Game(HasZones):
         self.current_kwargs = {}
         self.steps = []
 
+    def get_actions(self):
+        """
+        Returns a dictionary of the name of every action in this game to the
+        names of the arguments it takes.
+        """
+
+        actions = {}
+        for name in dir(type(self)):
+            attribute = getattr(type(self), name)
+            if getattr(attribute, "is_action", False):
+                actions[name] = attribute.action_arguments
+        return actions
+
+    def is_valid_action(self, action_name, **kwargs):
+        """
+        Returns true if make_action would accept the action with the given
+        keyword arguments (as game ids), without actually making it.
+        """
+
+        if (self.expected_action is not None and
+                action_name != self.expected_action[0]):
+            return False
+        func = getattr(type(self), action_name, None)
+        if not getattr(func, "is_action", False):
+            return False
+        if func.restriction is None:
+            return True
+
+        try:
+            self.substitute_kwargs(kwargs)
+            return bool(func.restriction(self, **kwargs))
+        except Exception:  # pylint: disable=broad-except
+            # Restrictions don't expect to be given nonsense.
+            return False
+
     def get_expected_action(self):
         """
         This can give the client a hint about what is supposed to happen
@@ -495,6 +850,8 @@ class Game(HasZones):
             return False
         self.set_up()
         self.is_set_up = True
+        # Set up can change just about everything so we start a fresh history.
+        self.reset_transition_history()
         return True
 
     # pylint: disable=unused-argument
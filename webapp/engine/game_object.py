@@ -9,16 +9,63 @@ class GameObject(object):
     A GameObject is any object in the game.
     """
 
+    # Values that should be excluded from a dictonary definition. This is
+    # shared by every instance of the class; subclasses extend it and
+    # exclude_attribute gives a single instance its own copy.
+    exclude_from_dict = frozenset(("game", "exclude_from_dict", "dict_cache"))
+    # Cached results of to_dict. See Game.get_object_dict. Each instance only
+    # gets its own dictionary once something is cached.
+    dict_cache = None
+
     def __init__(self):
         super(GameObject, self).__init__()
         # This is the ID of **this** object in the game.
         self.game_id = None
         # This is the actual game object that this belongs to.
         self.game = None
-        # Values that should be excluded from a dictonary definition
-        self.exclude_from_dict = set()
-        self.exclude_from_dict.add('game')
-        self.exclude_from_dict.add("exclude_from_dict")
+
+    def __setattr__(self, name, value):
+        # Any change to our attributes means the cached dicts are stale.
+        cache = self.__dict__.get("dict_cache", None)
+        if cache:
+            cache.clear()
+        super(GameObject, self).__setattr__(name, value)
+
+    def __getstate__(self):
+        # The cached dictionaries are rebuilt on demand, so leave them out of
+        # pickles.
+        state = dict(self.__dict__)
+        state.pop("dict_cache", None)
+        return state
+
+    def __setstate__(self, state):
+        # Go through __dict__ so stateful objects don't track this.
+        self.__dict__.update(state)
+        self.__dict__.pop("dict_cache", None)
+
+    def invalidate_dict_cache(self):
+        """
+        Throw away any cached dictionaries for this object. This needs to be
+        called whenever the object is changed without setting an attribute
+        (e.g. appending to a list).
+        """
+
+        if self.dict_cache:
+            self.dict_cache.clear()
+
+    def exclude_attribute(self, name):
+        """
+        Exclude an attribute from the dictionary definition of just this
+        object.
+        """
+
+        if name in self.exclude_from_dict:
+            return
+        # Set through __dict__ so that stateful objects don't see this as a
+        # change in state.
+        self.__dict__["exclude_from_dict"] = self.exclude_from_dict | set((
+            name,))
+        self.invalidate_dict_cache()
 
     def replace_game_objects(self, item):
         """
@@ -11,31 +11,44 @@ into this module.
 # but it's what we've got right now. No need to yell at us for it.
 # pylint: disable=W0603
 
+import copy
 import os.path
 import sys
 
 import yaml
-from engine.game import InvalidMoveException
+from engine.game import Game, InvalidMoveException
 
 CACHE = {}
 MAX_ID = 0
+# Maps the path of a game definition to (mtimes, game class, config)
+DEFINITIONS = {}
+# Maps the path of a game definition to a configured game to clone
+PROTOTYPES = {}
+# A persistence.Journal that is told about every change to a game, if
+# persistence is enabled.
+JOURNAL = None
 
 
-def create_game(game_definition):
+def create_game(game_definition, seed=None):
     """
     Creates a new game. Returns the game id for the
     new game or throws an exception if there was an
-    error creating the game.
+    error creating the game. If seed is given the game's
+    random number generator is seeded with it.
     """
 
     global MAX_ID
 
-    game, config = load_game_definition(game_definition)
-    game.load_config(config)
+    game = get_prototype(game_definition).clone()
+    if seed is not None:
+        game.seed_random(seed)
     CACHE[MAX_ID] = game
 
     MAX_ID = MAX_ID + 1
 
+    if JOURNAL is not None:
+        JOURNAL.create_game(MAX_ID - 1, game_definition)
+
     return MAX_ID - 1
 
 
@@ -45,10 +58,50 @@ def load_game_definition(game_definition):
     of a game.py that defines the rules and a config.yml that
     defines the configuration. This will return a tuple of a
     configuration dictionary and an instance of the game.
+
+    Definitions are only parsed and imported once; every call gets its own
+    copy of the configuration.
+    """
+
+    klass, config = get_game_definition(game_definition)
+    return (klass(), copy.deepcopy(config))
+
+
+def get_prototype(game_definition):
+    """
+    Returns a configured, un-started game for a game definition. New games
+    are cloned from this rather than configured from scratch. Prototypes are
+    thrown away along with their definition.
     """
 
+    key = os.path.abspath(game_definition)
+    klass, config = get_game_definition(game_definition)
+    if key not in PROTOTYPES:
+        prototype = klass()
+        prototype.load_config(copy.deepcopy(config))
+        PROTOTYPES[key] = prototype
+    return PROTOTYPES[key]
+
+
+def get_game_definition(game_definition):
+    """
+    Returns a tuple of the game class and the parsed configuration for a game
+    definition. These are cached in DEFINITIONS until the config.yml or game
+    file changes, so don't modify the configuration you get back.
+    """
+
+    key = os.path.abspath(game_definition)
+    if key in DEFINITIONS:
+        mtimes, klass, config = DEFINITIONS[key]
+        if get_definition_mtimes(game_definition,
+                                 config["game_file"]) == mtimes:
+            return (klass, config)
+        # The definition changed so make sure we import the new game file.
+        invalidate_game_definition(game_definition)
+
     config_file = open(os.path.join(game_definition, "config.yml"))
     config = yaml.load(config_file)
+    config_file.close()
 
     if "game_file" not in config or "game_class" not in config:
         raise ValueError("configuration file is missing required attributes.")
@@ -57,15 +110,60 @@ def load_game_definition(game_definition):
     sys.path.append(game_definition)
 
     # Explicitly import our game as the game object
-    game_module = __import__(config["game_file"])
-
-    # Clean up the system path that we don't care about any more.
-    sys.path.remove(game_definition)
+    try:
+        game_module = __import__(config["game_file"])
+    finally:
+        # Clean up the system path that we don't care about any more.
+        sys.path.remove(game_definition)
 
     # Get the actual game class out of the module.
     klass = getattr(game_module, config["game_class"])
 
-    return (klass(), config)
+    mtimes = get_definition_mtimes(game_definition, config["game_file"])
+    DEFINITIONS[key] = (mtimes, klass, config)
+    return (klass, config)
+
+
+def get_definition_version(game_definition):
+    """
+    Returns a value that changes whenever the files of a game definition do
+    (the modification times DEFINITIONS is checked against).
+    """
+
+    get_game_definition(game_definition)
+    return DEFINITIONS[os.path.abspath(game_definition)][0]
+
+
+def get_definition_mtimes(game_definition, game_file):
+    """
+    Returns the modification times of the config.yml and game file that make
+    up a game definition. Raises an IOError if there is no config.yml.
+    """
+
+    config_path = os.path.join(game_definition, "config.yml")
+    try:
+        mtimes = [os.path.getmtime(config_path)]
+    except OSError as error:
+        raise IOError(error.errno, error.strerror, config_path)
+
+    game_path = os.path.join(game_definition, game_file + ".py")
+    if os.path.exists(game_path):
+        mtimes.append(os.path.getmtime(game_path))
+
+    return tuple(mtimes)
+
+
+def invalidate_game_definition(game_definition):
+    """
+    Forget a cached game definition so that it is loaded from disk the next
+    time it is used. This should be called whenever a definition is replaced.
+    """
+
+    key = os.path.abspath(game_definition)
+    PROTOTYPES.pop(key, None)
+    cached = DEFINITIONS.pop(key, None)
+    if cached is not None:
+        sys.modules.pop(cached[2]["game_file"], None)
 
 
 def destroy_game(game_id):
@@ -76,6 +174,9 @@ def destroy_game(game_id):
 
     del CACHE[game_id]
 
+    if JOURNAL is not None:
+        JOURNAL.destroy_game(game_id)
+
 
 def start_game(game_id):
     """
@@ -83,7 +184,9 @@ def start_game(game_id):
     to make sure that enough players have joined
     """
 
-    return get_game(game_id).set_up_wrapper()
+    result = get_game(game_id).set_up_wrapper()
+    record(game_id, "start_game")
+    return result
 
 
 def get_game(game_id):
@@ -94,12 +197,31 @@ def get_game(game_id):
     return CACHE.get(game_id, None)
 
 
-def get_state(game_id, player_id=None):
+def get_state(game_id, player_id=None, share_definitions=False):
     """
-    Returns the state of the given game.
+    Returns the state of the given game. See Game.get_state for
+    share_definitions.
     """
 
-    return get_game(game_id).get_state(player_id)
+    return get_game(game_id).get_state(player_id, share_definitions)
+
+
+def get_card_catalog(game_id):
+    """
+    Returns the catalog of card definitions for the given game (see
+    CardSet.catalog).
+    """
+
+    return get_game(game_id).get_card_catalog()
+
+
+def get_definition_card_catalog(game_definition):
+    """
+    Returns the catalog of card definitions that new games of a game
+    definition start with.
+    """
+
+    return get_prototype(game_definition).get_card_catalog()
 
 
 def add_player(game_id):
@@ -108,7 +230,9 @@ def add_player(game_id):
     player id of the newly created player.
     """
 
-    return get_game(game_id).add_player()
+    player_id = get_game(game_id).add_player()
+    record(game_id, "add_player")
+    return player_id
 
 
 def remove_player(game_id, player_id):
@@ -117,7 +241,9 @@ def remove_player(game_id, player_id):
     denoting success or failure
     """
 
-    return get_game(game_id).remove_player(player_id)
+    result = get_game(game_id).remove_player(player_id)
+    record(game_id, "remove_player", player_id)
+    return result
 
 
 def make_action(game_id, **kwargs):
@@ -133,6 +259,9 @@ def make_action(game_id, **kwargs):
         return True, None
     except InvalidMoveException:
         return False, "Illegal Action"
+    finally:
+        # Even a failed action can change the game, so always log it.
+        record(game_id, "make_action", **kwargs)
 
 
 def get_public_transitions(game_id):
@@ -151,6 +280,39 @@ def get_player_transitions(game_id, player_id):
     return get_game(game_id).get_player_transitions(player_id)
 
 
+def get_state_version(game_id):
+    """
+    Returns the current state version of the given game.
+    """
+
+    return get_game(game_id).state_version
+
+
+def get_transitions_since(game_id, version, player_id=None):
+    """
+    Get all the transitions a client holding the given version needs to catch
+    up. Returns None if the game can't provide them and the client needs the
+    full state instead.
+    """
+
+    return get_game(game_id).get_transitions_since(version, player_id)
+
+
+def get_action_update(game_id, recipients):
+    """
+    Returns everything the clients of a game need after an action in one
+    call: the "version" of the state, the "public_transitions" of the action,
+    the "expected_action" and, under "transitions", the transitions each of
+    the recipients needs (see Game.get_transitions_for).
+    """
+
+    game = get_game(game_id)
+    return {"version": game.state_version,
+            "public_transitions": game.get_public_transitions(),
+            "expected_action": game.get_expected_action(),
+            "transitions": game.get_transitions_for(recipients)}
+
+
 def get_expected_action(game_id):
     """
     Returns the expected action for a specific game.
@@ -159,6 +321,14 @@ def get_expected_action(game_id):
     return get_game(game_id).get_expected_action()
 
 
+def get_num_games():
+    """
+    Returns the number of games that are running.
+    """
+
+    return len(CACHE)
+
+
 def has_game(game_id):
     """
     Returns true if there is a game with the given id and False
@@ -173,7 +343,29 @@ def abandon_ship(game_id):
     Flush all current steps from a game.
     """
 
-    return get_game(game_id).abandon_ship()
+    result = get_game(game_id).abandon_ship()
+    record(game_id, "abandon_ship")
+    return result
+
+
+def get_profile():
+    """
+    Returns what the profiler has recorded (see Profiler.to_dict), or an
+    empty dictionary if games aren't being profiled.
+    """
+
+    if Game.profiler is None:
+        return {}
+    return Game.profiler.to_dict()
+
+
+def record(game_id, call, *args, **kwargs):
+    """
+    Tell the journal (if there is one) about a call that changed a game.
+    """
+
+    if JOURNAL is not None:
+        JOURNAL.record(game_id, call, *args, **kwargs)
 
 
 def flush():
@@ -184,3 +376,6 @@ def flush():
     global CACHE, MAX_ID
     CACHE = {}
     MAX_ID = 0
+
+    if JOURNAL is not None:
+        JOURNAL.clear()
@@ -0,0 +1,272 @@
+"""
+This module keeps games alive across server restarts. Every call that changes
+a game is appended to a per game log, and every so often the whole game is
+pickled into a snapshot and the log is started over. On startup each game is
+restored from its latest snapshot and the rest of its log is replayed.
+
+Snapshots leave out the caches games keep, and start with a header giving the
+version of the snapshot format. A snapshot that can't be loaded (a newer
+format, or a game whose code has changed too much) is skipped and left on
+disk rather than stopping every other game from being restored.
+
+The game_runner calls into a Journal through game_runner.JOURNAL, which is
+None (and costs nothing) unless persistence has been enabled.
+"""
+
+import cPickle as pickle
+import json
+import os
+import os.path
+from collections import OrderedDict
+
+from engine import game_runner
+
+SNAPSHOT_SUFFIX = ".snapshot"
+LOG_SUFFIX = ".log"
+# The version of the snapshot format we write. Version 1 snapshots had a
+# (definition path, seq) tuple as their header.
+SNAPSHOT_VERSION = 2
+
+
+class Journal(object):
+
+    """
+    A Journal writes the snapshots and logs for every game into a single
+    directory. The log of each game holds one JSON object per line of the
+    form {"seq": n, "call": name, "args": [...], "kwargs": {...}}.
+
+    Only the logs of the max_open_logs most recently active games are kept
+    open; the rest are opened again when they're next written to.
+    """
+
+    def __init__(self, path, snapshot_interval=100, max_open_logs=64):
+        self.path = path
+        # How many calls to log before we try to take a new snapshot.
+        self.snapshot_interval = snapshot_interval
+        self.max_open_logs = max_open_logs
+        # Maps game ids to (definition path, seq, last seq in a snapshot)
+        self.games = {}
+        # Maps game ids to their open log files, least recently used first.
+        self.log_files = OrderedDict()
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def file_path(self, game_id, suffix):
+        """
+        Returns the path of a snapshot or log file for a game.
+        """
+
+        return os.path.join(self.path, str(game_id) + suffix)
+
+    def log_file(self, game_id, mode="a"):
+        """
+        Returns the open log file of a game, opening it with the given mode
+        if it isn't open already. Closes the least recently used log if too
+        many are open.
+        """
+
+        log_file = self.log_files.pop(game_id, None)
+        if log_file is None:
+            while len(self.log_files) >= self.max_open_logs:
+                self.log_files.popitem(last=False)[1].close()
+            log_file = open(self.file_path(game_id, LOG_SUFFIX), mode)
+        self.log_files[game_id] = log_file
+        return log_file
+
+    def close_log(self, game_id):
+        """
+        Close the log file of a game if it's open.
+        """
+
+        log_file = self.log_files.pop(game_id, None)
+        if log_file is not None:
+            log_file.close()
+
+    def create_game(self, game_id, game_definition):
+        """
+        Start journaling a new game. Snapshots the game straight away so we
+        know which definition it came from.
+        """
+
+        self.games[game_id] = [game_definition, 0, 0]
+        self.snapshot(game_id)
+
+    def destroy_game(self, game_id):
+        """
+        Stop journaling a game and throw away its files.
+        """
+
+        self.games.pop(game_id, None)
+        self.close_log(game_id)
+        for suffix in (SNAPSHOT_SUFFIX, LOG_SUFFIX):
+            if os.path.exists(self.file_path(game_id, suffix)):
+                os.remove(self.file_path(game_id, suffix))
+
+    def record(self, game_id, call, *args, **kwargs):
+        """
+        Append a call to the log of a game. Takes a new snapshot once enough
+        calls have been logged.
+        """
+
+        entry = self.games.get(game_id, None)
+        if entry is None:
+            return
+
+        entry[1] += 1
+        log_file = self.log_file(game_id)
+        log_file.write(json.dumps({"seq": entry[1], "call": call,
+                                   "args": args, "kwargs": kwargs}) + "\n")
+        log_file.flush()
+
+        if entry[1] - entry[2] >= self.snapshot_interval:
+            self.snapshot(game_id)
+
+    def snapshot(self, game_id):
+        """
+        Write a snapshot of a game and start a new log. Games that are in the
+        middle of resolving steps can't be pickled, in which case we keep the
+        log and try again later. Returns True if a snapshot was written.
+        """
+
+        entry = self.games[game_id]
+        game = game_runner.get_game(game_id)
+        if len(game.steps) > 0:
+            return False
+
+        try:
+            data = pickle.dumps(game, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError):
+            return False
+
+        # Write the snapshot next to the old one and swap it in so a crash
+        # never leaves us with half a snapshot.
+        path = self.file_path(game_id, SNAPSHOT_SUFFIX)
+        with open(path + ".tmp", "wb") as snapshot_file:
+            pickle.dump({"version": SNAPSHOT_VERSION, "definition": entry[0],
+                         "seq": entry[1]}, snapshot_file,
+                        pickle.HIGHEST_PROTOCOL)
+            snapshot_file.write(data)
+        os.rename(path + ".tmp", path)
+
+        # Everything in the log is in the snapshot now.
+        self.close_log(game_id)
+        self.log_file(game_id, "w")
+        entry[2] = entry[1]
+        return True
+
+    def restore(self):
+        """
+        Load every game in the directory back into the game_runner. Returns
+        a list of the restored game ids.
+        """
+
+        restored = []
+        game_ids = []
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(SNAPSHOT_SUFFIX):
+                continue
+            game_id = int(name[:-len(SNAPSHOT_SUFFIX)])
+            game_ids.append(game_id)
+            if self.restore_game(game_id):
+                restored.append(game_id)
+
+        # Games we couldn't load keep their ids so their files aren't
+        # overwritten.
+        if len(game_ids) > 0:
+            game_runner.MAX_ID = max(game_runner.MAX_ID, max(game_ids) + 1)
+        return restored
+
+    def restore_game(self, game_id):
+        """
+        Load a single game from its snapshot and replay its log. Returns
+        False if the snapshot can't be loaded.
+        """
+
+        with open(self.file_path(game_id, SNAPSHOT_SUFFIX), "rb") as fin:
+            try:
+                header = pickle.load(fin)
+                if isinstance(header, tuple):
+                    header = {"version": 1, "definition": header[0],
+                              "seq": header[1]}
+                if header["version"] > SNAPSHOT_VERSION:
+                    return False
+                game_definition, seq = header["definition"], header["seq"]
+                # Make sure the game's module has been imported before we
+                # unpickle the game.
+                game_runner.get_game_definition(game_definition)
+                game = pickle.load(fin)
+            except (pickle.UnpicklingError, AttributeError, EOFError,
+                    ImportError, IndexError, IOError, KeyError, TypeError,
+                    ValueError):
+                return False
+        game_runner.CACHE[game_id] = game
+
+        log_path = self.file_path(game_id, LOG_SUFFIX)
+        calls = []
+        if os.path.exists(log_path):
+            with open(log_path) as fin:
+                for line in fin:
+                    try:
+                        calls.append(json.loads(line))
+                    except ValueError:
+                        # A partly written line from a crash
+                        break
+
+        # Don't log the calls again while we replay them.
+        journal, game_runner.JOURNAL = game_runner.JOURNAL, None
+        try:
+            for call in calls:
+                if call["seq"] <= seq:
+                    continue
+                seq = call["seq"]
+                kwargs = dict((str(key), value)
+                              for key, value in call["kwargs"].iteritems())
+                try:
+                    getattr(game_runner, call["call"])(game_id, *call["args"],
+                                                       **kwargs)
+                except Exception:  # pylint: disable=broad-except
+                    # It failed the first time around as well.
+                    pass
+        finally:
+            game_runner.JOURNAL = journal
+
+        self.games[game_id] = [game_definition, seq, seq]
+        self.snapshot(game_id)
+        return True
+
+    def clear(self):
+        """
+        Stop journaling every game and throw away all of their files.
+        """
+
+        for game_id in self.games.keys():
+            self.destroy_game(game_id)
+
+    def close(self):
+        """
+        Close every open log file. The files are kept.
+        """
+
+        for game_id in self.log_files.keys():
+            self.close_log(game_id)
+
+
+def enable(path, snapshot_interval=100, max_open_logs=64):
+    """
+    Start journaling games into the given directory and restore any games
+    that are already there. Returns the list of restored game ids.
+    """
+
+    game_runner.JOURNAL = Journal(path, snapshot_interval, max_open_logs)
+    return game_runner.JOURNAL.restore()
+
+
+def disable():
+    """
+    Stop journaling games. The files already written are kept.
+    """
+
+    if game_runner.JOURNAL is not None:
+        game_runner.JOURNAL.close()
+    game_runner.JOURNAL = None
@@ -13,7 +13,4 @@ class Player(StatefulGameObject, HasZones):
     It contains no logic.
     """
 
-    def __init__(self):
-        super(Player, self).__init__()
-
-        self.game_object_type = "Player"
+    game_object_type = "Player"
@@ -0,0 +1,226 @@
+"""
+This module times where Game.make_action spends its time. A Profiler keeps a
+latency histogram for every (phase, name) pair it is told about, where the
+phases are:
+
+    * total: the whole of make_action, by action name
+    * substitute_kwargs: turning game ids into objects, by action name
+    * restriction: the restriction of an action, by action name
+    * action: the action itself (including its restriction), by action name
+    * step: a single step run by Game.run, by step name
+    * run: every step run by Game.run for an action, by action name
+    * is_over: checking whether the game is over, by action name
+    * commit: committing the transitions, by action name
+
+Profiling is off unless a profiler is set on Game.profiler (for every game)
+or on a single game, and costs a few attribute checks per action when it is
+off. Turn it on for every game with enable().
+"""
+
+import time
+from bisect import bisect_left
+
+from engine.game import Game
+
+# The upper bounds, in seconds, of the histogram buckets. They double from a
+# microsecond to about half a minute; anything slower goes in the last
+# bucket.
+BUCKETS = tuple(0.000001 * 2 ** x for x in range(26))
+
+
+class Histogram(object):
+
+    """
+    A Histogram counts values into fixed buckets, so it takes the same space
+    however many values it has seen.
+    """
+
+    def __init__(self):
+        # One count per bucket plus one for anything over the last bucket.
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """
+        Count a single value.
+        """
+
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        Add the counts from another histogram to this one.
+        """
+
+        self.counts = [x + y for x, y in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        """
+        Returns an estimate of the value at the given fraction: the upper
+        bound of the bucket it falls in (or the max, if that is smaller).
+        """
+
+        if self.count == 0:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                if index >= len(BUCKETS):
+                    return self.max
+                return min(BUCKETS[index], self.max)
+        return self.max
+
+    def mean(self):
+        """
+        Returns the average of every value.
+        """
+
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def to_dict(self):
+        """
+        Returns a picklable (and JSON friendly) copy of the histogram.
+        """
+
+        return {"counts": list(self.counts), "count": self.count,
+                "total": self.total, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Makes a histogram from the result of to_dict.
+        """
+
+        histogram = cls()
+        histogram.counts = list(data["counts"])
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class Profiler(object):
+
+    """
+    A Profiler is handed timings by Game.make_action and keeps a Histogram
+    for each of them. Timing is done with laps: start_action starts the clock
+    and every call to lap records the time since the last lap against a
+    phase.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        # Maps (phase, name) to a Histogram
+        self.histograms = {}
+        self.action_name = None
+        self.action_start = 0.0
+        self.last_lap = 0.0
+
+    def add(self, phase, name, seconds):
+        """
+        Record a single timing.
+        """
+
+        key = (phase, name)
+        histogram = self.histograms.get(key, None)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.add(seconds)
+
+    def start_action(self, action_name):
+        """
+        Start timing an action.
+        """
+
+        self.action_name = action_name
+        self.action_start = self.last_lap = self.clock()
+
+    def lap(self, phase):
+        """
+        Record the time since the last lap against a phase of the current
+        action.
+        """
+
+        now = self.clock()
+        self.add(phase, self.action_name, now - self.last_lap)
+        self.last_lap = now
+
+    def finish_action(self):
+        """
+        Record the total time of the current action.
+        """
+
+        self.add("total", self.action_name, self.clock() - self.action_start)
+
+    def reset(self):
+        """
+        Throw away everything recorded so far.
+        """
+
+        self.histograms = {}
+
+    def to_dict(self):
+        """
+        Returns everything recorded as a dictionary of
+        "phase:name" -> Histogram.to_dict().
+        """
+
+        return dict(("%s:%s" % key, value.to_dict())
+                    for key, value in self.histograms.items())
+
+    def merge(self, data):
+        """
+        Add the result of another profiler's to_dict to this one.
+        """
+
+        for key, value in data.items():
+            phase, name = key.split(":", 1)
+            histogram = self.histograms.setdefault((phase, name), Histogram())
+            histogram.merge(Histogram.from_dict(value))
+
+    def report(self):
+        """
+        Returns a table of every timing in milliseconds, slowest total
+        first.
+        """
+
+        lines = ["%-18s %-28s %8s %9s %9s %9s %9s" % (
+            "phase", "name", "count", "mean", "p50", "p99", "max")]
+        for (phase, name), histogram in sorted(
+                self.histograms.items(), key=lambda x: -x[1].total):
+            lines.append("%-18s %-28s %8d %9.3f %9.3f %9.3f %9.3f" % (
+                phase, name, histogram.count, histogram.mean() * 1000,
+                histogram.percentile(0.5) * 1000,
+                histogram.percentile(0.99) * 1000, histogram.max * 1000))
+        return "\n".join(lines)
+
+
+def enable(profiler=None):
+    """
+    Profile every game. Returns the profiler being used.
+    """
+
+    Game.profiler = profiler or Profiler()
+    return Game.profiler
+
+
+def disable():
+    """
+    Stop profiling games. Returns the profiler that was being used, if any.
+    """
+
+    profiler, Game.profiler = Game.profiler, None
+    return profiler
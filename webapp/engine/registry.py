@@ -0,0 +1,158 @@
+"""
+This module defines the Registry, which hands out the ids of the objects in a
+game and finds objects again by id.
+"""
+
+from heapq import heappop, heappush
+
+from engine.card import Card
+from engine.player import Player
+from engine.zone import Zone
+
+# Maps classes to the name of the id space their objects live in. Worked out
+# once per class by type_name.
+TYPE_NAMES = {}
+
+
+def type_name(klass):
+    """
+    Returns the name of the id space for objects of the given class. Anything
+    that inherits from Card, Zone or Player shares theirs; everything else is
+    named after its class.
+    """
+
+    name = TYPE_NAMES.get(klass, None)
+    if name is None:
+        if issubclass(klass, Card):
+            name = "Card"
+        elif issubclass(klass, Zone):
+            name = "Zone"
+        elif issubclass(klass, Player):
+            name = "Player"
+        else:
+            name = klass.__name__
+        TYPE_NAMES[klass] = name
+    return name
+
+
+def set_id(obj, game_id):
+    """
+    Set the id of an object. This goes through __dict__ so stateful objects
+    don't track it as a change in state.
+    """
+
+    obj.__dict__["game_id"] = game_id
+    obj.invalidate_dict_cache()
+
+
+class Registry(object):
+
+    """
+    A Registry keeps every object registered with a game. Each type of object
+    gets its own ids, starting at 1, and its objects are kept in a list
+    indexed by id so that finding one is a single index. The ids of
+    deregistered objects are handed out again, smallest first, so the lists
+    stay dense however many objects come and go.
+    """
+
+    def __init__(self):
+        # Maps type names to a list of objects where index i holds the object
+        # with id i, or None if that id is free. Index 0 is never used.
+        self.objects = {}
+        # Maps type names to a heap of the free ids in objects.
+        self.free_ids = {}
+
+    def register(self, objects):
+        """
+        Give every object in the list that doesn't have an id one. Returns
+        the objects that were given an id.
+        """
+
+        registered = []
+        for obj in objects:
+            if obj.game_id is not None:
+                continue
+
+            name = type_name(type(obj))
+            slots = self.objects.get(name, None)
+            if slots is None:
+                slots = self.objects[name] = [None]
+                self.free_ids[name] = []
+            free_ids = self.free_ids[name]
+
+            if free_ids:
+                game_id = heappop(free_ids)
+                slots[game_id] = obj
+            else:
+                game_id = len(slots)
+                slots.append(obj)
+            set_id(obj, game_id)
+            registered.append(obj)
+        return registered
+
+    def deregister(self, objects):
+        """
+        Remove every object in the list and free its id. Objects that aren't
+        registered here are ignored. Returns the objects that were removed.
+        """
+
+        deregistered = []
+        for obj in objects:
+            game_id = obj.game_id
+            if game_id is None:
+                continue
+
+            name = type_name(type(obj))
+            slots = self.objects.get(name, None)
+            if (slots is None or game_id >= len(slots) or
+                    slots[game_id] is not obj):
+                continue
+
+            slots[game_id] = None
+            heappush(self.free_ids[name], game_id)
+            set_id(obj, None)
+            deregistered.append(obj)
+        return deregistered
+
+    def get(self, name, game_id):
+        """
+        Returns the object of the given type with the given id, or None if
+        there isn't one.
+        """
+
+        slots = self.objects.get(name, None)
+        if slots is None or game_id < 1:
+            return None
+        try:
+            return slots[game_id]
+        except IndexError:
+            return None
+
+    def all(self, name):
+        """
+        Returns every object of the given type, in order of id.
+        """
+
+        return [x for x in self.objects.get(name, ()) if x is not None]
+
+    def next_id(self, name):
+        """
+        Returns the id the next object of the given type will be given.
+        """
+
+        free_ids = self.free_ids.get(name, None)
+        if free_ids:
+            return free_ids[0]
+        return len(self.objects.get(name, (None,)))
+
+    def clone(self, copy):
+        """
+        Returns a copy of this registry, using copy to copy each object.
+        """
+
+        result = Registry()
+        result.objects = dict((name, [copy(x) for x in slots])
+                              for name, slots in self.objects.items())
+        result.free_ids = dict((name, list(ids))
+                               for name, ids in self.free_ids.items())
+        return result
@@ -0,0 +1,372 @@
+"""
+This module offers the same interface as the game_runner, but spreads the
+games over a pool of worker processes. Each worker is just a process running
+its own copy of the game_runner; calls are routed to the right worker based on
+the game id and sent over a pipe. This lets a host use all of its cores, and a
+slow action in one game only holds up the other games in the same worker.
+
+Everything passed to or returned from the game_runner has to be picklable, so
+the games themselves (get_game) aren't available in this mode.
+"""
+
+# We use globals here because this is a stateful module, just like the
+# game_runner.
+# pylint: disable=W0603
+
+import multiprocessing
+from pickle import PicklingError
+
+from engine import game_runner
+from engine.profiling import Profiler
+
+try:
+    # If we're running under gevent we want to wait on the workers without
+    # blocking every other greenlet.
+    from gevent.lock import Semaphore as Lock
+    from gevent.socket import wait_read
+except ImportError:  # pragma: no cover
+    from threading import Lock
+    wait_read = None
+
+SHARDS = []
+# Maps our game ids to (shard, the game id inside that shard)
+GAMES = {}
+MAX_ID = 0
+
+
+def serve(requests, responses):
+    """
+    The main loop of a worker process. Receives (function name, args, kwargs)
+    tuples, runs them against the game_runner and sends back either
+    (True, result) or (False, exception). Stops when it receives None.
+    """
+
+    while True:
+        try:
+            request = requests.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        name, args, kwargs = request
+        try:
+            response = (True, getattr(game_runner, name)(*args, **kwargs))
+        except Exception as exception:  # pylint: disable=broad-except
+            response = (False, exception)
+
+        try:
+            responses.send(response)
+        except (PicklingError, TypeError) as exception:
+            responses.send((False, RuntimeError(repr(exception))))
+
+
+class Shard(object):
+
+    """
+    A Shard is a handle on a single worker process.
+    """
+
+    def __init__(self):
+        # A duplex pipe is a socketpair, which gevent's monkey patching makes
+        # non-blocking, so we use a plain pipe in each direction instead.
+        worker_requests, self.requests = multiprocessing.Pipe(False)
+        self.responses, worker_responses = multiprocessing.Pipe(False)
+        self.process = multiprocessing.Process(
+            target=serve, args=(worker_requests, worker_responses))
+        self.process.daemon = True
+        self.process.start()
+        worker_requests.close()
+        worker_responses.close()
+        # Only one request can be in flight on the pipe at a time.
+        self.lock = Lock()
+
+    def call(self, name, *args, **kwargs):
+        """
+        Run a game_runner function in this worker and return the result. If
+        the function raised an exception it is raised here.
+        """
+
+        with self.lock:
+            self.requests.send((name, args, kwargs))
+            if wait_read is not None:
+                wait_read(self.responses.fileno())
+            success, result = self.responses.recv()
+
+        if not success:
+            raise result
+        return result
+
+    def stop(self):
+        """
+        Stop the worker process.
+        """
+
+        try:
+            self.requests.send(None)
+        except IOError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.requests.close()
+        self.responses.close()
+
+
+def start(num_shards=None):
+    """
+    Start the worker processes. By default there is one per core.
+    """
+
+    if num_shards is None:
+        num_shards = multiprocessing.cpu_count()
+    if num_shards < 1:
+        raise ValueError("Need at least one shard.")
+
+    stop()
+    for _ in range(num_shards):
+        SHARDS.append(Shard())
+
+
+def stop():
+    """
+    Stop all of the worker processes. Every game is lost.
+    """
+
+    global SHARDS, GAMES, MAX_ID
+
+    for shard in SHARDS:
+        shard.stop()
+    SHARDS = []
+    GAMES = {}
+    MAX_ID = 0
+
+
+def is_running():
+    """
+    Returns true if the worker processes have been started.
+    """
+
+    return len(SHARDS) > 0
+
+
+def route(game_id, name, *args, **kwargs):
+    """
+    Call a game_runner function for the given game in the worker that owns
+    it. Raises a KeyError if there is no such game.
+    """
+
+    shard, shard_game_id = GAMES[game_id]
+    return shard.call(name, shard_game_id, *args, **kwargs)
+
+
+def create_game(game_definition, seed=None):
+    """
+    Creates a new game in one of the workers. Returns the game id for the
+    new game or throws an exception if there was an error creating the game.
+    """
+
+    global MAX_ID
+
+    if not is_running():
+        raise ValueError("The sharded runner hasn't been started.")
+
+    # Reserve the id before calling the worker, since other greenlets can
+    # create games while we wait on it.
+    game_id = MAX_ID
+    MAX_ID = MAX_ID + 1
+    shard = SHARDS[game_id % len(SHARDS)]
+    GAMES[game_id] = (shard, shard.call("create_game", game_definition,
+                                             seed))
+
+    return game_id
+
+
+def invalidate_game_definition(game_definition):
+    """
+    Forget a cached game definition in every worker.
+    """
+
+    for shard in SHARDS:
+        shard.call("invalidate_game_definition", game_definition)
+
+
+def destroy_game(game_id):
+    """
+    Destroys a game and all of its players, zones, cards,
+    etc. Throws an exception if the game doesn't exist.
+    """
+
+    route(game_id, "destroy_game")
+    del GAMES[game_id]
+
+
+def start_game(game_id):
+    """
+    This will call the set up code for a specific game.
+    """
+
+    return route(game_id, "start_game")
+
+
+def get_state(game_id, player_id=None, share_definitions=False):
+    """
+    Returns the state of the given game.
+    """
+
+    return route(game_id, "get_state", player_id, share_definitions)
+
+
+def get_card_catalog(game_id):
+    """
+    Returns the catalog of card definitions for the given game.
+    """
+
+    return route(game_id, "get_card_catalog")
+
+
+def get_definition_card_catalog(game_definition):
+    """
+    Returns the catalog of card definitions that new games of a game
+    definition start with.
+    """
+
+    if not is_running():
+        raise ValueError("The sharded runner hasn't been started.")
+    return SHARDS[0].call("get_definition_card_catalog", game_definition)
+
+
+def get_definition_version(game_definition):
+    """
+    Returns a value that changes whenever the files of a game definition do.
+    """
+
+    if not is_running():
+        raise ValueError("The sharded runner hasn't been started.")
+    return SHARDS[0].call("get_definition_version", game_definition)
+
+
+def add_player(game_id):
+    """
+    Adds a player to the given game, and returns the
+    player id of the newly created player.
+    """
+
+    return route(game_id, "add_player")
+
+
+def remove_player(game_id, player_id):
+    """
+    Removes a player and returns a boolean
+    denoting success or failure
+    """
+
+    return route(game_id, "remove_player", player_id)
+
+
+def make_action(game_id, **kwargs):
+    """
+    Makes an action in the game. Returns a tuple of (VALID, MESSAGE) just
+    like game_runner.make_action.
+    """
+
+    return route(game_id, "make_action", **kwargs)
+
+
+def get_public_transitions(game_id):
+    """
+    Get all of the public transitions from the game.
+    """
+
+    return route(game_id, "get_public_transitions")
+
+
+def get_player_transitions(game_id, player_id):
+    """
+    Get all the transitions for a specific player.
+    """
+
+    return route(game_id, "get_player_transitions", player_id)
+
+
+def get_state_version(game_id):
+    """
+    Returns the current state version of the given game.
+    """
+
+    return route(game_id, "get_state_version")
+
+
+def get_transitions_since(game_id, version, player_id=None):
+    """
+    Get all the transitions a client holding the given version needs to catch
+    up, or None if it needs the full state.
+    """
+
+    return route(game_id, "get_transitions_since", version, player_id)
+
+
+def get_action_update(game_id, recipients):
+    """
+    Returns everything the clients of a game need after an action in one
+    call, just like game_runner.get_action_update.
+    """
+
+    return route(game_id, "get_action_update", recipients)
+
+
+def get_expected_action(game_id):
+    """
+    Returns the expected action for a specific game.
+    """
+
+    return route(game_id, "get_expected_action")
+
+
+def get_num_games():
+    """
+    Returns the number of games that are running over every worker.
+    """
+
+    return len(GAMES)
+
+
+def has_game(game_id):
+    """
+    Returns true if there is a game with the given id and False
+    otherwise.
+    """
+
+    return game_id in GAMES
+
+
+def abandon_ship(game_id):
+    """
+    Flush all current steps from a game.
+    """
+
+    return route(game_id, "abandon_ship")
+
+
+def get_profile():
+    """
+    Returns the profiles of every worker merged together.
+    """
+
+    profiler = Profiler()
+    for shard in SHARDS:
+        profiler.merge(shard.call("get_profile"))
+    return profiler.to_dict()
+
+
+def flush():
+    """
+    Destroys all games
+    """
+
+    global GAMES, MAX_ID
+
+    for shard in SHARDS:
+        shard.call("flush")
+    GAMES = {}
+    MAX_ID = 0
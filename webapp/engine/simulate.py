@@ -0,0 +1,373 @@
+"""
+This module runs games without any of the web stack so that a game
+definition can be load tested. Games are played by agents and spread over a
+pool of processes. Run it with
+
+    python -m engine.simulate game_defs/dominion -n 1000
+
+and it will report how many games were played per second and how long the
+actions took.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+import traceback
+
+from engine.game import InvalidMoveException
+from engine.game_runner import load_game_definition
+from engine.profiling import Profiler
+
+
+class Agent(object):
+
+    """
+    An Agent decides what a player does next. Subclasses should override
+    choose; on its own an Agent never does anything. Every agent is given its
+    own random number generator.
+    """
+
+    def __init__(self, rng=None):
+        self.random = rng or random.Random()
+
+    def choose(self, game, player):
+        """
+        Returns a tuple of (action name, keyword arguments) for the given
+        player, or None if the player has nothing to do. The arguments should
+        use game ids just like a client would.
+        """
+
+        pass
+
+
+class ScriptedAgent(Agent):
+
+    """
+    A ScriptedAgent just plays through a list of (action name, keyword
+    arguments) tuples, then stops. Subclasses can set script instead of
+    passing it in.
+    """
+
+    script = []
+
+    def __init__(self, rng=None, script=None):
+        super(ScriptedAgent, self).__init__(rng)
+        self.script = list(script if script is not None else self.script)
+
+    def choose(self, game, player):
+        if len(self.script) == 0:
+            return None
+        return self.script.pop(0)
+
+
+class RandomAgent(Agent):
+
+    """
+    A RandomAgent answers any question the game asks it with a random value
+    and otherwise picks one of the valid moves at random. Cards are picked
+    from the player's own zones where possible.
+    """
+
+    # The most argument combinations to try for a single action.
+    max_moves_per_action = 200
+
+    def choose(self, game, player):
+        expected = game.get_expected_action()
+        if expected is not None:
+            if expected[3] != player.game_id:
+                return None
+            return ("send_information",
+                    {"player": player.game_id,
+                     expected[1]: self.pick_value(game, player, expected[1],
+                                                  expected[2])})
+
+        moves = []
+        for name, arguments in sorted(game.get_actions().items()):
+            if name == "send_information":
+                continue
+            for kwargs in self.possible_arguments(game, player, arguments):
+                if game.is_valid_action(name, **dict(kwargs)):
+                    moves.append((name, kwargs))
+        return self.choice(moves)
+
+    def possible_arguments(self, game, player, arguments):
+        """
+        Yields dictionaries of every combination of values we want to try for
+        the given arguments.
+        """
+
+        combinations = [{}]
+        for argument in arguments:
+            values = self.candidate_values(game, player, argument)
+            combinations = [dict(x, **{argument: y})
+                            for x in combinations for y in values]
+            if len(combinations) > self.max_moves_per_action:
+                combinations = self.random.sample(
+                    combinations, self.max_moves_per_action)
+        return combinations
+
+    def candidate_values(self, game, player, name):
+        """
+        All of the values we'd consider for a single argument.
+        """
+
+        if name in ("cards",) or "_cards" in name:
+            return [self.pick_value(game, player, name, "Cards")]
+        elif name == "card" or "_card" in name:
+            return self.player_cards(game, player)
+        elif "zone" in name:
+            return sorted(x.game_id for x in game.zones.values())
+        elif name == "player":
+            return [player.game_id]
+        elif "player" in name:
+            return [x.game_id for x in game.players]
+        return [self.pick_value(game, player, name, None)]
+
+    def pick_value(self, game, player, name, value_type):
+        """
+        Pick a random value for an argument based on the type the game asked
+        for or on its name.
+        """
+
+        if value_type == "Cards":
+            cards = self.player_cards(game, player)
+            return self.random.sample(cards, self.random.randint(0,
+                                                                 len(cards)))
+        elif value_type == "Bool":
+            return self.random.choice([True, False])
+        elif value_type == "Number":
+            return self.random.randint(0, 10)
+        elif value_type in ("Card", "Zone", "Player", None):
+            return self.choice(self.candidate_values(game, player, name))
+        return None
+
+    def player_cards(self, game, player):
+        """
+        Get the ids of the cards in the player's zones, or every card if the
+        player doesn't have any.
+        """
+
+        cards = []
+        for zone in game.get_objects("Zone"):
+            if getattr(zone, "owner", None) is player:
+                cards.extend(x.game_id for x in zone.get_cards())
+        if len(cards) == 0:
+            cards = [x.game_id for x in game.get_objects("Card")]
+        return cards
+
+    def choice(self, items):
+        """
+        Like random.choice but returns None for an empty list.
+        """
+
+        if len(items) == 0:
+            return None
+        return self.random.choice(items)
+
+
+def run_game(game_definition, seed, num_players=None, max_actions=1000,
+             agent_class=RandomAgent, profile=False):
+    """
+    Play a single game with one agent per player. Returns a dictionary of
+    statistics about the game. If profile is true the game is profiled and
+    the statistics include the profile (see Profiler.to_dict).
+    """
+
+    game, config = load_game_definition(game_definition)
+    game.load_config(config)
+    game.seed_random(seed)
+    if profile:
+        game.profiler = Profiler()
+    rng = random.Random(seed)
+
+    if num_players is None:
+        num_players = max(game.min_players, 1)
+    for _ in range(num_players):
+        game.add_player()
+    game.set_up_wrapper()
+
+    agents = dict((x.game_id, agent_class(random.Random(rng.random())))
+                  for x in game.players)
+    stats = {"latencies": [], "invalid": 0, "errors": 0, "finished": False}
+
+    for _ in range(max_actions):
+        if game.is_over():
+            stats["finished"] = True
+            break
+
+        players = list(game.players)
+        rng.shuffle(players)
+        choice = None
+        for player in players:
+            choice = agents[player.game_id].choose(game, player)
+            if choice is not None:
+                break
+        if choice is None:
+            break
+
+        name, kwargs = choice
+        start = time.time()
+        try:
+            game.make_action(name, **dict(kwargs))
+        except InvalidMoveException:
+            stats["invalid"] += 1
+            continue
+        except Exception:  # pylint: disable=broad-except
+            # Random arguments can break rules that don't check their
+            # input. Count it and get the game unstuck.
+            stats["errors"] += 1
+            game.abandon_ship()
+            continue
+        stats["latencies"].append(time.time() - start)
+
+    stats["actions"] = len(stats["latencies"])
+    if profile:
+        stats["profile"] = game.profiler.to_dict()
+    return stats
+
+
+def run_game_star(arguments):
+    """
+    Unpacks the arguments for run_game. Pool.map only passes one argument.
+    The last argument says whether to hide anything the game prints.
+    """
+
+    stdout = sys.stdout
+    if arguments[-1]:
+        sys.stdout = open(os.devnull, "w")
+    try:
+        return run_game(*arguments[:-1])
+    except Exception:
+        # Make sure we see where it actually went wrong.
+        traceback.print_exc()
+        raise
+    finally:
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+
+def percentile(values, fraction):
+    """
+    Returns the value at the given fraction of a sorted list.
+    """
+
+    if len(values) == 0:
+        return 0
+    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def simulate(game_definition, num_games, processes=None, seed=0,
+             num_players=None, max_actions=1000, agent_class=RandomAgent,
+             quiet=True, profile=False):
+    """
+    Play num_games games over a pool of processes. Returns a dictionary
+    summarizing all of the games. If profile is true the summary includes a
+    Profiler covering every game.
+    """
+
+    arguments = [(game_definition, seed + i, num_players, max_actions,
+                  agent_class, profile, quiet) for i in range(num_games)]
+
+    start = time.time()
+    if processes == 1:
+        results = [run_game_star(x) for x in arguments]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(run_game_star, arguments)
+        finally:
+            pool.close()
+            pool.join()
+    elapsed = time.time() - start
+
+    latencies = sorted(x for result in results for x in result["latencies"])
+    summary = {
+        "games": num_games,
+        "finished": sum(1 for x in results if x["finished"]),
+        "seconds": elapsed,
+        "games_per_second": num_games / elapsed if elapsed > 0 else 0,
+        "actions": len(latencies),
+        "invalid": sum(x["invalid"] for x in results),
+        "errors": sum(x["errors"] for x in results),
+        "latency_ms": dict(("p" + str(int(x * 100)),
+                            percentile(latencies, x) * 1000)
+                           for x in (0.5, 0.9, 0.99, 1.0)),
+    }
+    if profile:
+        summary["profile"] = Profiler()
+        for result in results:
+            summary["profile"].merge(result["profile"])
+    return summary
+
+
+def load_agent(path):
+    """
+    Load an agent class from a "module:Class" string.
+    """
+
+    module_name, class_name = path.split(":")
+    module = __import__(module_name, fromlist=[class_name])
+    return getattr(module, class_name)
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Play games without a server and report how fast they "
+                    "were.")
+    parser.add_argument("game_definition",
+                        help="Path to the game definition to play.")
+    parser.add_argument("-n", "--games", type=int, default=100,
+                        help="Number of games to play.")
+    parser.add_argument("-p", "--processes", type=int, default=None,
+                        help="Number of processes. Defaults to one per "
+                             "core.")
+    parser.add_argument("--players", type=int, default=None,
+                        help="Players per game. Defaults to the minimum.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the first game; each game after that "
+                             "uses the next seed.")
+    parser.add_argument("--max-actions", type=int, default=1000,
+                        help="Stop a game after this many actions.")
+    parser.add_argument("--agent", default=None,
+                        help="Agent class to use as module:Class. Defaults "
+                             "to a random agent.")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Show anything the games print.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Show where the time in each action went.")
+    options = parser.parse_args(argv)
+
+    agent_class = RandomAgent
+    if options.agent is not None:
+        agent_class = load_agent(options.agent)
+
+    summary = simulate(options.game_definition, options.games,
+                       options.processes, options.seed, options.players,
+                       options.max_actions, agent_class,
+                       not options.verbose, options.profile)
+
+    print "Played %d games (%d finished) in %.2fs: %.1f games/sec" % (
+        summary["games"], summary["finished"], summary["seconds"],
+        summary["games_per_second"])
+    print "%d actions, %d invalid, %d errors" % (
+        summary["actions"], summary["invalid"], summary["errors"])
+    print "Action latency (ms): p50 %.3f  p90 %.3f  p99 %.3f  max %.3f" % (
+        summary["latency_ms"]["p50"], summary["latency_ms"]["p90"],
+        summary["latency_ms"]["p99"], summary["latency_ms"]["p100"])
+    if options.profile:
+        print
+        print summary["profile"].report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
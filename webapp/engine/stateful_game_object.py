@@ -14,20 +14,20 @@ class StatefulGameObject(GameObject):
     game.
     """
 
-    def __init__(self):
-        super(StatefulGameObject, self).__init__()
-
-        # What attributes shouldn't be tracked (internal attributes mainly)
-        self.no_track_attributes = set()
-        self.no_track_attributes.add("game_object_type")
-        self.no_track_attributes.add("player_specific_attributes")
-        self.exclude_from_dict.add("no_track_attributes")
-        self.exclude_from_dict.add("game_object_type")
-        self.exclude_from_dict.add("player_specific_attributes")
-
-        self.player_specific_attributes = {}
-
-        self.game_object_type = "None"
+    # What attributes shouldn't be tracked (internal attributes mainly). Like
+    # exclude_from_dict this is shared by the class; untrack_attribute gives
+    # a single instance its own copy.
+    no_track_attributes = frozenset(("game_object_type",
+                                     "player_specific_attributes",
+                                     "dict_cache"))
+    exclude_from_dict = GameObject.exclude_from_dict | frozenset((
+        "no_track_attributes",
+        "game_object_type",
+        "player_specific_attributes"))
+    # Values only visible to specific players, in the form
+    # {player: {name: value}}. Created the first time one is set.
+    player_specific_attributes = None
+    game_object_type = "None"
 
     def __setattr__(self, name, value):
         self.register_transition(name, value)
@@ -46,6 +46,15 @@ class StatefulGameObject(GameObject):
             trans = ("set", self.game_object_type, self.game_id, name, value)
             self.game.add_transition(trans, player)
 
+    def untrack_attribute(self, name):
+        """
+        Stop tracking changes to an attribute on just this object.
+        """
+
+        if name not in self.no_track_attributes:
+            self.__dict__["no_track_attributes"] = (self.no_track_attributes |
+                                                    set((name,)))
+
     def set_value(self, name, value, player=None):
         """
         Set values on this object. If the values can be public then it is
@@ -55,7 +64,10 @@ class StatefulGameObject(GameObject):
         if player is None:
             return setattr(self, name, value)
 
+        if self.player_specific_attributes is None:
+            self.player_specific_attributes = {}
         self.player_specific_attributes.setdefault(player, {})[name] = value
+        self.invalidate_dict_cache()
         self.register_transition(name, value, player)
 
     def get_value(self, name, player=None):
@@ -68,7 +80,7 @@ class StatefulGameObject(GameObject):
             if not hasattr(self, name):
                 return None
             return getattr(self, name)
-        vals = self.player_specific_attributes.get(player, None)
+        vals = (self.player_specific_attributes or {}).get(player, None)
         if vals is not None:
             return vals.get(name, None)
         return None
@@ -84,7 +96,8 @@ class StatefulGameObject(GameObject):
         result = {x: y for x, y in self.__dict__.iteritems() if
                   x not in self.exclude_from_dict}
         # Add in everything for this specific player
-        player_items = self.player_specific_attributes.get(player, {}).items()
+        player_items = (self.player_specific_attributes or {}).get(player, {})
+        player_items = player_items.items()
         for key, value in player_items:
             result[key] = value
 
@@ -60,3 +60,50 @@ class CardSetTestCase(TestCase):
 
         # Make sure an error is thrown if we create a card that doesn't exist
         self.assertRaises(ValueError, self.card_set.create, "Gold")
+
+    def test_catalog(self):
+        """
+        Make sure the catalog lists every definition and its version only
+        changes with them.
+        """
+
+        catalog = self.card_set.catalog()
+        self.assertEqual([x["name"] for x in catalog["cards"]],
+                         ["Copper", "Silver"])
+        self.assertEqual(self.card_set.catalog_index(
+            self.card_set.cards["Silver"]), 1)
+        self.assertIsNone(self.card_set.catalog_index({"name": "Silver"}))
+
+        other = CardSet()
+        other.load_from_list([{"name": "Silver", "cost": 2},
+                              {"name": "Copper", "cost": 1}])
+        self.assertEqual(other.catalog()["version"], catalog["version"])
+        other.load_from_list([{"name": "Copper", "cost": 3}])
+        self.assertNotEqual(other.catalog()["version"], catalog["version"])
+
+    def test_shared_definitions(self):
+        """
+        Make sure that cards share their definition instead of copying it and
+        that the definition still shows up when converting to a dict.
+        """
+
+        copper1, copper2 = self.card_set.create("Copper", 2)
+        self.assertIs(copper1.definition, copper2.definition)
+        self.assertNotIn("cost", copper1.__dict__)
+        self.assertEqual(copper1.name, "Copper")
+        self.assertFalse(hasattr(copper1, "victory_points"))
+
+        # Setting a value only changes that instance
+        copper1.cost = 5
+        self.assertEqual(copper1.cost, 5)
+        self.assertEqual(copper2.cost, 1)
+        self.assertEqual(self.card_set.cards["Copper"]["cost"], 1)
+
+        copper2.game_id = 2
+        self.assertDictEqual(copper2.to_dict(),
+                             {"name": "Copper",
+                              "cost": 1,
+                              "game_id": 2,
+                              "zone": None,
+                              "face_up": False})
+        self.assertEqual(copper1.to_dict()["cost"], 5)
@@ -0,0 +1,98 @@
+"""
+This module contains all the tests for the CardStack.
+"""
+
+import cPickle as pickle
+from unittest import TestCase
+
+from engine.card import Card
+from engine.card_stack import CardStack
+
+
+class CardStackTestCase(TestCase):
+
+    """
+    Simple test case around CardStacks.
+    """
+
+    def setUp(self):
+        self.cards = [Card() for _ in range(5)]
+        self.stack = CardStack(self.cards)
+
+    def test_order(self):
+        """
+        Make sure the stack keeps its order, with the last card on top.
+        """
+
+        self.assertListEqual(self.stack.to_list(), self.cards)
+        self.assertListEqual(list(self.stack), self.cards)
+        self.assertEqual(self.stack.peek(), self.cards[-1])
+        self.assertEqual(self.stack[0], self.cards[0])
+        self.assertEqual(len(self.stack), 5)
+
+    def test_remove(self):
+        """
+        Make sure we can remove cards from anywhere in the stack.
+        """
+
+        self.stack.remove(self.cards[1])
+        self.stack.remove(self.cards[3])
+        self.assertNotIn(self.cards[1], self.stack)
+        self.assertIn(self.cards[2], self.stack)
+        self.assertEqual(len(self.stack), 3)
+        self.assertListEqual(self.stack.to_list(),
+                             [self.cards[0], self.cards[2], self.cards[4]])
+        self.assertEqual(self.stack[1], self.cards[2])
+
+        # Removing the top card means the next card is on top
+        self.stack.remove(self.cards[4])
+        self.assertEqual(self.stack.peek(), self.cards[2])
+        self.assertEqual(self.stack.pop(), self.cards[2])
+        self.assertEqual(self.stack.pop(), self.cards[0])
+        self.assertIsNone(self.stack.peek())
+
+        self.assertRaises(ValueError, self.stack.remove, self.cards[0])
+        self.assertRaises(IndexError, self.stack.pop)
+
+        # Holes don't stop us from adding again
+        self.stack.append(self.cards[1])
+        self.assertListEqual(self.stack.to_list(), [self.cards[1]])
+
+    def test_pickle(self):
+        """
+        Make sure holes left by removed cards don't survive pickling.
+        """
+
+        self.stack.remove(self.cards[1])
+        cards, stack = pickle.loads(pickle.dumps((self.cards, self.stack),
+                                                 pickle.HIGHEST_PROTOCOL))
+        self.assertListEqual(stack.to_list(),
+                             [cards[0], cards[2], cards[3], cards[4]])
+        self.assertEqual(stack.num_removed, 0)
+        self.assertIn(cards[2], stack)
+        self.assertNotIn(cards[1], stack)
+
+    def test_shuffle(self):
+        """
+        Make sure shuffling keeps every card and their positions.
+        """
+
+        self.stack.remove(self.cards[2])
+        self.stack.shuffle(lambda x: x.reverse())
+
+        self.assertListEqual(self.stack.to_list(),
+                             [self.cards[4], self.cards[3], self.cards[1],
+                              self.cards[0]])
+        self.stack.remove(self.cards[3])
+        self.assertEqual(self.stack.pop(), self.cards[0])
+        self.assertListEqual(self.stack.to_list(),
+                             [self.cards[4], self.cards[1]])
+
+    def test_clear(self):
+        """
+        Make sure we can remove everything.
+        """
+
+        self.stack.clear()
+        self.assertEqual(len(self.stack), 0)
+        self.assertNotIn(self.cards[0], self.stack)
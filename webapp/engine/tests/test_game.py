@@ -247,6 +247,105 @@ class GameTestCase(TestCase):
         self.assertTrue(hasattr(self.game, 'card_set'))
         self.assertEqual(len(self.game.card_set.all_cards()), 2)
 
+    def test_clone(self):
+        """
+        Make sure a cloned game has its own copies of every game object and
+        the card set, but shares the card definitions.
+        """
+
+        game = MockGame()
+        game.load_config({
+            "max_players": 2,
+            "card_set": [{"name": "card1"}],
+            "zones": [{"name": "zone1"}]
+        })
+        card = game.card_set.create("card1")
+        game.register([card])
+        game.zone1.push(card)
+
+        clone = game.clone()
+        self.assertEqual(clone.max_players, 2)
+        self.assertIsNot(clone.card_set, game.card_set)
+        self.assertIs(clone.card_set.cards["card1"],
+                      game.card_set.cards["card1"])
+        self.assertIsNot(clone.zone1, game.zone1)
+        self.assertIs(clone.zones["zone1"], clone.zone1)
+        self.assertIs(clone.zone1.game, clone)
+        self.assertIs(clone.get_object_with_id("Zone", 1), clone.zone1)
+
+        clone_card = clone.get_object_with_id("Card", card.game_id)
+        self.assertIsNot(clone_card, card)
+        self.assertIs(clone_card.zone, clone.zone1)
+        self.assertIs(clone_card.definition, card.definition)
+        self.assertTrue(clone_card in clone.zone1)
+
+        # Changes to the clone don't leak back into the original.
+        clone.add_player()
+        clone_card.face_up = True
+        self.assertEqual(game.players, [])
+        self.assertFalse(card.face_up)
+
+    def test_clone_other_values(self):
+        """
+        Make sure values clone doesn't know about aren't shared between
+        clones.
+        """
+
+        game = MockGame()
+        game.load_config({"max_players": 2})
+        game.seen = set()
+        clone1 = game.clone()
+        clone2 = game.clone()
+
+        clone1.seen.add("card1")
+        self.assertEqual(clone2.seen, set())
+        self.assertEqual(game.seen, set())
+
+    def test_seed_random(self):
+        """
+        Games draw from their own random number generator, which can be
+        seeded.
+        """
+
+        game1 = MockGame()
+        game2 = MockGame()
+        self.assertIsNotNone(game1.seed)
+        self.assertIsNot(game1.random, game2.random)
+        self.assertIsNot(game1.clone().random, game1.random)
+
+        game1.seed_random(1234)
+        game2.seed_random(1234)
+        self.assertEqual(game1.seed, 1234)
+        self.assertEqual([game1.random.random() for _ in range(5)],
+                         [game2.random.random() for _ in range(5)])
+
+    def test_get_actions(self):
+        """
+        Make sure we can list the actions of a game and check if an action
+        is valid without making it.
+        """
+
+        actions = self.game.get_actions()
+        self.assertEqual(actions["win"], ["player_id"])
+        self.assertEqual(actions["test_argument_types"],
+                         ["card", "zone", "player"])
+        self.assertIn("send_information", actions)
+        self.assertNotIn("set_up", actions)
+
+        self.game.phase = "restricted"
+        self.assertFalse(self.game.is_valid_action("restricted_action",
+                                                   player_id=1))
+        self.assertFalse(self.game.is_valid_action("set_up"))
+        self.assertFalse(self.game.is_valid_action(
+            "send_information", player=self.player.game_id))
+        self.game.phase = "unrestricted"
+        self.assertTrue(self.game.is_valid_action("restricted_action",
+                                                  player_id=1))
+        # Ids that aren't numbers are just invalid
+        self.assertFalse(self.game.is_valid_action("restricted_action",
+                                                   player_id="foo"))
+        self.assertFalse(self.game.is_over())
+
     def test_config_with_owners(self):
         """
         Test allowing configurations to specify zone ownership.
@@ -675,6 +774,151 @@ class GameTestCase(TestCase):
         transitions = self.game.get_player_transitions(self.player.game_id)
         self.assertListEqual([("baz",)], transitions)
 
+    def test_transitions_since(self):
+        """
+        Make sure that each action gets a new state version and that we can
+        get all the transitions since an older version.
+        """
+
+        self.game.reset_transition_history()
+        version = self.game.state_version
+
+        self.game.make_action("private_public_action",
+                              player=self.player.game_id)
+        self.assertEqual(self.game.state_version, version + 1)
+        self.game.make_action("test_multi_step", player=self.player.game_id)
+        self.game.make_action("send_information", player=self.player.game_id,
+                              num=3)
+        self.assertEqual(self.game.state_version, version + 3)
+
+        self.assertEqual(self.game.get_transitions_since(version + 3), [])
+        self.assertEqual(self.game.get_transitions_since(version + 2),
+                         [("step2", 3), ("step3", 3)])
+        self.assertEqual(self.game.get_transitions_since(version),
+                         [("public", "foobar"), ("step1",), ("step2", 3),
+                          ("step3", 3)])
+        self.assertEqual(
+            self.game.get_transitions_since(version, self.player.game_id),
+            [("public", "foobar"), ("private", "foobaz"), ("step1",),
+             ("step2", 3), ("step3", 3)])
+
+        # We can't go back further than the history or forward in time
+        self.assertIsNone(self.game.get_transitions_since(version - 1))
+        self.assertIsNone(self.game.get_transitions_since(version + 4))
+
+        # Only a limited amount of history is kept
+        self.game.max_transition_history = 2
+        self.game.make_action("private_public_action",
+                              player=self.player.game_id)
+        self.assertEqual(len(self.game.transition_history), 2)
+        self.assertIsNone(self.game.get_transitions_since(version + 1))
+        self.assertIsNotNone(self.game.get_transitions_since(version + 2))
+
+    def test_transitions_for(self):
+        """
+        Make sure we can get the transitions for many clients at once and
+        that clients without private transitions share the public ones.
+        """
+
+        other = Player()
+        self.game.register([other])
+        self.game.reset_transition_history()
+        version = self.game.state_version
+        self.game.make_action("private_public_action",
+                              player=self.player.game_id)
+        self.game.make_action("test_multi_step", player=self.player.game_id)
+
+        player_id = self.player.game_id
+        result = self.game.get_transitions_for([
+            (version, player_id), (version, other.game_id), (version, None),
+            (version + 1, player_id), (version + 1, None),
+            (version - 1, player_id), (None, None), (version, player_id)])
+        self.assertEqual(len(result), 7)
+        for key in [(version, player_id), (version + 1, player_id),
+                    (version - 1, player_id)]:
+            self.assertEqual(result[key],
+                             self.game.get_transitions_since(*key))
+        self.assertEqual(result[(version, None)],
+                         self.game.get_transitions_since(version))
+        self.assertIs(result[(version, other.game_id)],
+                      result[(version, None)])
+        # The private transition came before version + 1
+        self.assertIs(result[(version + 1, player_id)],
+                      result[(version + 1, None)])
+        self.assertIsNone(result[(None, None)])
+
+    def test_make_action_coalesces_transitions(self):
+        """
+        Redundant transitions from a single action should be coalesced
+        before they are stored.
+        """
+
+        def flip_twice(player):
+            """
+            Sets the same attribute twice.
+            """
+
+            player.score = 1
+            player.score = 2
+
+        self.game.flip_twice = flip_twice
+        self.game.make_action("flip_twice", player=self.player.game_id)
+        self.assertListEqual(self.game.get_public_transitions(),
+                             [("set", "Player", 1, "score", 2)])
+
+    def test_failed_action_clears_history(self):
+        """
+        An action that fails after changing something leaves no history, so
+        clients catch up with the whole state. One that fails before
+        changing anything doesn't start a new version.
+        """
+
+        def fail_halfway(player):
+            """
+            Changes the player and then blows up.
+            """
+
+            player.score = 1
+            raise ValueError("oops")
+
+        self.game.fail_halfway = fail_halfway
+        self.game.reset_transition_history()
+        version = self.game.state_version
+
+        self.assertRaises(InvalidMoveException, self.game.make_action,
+                          "no_such_action", player=self.player.game_id)
+        self.assertEqual(self.game.state_version, version)
+
+        self.assertRaises(ValueError, self.game.make_action, "fail_halfway",
+                          player=self.player.game_id)
+        self.assertEqual(self.game.state_version, version + 1)
+        self.assertIsNone(self.game.get_transitions_since(version))
+
+        self.game.make_action("private_public_action",
+                              player=self.player.game_id)
+        self.assertEqual(self.game.get_transitions_since(version + 1),
+                         [("public", "foobar")])
+
+    def test_untracked_changes_clear_history(self):
+        """
+        Registering new objects isn't captured by transitions, so the next
+        version should have no history.
+        """
+
+        self.game.reset_transition_history()
+        version = self.game.state_version
+        self.game.register([Card()])
+        self.game.make_action("private_public_action",
+                              player=self.player.game_id)
+
+        self.assertEqual(self.game.state_version, version + 1)
+        self.assertIsNone(self.game.get_transitions_since(version))
+        self.assertEqual(self.game.get_transitions_since(version + 1), [])
+
+        self.game.max_players = 2
+        self.game.add_player()
+        self.assertIsNone(self.game.get_transitions_since(version + 1))
+
     def test_remove_player(self):
         """
         Make sure players can be removed by player_id
@@ -715,6 +959,89 @@ class GameTestCase(TestCase):
         self.assertDictEqual(player_expected_state,
                              self.game.get_state(self.player.game_id))
 
+    def test_get_state_share_definitions(self):
+        """
+        Card definitions can be sent once instead of with every card.
+        """
+
+        definition = {"name": "Copper", "value": 1}
+        self.game.card_set.load_from_list([definition])
+        definition = self.game.card_set.cards["Copper"]
+        card1 = Card(definition)
+        card2 = Card(definition)
+        card3 = Card()
+        # Not from the card set, so it can't refer to the catalog
+        card4 = Card({"name": "Copper", "value": 3})
+        self.game.register([card1, card2, card3, card4])
+        card2.value = 2
+
+        state = self.game.get_state(share_definitions=True)
+        catalog = self.game.get_card_catalog()
+        self.assertEqual(catalog['cards'], [definition])
+        self.assertEqual(state['catalog_version'], catalog['version'])
+        self.assertNotIn('definitions', state)
+        self.assertEqual(state['cards'],
+                         [{'game_id': 1, 'zone': None, 'face_up': False,
+                           'definition': 0},
+                          {'game_id': 2, 'zone': None, 'face_up': False,
+                           'value': 2, 'definition': 0},
+                          {'game_id': 3, 'zone': None, 'face_up': False},
+                          {'game_id': 4, 'zone': None, 'face_up': False,
+                           'name': 'Copper', 'value': 3}])
+
+        # The usual state still has everything in each card.
+        self.assertEqual(self.game.get_state()['cards'][0],
+                         {'game_id': 1, 'zone': None, 'face_up': False,
+                          'name': 'Copper', 'value': 1})
+
+    def test_get_state_cache(self):
+        """
+        Make sure that get_state reuses dictionaries for objects that haven't
+        changed and picks up changes to the ones that have.
+        """
+
+        self.game.load_config({"zones": [{"name": "zone1"}]})
+        card1 = Card()
+        card2 = Card()
+        self.game.register([card1, card2])
+        self.game.zone1.push(card1)
+
+        state = self.game.get_state()
+        player_state = self.game.get_state(self.player.game_id)
+        # Nothing is specific to the player so the dicts are shared
+        self.assertIs(state['cards'][0], player_state['cards'][0])
+
+        # Setting an attribute only re-serializes that card
+        card1.face_up = True
+        new_state = self.game.get_state()
+        self.assertTrue(new_state['cards'][0]['face_up'])
+        self.assertIsNot(state['cards'][0], new_state['cards'][0])
+        self.assertIs(state['cards'][1], new_state['cards'][1])
+        self.assertIs(state['zones'][0], new_state['zones'][0])
+
+        # Moving cards updates the zones
+        self.game.zone1.push(card2)
+        state = self.game.get_state()
+        self.assertEqual(state['zones'][0]['cards'], [1, 2])
+        self.assertEqual(state['cards'][1]['zone'], 1)
+        self.game.zone1.remove_card(card1)
+        state = self.game.get_state()
+        self.assertEqual(state['zones'][0]['cards'], [2])
+        self.assertEqual(state['cards'][0]['zone'], None)
+
+        # Player specific values are only seen by that player
+        card2.set_value("face_up", True, self.player)
+        self.assertFalse(self.game.get_state()['cards'][1]['face_up'])
+        player_state = self.game.get_state(self.player.game_id)
+        self.assertTrue(player_state['cards'][1]['face_up'])
+
+        # Registering new objects throws everything away
+        card3 = Card()
+        self.game.register([card3])
+        self.assertIsNot(state['zones'][0],
+                         self.game.get_state()['zones'][0])
+        self.assertEqual(len(self.game.get_state()['cards']), 3)
+
     def test_deregister(self):
         """
         Make sure that we can properly deregister objects.
@@ -728,9 +1055,20 @@ class GameTestCase(TestCase):
 
         self.game.register([player, card, zone, other])
 
+        card_id = card.game_id
         self.game.deregister([player, card, zone, other, unregistered])
-        print self.game.registered_objects
-        self.assertEqual(self.game.registered_objects["Player"][0], 2)
-        self.assertEqual(self.game.registered_objects["Card"][0], 1)
-        self.assertEqual(self.game.registered_objects["Zone"][0], 1)
-        self.assertEqual(self.game.registered_objects["GameObject"][0], 1)
+        self.assertIsNone(card.game_id)
+        self.assertIsNone(card.game)
+        # Nothing about deregistering is sent to clients
+        self.assertEqual(self.game.get_public_transitions(), [])
+        self.assertIsNone(self.game.get_object_with_id("Card", card_id))
+        self.assertEqual(self.game.get_objects("Player"), [self.player])
+        self.assertEqual(self.game.get_objects("Zone"), [])
+        self.assertEqual(self.game.get_objects("GameObject"), [])
+
+        # Freed ids are given out again
+        new_card = Card()
+        self.game.register([new_card])
+        self.assertEqual(new_card.game_id, card_id)
+        self.assertIs(self.game.get_object_with_id("Card", card_id),
+                      new_card)
@@ -70,3 +70,17 @@ class GameObjectTestCase(TestCase):
         test_dict = self.game_object.replace_game_objects({"foo": test_object})
         self.assertDictEqual(test_dict,
                              {"foo": test_object.game_id})
+
+    def test_exclude_attribute(self):
+        """
+        Make sure that excluding an attribute only changes that one object.
+        """
+
+        other = GameObject()
+        self.game_object.secret = "foo"
+        other.secret = "bar"
+
+        self.game_object.exclude_attribute("secret")
+        self.assertNotIn("secret", self.game_object.to_dict())
+        self.assertIn("secret", other.to_dict())
+        self.assertIs(other.exclude_from_dict, GameObject.exclude_from_dict)
@@ -5,6 +5,7 @@ that. Note that the game runner is a __module__ not a class (this is
 the best way we could think of to implement the singleton pattern).
 """
 
+import os.path
 from unittest import TestCase
 
 from engine import game_runner
@@ -61,6 +62,10 @@ class GameRunnerTestCase(TestCase):
         game_id = game_runner.create_game(self.valid_game_def)
         self.assertTrue(game_id > 0)
 
+        # Games can be created with a seed
+        game_id = game_runner.create_game(self.valid_game_def, seed=7)
+        self.assertEqual(game_runner.get_game(game_id).seed, 7)
+
         # Make sure IDs are unique
         game_id_1 = game_runner.create_game(self.valid_game_def)
         self.assertNotEqual(game_id, game_id_1)
@@ -173,3 +178,76 @@ class GameRunnerTestCase(TestCase):
         transitions = game_runner.get_player_transitions(self.game_id,
                                                          player2.game_id)
         self.assertListEqual([], transitions)
+
+    def test_get_transitions_since(self):
+        """
+        Make sure we can get the current version and the transitions since
+        an older one.
+        """
+
+        game = game_runner.get_game(self.game_id)
+        player = Player()
+        game.register([player])
+        game.reset_transition_history()
+
+        version = game_runner.get_state_version(self.game_id)
+        game_runner.make_action(self.game_id,
+                                action_name="private_public_action",
+                                player=player.game_id)
+        self.assertEqual(game_runner.get_state_version(self.game_id),
+                         version + 1)
+        transitions = game_runner.get_transitions_since(self.game_id,
+                                                        version,
+                                                        player.game_id)
+        self.assertListEqual([("public", "foobar"), ("private", "foobaz")],
+                             transitions)
+        self.assertIsNone(game_runner.get_transitions_since(self.game_id,
+                                                            version - 1))
+
+        update = game_runner.get_action_update(
+            self.game_id, [(version, player.game_id), (None, None)])
+        self.assertEqual(update["version"], version + 1)
+        self.assertEqual(update["public_transitions"], [("public", "foobar")])
+        self.assertIsNone(update["expected_action"])
+        self.assertEqual(update["transitions"],
+                         {(version, player.game_id): transitions,
+                          (None, None): None})
+
+    def test_cached_game_definition(self):
+        """
+        Make sure definitions are only loaded once, that every game gets its
+        own config, and that changing the definition reloads it.
+        """
+
+        game1, config1 = game_runner.load_game_definition(self.valid_game_def)
+        game2, config2 = game_runner.load_game_definition(self.valid_game_def)
+        self.assertIs(type(game1), type(game2))
+        self.assertEqual(config1, config2)
+        self.assertIsNot(config1, config2)
+        key = os.path.abspath(self.valid_game_def)
+        self.assertIn(key, game_runner.DEFINITIONS)
+        self.assertEqual(
+            game_runner.get_definition_version(self.valid_game_def),
+            game_runner.DEFINITIONS[key][0])
+
+        # New games are cloned from a single prototype.
+        prototype = game_runner.get_prototype(self.valid_game_def)
+        game_id = game_runner.create_game(self.valid_game_def)
+        self.assertIs(game_runner.get_prototype(self.valid_game_def),
+                      prototype)
+        self.assertIsNot(game_runner.get_game(game_id), prototype)
+        self.assertIs(type(game_runner.get_game(game_id)), type(prototype))
+
+        # Pretend the files changed on disk.
+        mtimes, klass, config = game_runner.DEFINITIONS[key]
+        game_runner.DEFINITIONS[key] = ((0,), klass, config)
+        game_runner.load_game_definition(self.valid_game_def)
+        self.assertEqual(game_runner.DEFINITIONS[key][0], mtimes)
+        self.assertIsNot(game_runner.DEFINITIONS[key][2], config)
+
+        self.assertIsNot(game_runner.get_prototype(self.valid_game_def),
+                         prototype)
+
+        game_runner.invalidate_game_definition(self.valid_game_def)
+        self.assertNotIn(key, game_runner.DEFINITIONS)
+        self.assertNotIn(key, game_runner.PROTOTYPES)
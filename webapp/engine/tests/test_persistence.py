@@ -0,0 +1,194 @@
+"""
+This module contains the tests for persisting games across restarts.
+"""
+
+import cPickle as pickle
+import json
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+
+from engine import game_runner, persistence
+from engine.card import Card
+
+
+class PersistenceTestCase(TestCase):
+
+    """
+    Makes sure games can be written out and brought back.
+    """
+
+    def setUp(self):
+        self.valid_game_def = "engine/tests/mock_game"
+        self.path = tempfile.mkdtemp()
+        persistence.enable(self.path, snapshot_interval=3)
+        self.game_id = game_runner.create_game(self.valid_game_def)
+
+    def tearDown(self):
+        game_runner.flush()
+        persistence.disable()
+        shutil.rmtree(self.path)
+
+    def restart(self):
+        """
+        Pretend the server was restarted.
+        """
+
+        persistence.disable()
+        game_runner.CACHE = {}
+        game_runner.MAX_ID = 0
+        return persistence.enable(self.path, snapshot_interval=3)
+
+    def test_restore(self):
+        """
+        Make sure a game comes back with everything that happened to it.
+        """
+
+        player_id = game_runner.add_player(self.game_id)
+        game_runner.make_action(self.game_id, action_name="win",
+                                player_id=player_id)
+        state = game_runner.get_state(self.game_id)
+
+        self.assertEqual(self.restart(), [self.game_id])
+        self.assertEqual(game_runner.get_state(self.game_id), state)
+        self.assertTrue(game_runner.get_game(self.game_id).is_over())
+        self.assertEqual(game_runner.get_game(self.game_id).winners(),
+                         [player_id])
+
+        # New games don't reuse the id of a restored game.
+        self.assertNotEqual(game_runner.create_game(self.valid_game_def),
+                            self.game_id)
+
+    def test_restore_zone_with_holes(self):
+        """
+        A card taken from the middle of a zone stays gone after a restore.
+        """
+
+        game = game_runner.get_game(self.game_id)
+        game.add_zone({"name": "hand"})
+        cards = [Card() for _ in range(3)]
+        game.register([game.hand] + cards)
+        for card in cards:
+            game.hand.push(card)
+        game.hand.remove_card(cards[1])
+        self.assertTrue(game_runner.JOURNAL.snapshot(self.game_id))
+
+        self.restart()
+        hand = game_runner.get_game(self.game_id).hand
+        self.assertEqual([x.game_id for x in hand.get_cards()],
+                         [cards[0].game_id, cards[2].game_id])
+        self.assertEqual(len(hand.cards), 2)
+        json.dumps(game_runner.get_state(self.game_id))
+
+    def test_snapshot_leaves_out_caches(self):
+        """
+        Cached dictionaries and transition history aren't written out, and
+        attributes missing from a snapshot get their defaults.
+        """
+
+        player_id = game_runner.add_player(self.game_id)
+        game_runner.get_state(self.game_id)
+        game = game_runner.get_game(self.game_id)
+        player = game.get_object_with_id("Player", player_id)
+        self.assertIsNotNone(player.dict_cache)
+
+        data = pickle.loads(pickle.dumps(game, pickle.HIGHEST_PROTOCOL))
+        self.assertNotIn("dict_cache", data.players[0].__dict__)
+        self.assertEqual(data.transition_history, [])
+
+        state = game.__getstate__()
+        del state["max_transition_history"]
+        restored = object.__new__(type(game))
+        restored.__setstate__(state)
+        self.assertEqual(restored.max_transition_history, 64)
+
+    def test_snapshot_versions(self):
+        """
+        Old snapshots still load, while ones we can't read are skipped
+        without losing the other games.
+        """
+
+        snapshot_path = os.path.join(self.path,
+                                     str(self.game_id) + ".snapshot")
+        game = game_runner.get_game(self.game_id)
+        with open(snapshot_path, "wb") as fout:
+            pickle.dump((self.valid_game_def, 1), fout)
+            pickle.dump(game, fout)
+        other_id = game_runner.create_game(self.valid_game_def)
+        self.assertEqual(self.restart(), [self.game_id, other_id])
+
+        with open(snapshot_path, "wb") as fout:
+            pickle.dump({"version": persistence.SNAPSHOT_VERSION + 1}, fout)
+        self.assertEqual(self.restart(), [other_id])
+        self.assertTrue(os.path.exists(snapshot_path))
+        self.assertNotEqual(game_runner.create_game(self.valid_game_def),
+                            self.game_id)
+
+    def test_snapshot_interval(self):
+        """
+        The log is started over every time a snapshot is taken.
+        """
+
+        log_path = os.path.join(self.path, str(self.game_id) + ".log")
+        player_id = game_runner.add_player(self.game_id)
+        game_runner.make_action(self.game_id, action_name="lose",
+                                player_id=player_id)
+        with open(log_path) as log:
+            self.assertEqual(len(log.readlines()), 2)
+
+        game_runner.abandon_ship(self.game_id)
+        with open(log_path) as log:
+            self.assertEqual(len(log.readlines()), 0)
+
+    def test_unpicklable_game(self):
+        """
+        A game waiting on a step can't be snapshotted, so it gets replayed
+        from the log instead.
+        """
+
+        journal = game_runner.JOURNAL
+        player_id = game_runner.add_player(self.game_id)
+        game_runner.make_action(self.game_id, action_name="test_multi_step",
+                                player=player_id)
+        self.assertFalse(journal.snapshot(self.game_id))
+        game_runner.make_action(self.game_id, action_name="send_information",
+                                player=player_id, num=5)
+
+        self.restart()
+        game = game_runner.get_game(self.game_id)
+        self.assertEqual(len(game.players), 1)
+        self.assertEqual(game.get_public_transitions(),
+                         [("step2", 5), ("step3", 5)])
+
+    def test_destroy_game(self):
+        """
+        Destroying a game removes its files.
+        """
+
+        log_file = game_runner.JOURNAL.log_files[self.game_id]
+        game_runner.destroy_game(self.game_id)
+        self.assertTrue(log_file.closed)
+        self.assertNotIn(self.game_id, game_runner.JOURNAL.log_files)
+        self.assertEqual(os.listdir(self.path), [])
+        self.assertEqual(self.restart(), [])
+
+    def test_max_open_logs(self):
+        """
+        Only the logs of the most recently used games are kept open, and
+        the others still get everything written to them.
+        """
+
+        journal = game_runner.JOURNAL
+        journal.max_open_logs = 2
+        game_ids = [self.game_id] + [game_runner.create_game(
+            self.valid_game_def) for _ in range(2)]
+        self.assertEqual(journal.log_files.keys(), game_ids[1:])
+
+        game_runner.add_player(self.game_id)
+        self.assertEqual(journal.log_files.keys(),
+                         [game_ids[2], self.game_id])
+
+        self.restart()
+        self.assertEqual(
+            len(game_runner.get_game(self.game_id).players), 1)
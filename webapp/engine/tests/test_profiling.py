@@ -0,0 +1,141 @@
+"""
+This module contains the tests for profiling actions.
+"""
+
+from unittest import TestCase
+
+from engine import game_runner, profiling
+from engine.game import Game
+from engine.player import Player
+from engine.tests.mock_game.mock_game import MockGame
+
+
+class HistogramTestCase(TestCase):
+
+    """
+    Makes sure histograms count and estimate properly.
+    """
+
+    def test_add(self):
+        """
+        Values are counted into buckets and the percentiles come from the
+        bucket bounds.
+        """
+
+        histogram = profiling.Histogram()
+        self.assertEqual(histogram.percentile(0.5), 0.0)
+        for value in (0.0000015, 0.0000015, 0.0000015, 0.003):
+            histogram.add(value)
+
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.max, 0.003)
+        self.assertAlmostEqual(histogram.percentile(0.5), 0.000002)
+        self.assertAlmostEqual(histogram.percentile(1.0), 0.003)
+
+        # Anything slower than the last bucket still counts.
+        histogram.add(3600)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.percentile(1.0), 3600)
+
+    def test_merge(self):
+        """
+        Histograms survive a round trip through to_dict and can be merged.
+        """
+
+        histogram = profiling.Histogram()
+        histogram.add(0.001)
+        other = profiling.Histogram.from_dict(histogram.to_dict())
+        other.merge(histogram)
+        self.assertEqual(other.count, 2)
+        self.assertAlmostEqual(other.total, 0.002)
+        self.assertEqual(sum(other.counts), 2)
+
+
+class ProfilerTestCase(TestCase):
+
+    """
+    Makes sure make_action reports where its time went.
+    """
+
+    def setUp(self):
+        self.game = MockGame()
+        self.game.set_up()
+        self.player = Player()
+        self.game.register([self.player])
+        self.game.players = [self.player]
+
+    def tearDown(self):
+        profiling.disable()
+
+    def test_disabled(self):
+        """
+        Games aren't profiled by default.
+        """
+
+        self.assertIsNone(Game.profiler)
+        self.assertIsNone(self.game.profiler)
+
+    def test_make_action(self):
+        """
+        Every phase of an action is timed.
+        """
+
+        profiler = profiling.enable()
+        self.assertIs(self.game.profiler, profiler)
+        self.game.phase = None
+        self.game.make_action("restricted_action",
+                              player_id=self.player.game_id)
+        self.game.make_action("test_multi_step",
+                              player=self.player.game_id)
+
+        for key in [("total", "restricted_action"),
+                    ("substitute_kwargs", "restricted_action"),
+                    ("restriction", "restricted_action"),
+                    ("action", "restricted_action"),
+                    ("run", "restricted_action"),
+                    ("is_over", "restricted_action"),
+                    ("commit", "restricted_action"),
+                    ("step", "step1"), ("step", "step2")]:
+            self.assertEqual(profiler.histograms[key].count, 1, key)
+
+        # Every phase fits within the total.
+        phases = sum(profiler.histograms[(x, "restricted_action")].total
+                     for x in ("substitute_kwargs", "action", "run",
+                               "is_over", "commit"))
+        self.assertTrue(
+            phases <= profiler.histograms[("total",
+                                           "restricted_action")].total)
+
+        self.assertIn("restricted_action", profiler.report())
+        self.assertIn("step:step1", profiler.to_dict())
+
+    def test_single_game(self):
+        """
+        A profiler can be set on just one game, and profiles from different
+        places can be merged.
+        """
+
+        self.game.profiler = profiling.Profiler()
+        self.game.make_action("win", player_id=self.player.game_id)
+        self.assertIsNone(Game.profiler)
+
+        merged = profiling.Profiler()
+        merged.merge(self.game.profiler.to_dict())
+        merged.merge(self.game.profiler.to_dict())
+        self.assertEqual(merged.histograms[("total", "win")].count, 2)
+
+    def test_game_runner(self):
+        """
+        The game_runner hands out whatever has been recorded.
+        """
+
+        self.assertEqual(game_runner.get_profile(), {})
+        profiling.enable()
+        game_id = game_runner.create_game("engine/tests/mock_game")
+        try:
+            player_id = game_runner.add_player(game_id)
+            game_runner.make_action(game_id, action_name="win",
+                                    player_id=player_id)
+        finally:
+            game_runner.destroy_game(game_id)
+        self.assertEqual(game_runner.get_profile()["total:win"]["count"], 1)
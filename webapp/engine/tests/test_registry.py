@@ -0,0 +1,103 @@
+"""
+Contains any tests around the registry of game objects.
+"""
+
+from unittest import TestCase
+
+from engine.card import Card
+from engine.game_object import GameObject
+from engine.player import Player
+from engine.registry import Registry, type_name
+from engine.zone import Zone
+
+
+class SpecialCard(Card):
+
+    """
+    A card subclass, which should still get a card id.
+    """
+
+    pass
+
+
+class RegistryTestCase(TestCase):
+
+    """
+    This tests the registry.
+    """
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_type_name(self):
+        """
+        Make sure that subclasses share the ids of cards, zones and players.
+        """
+
+        self.assertEqual(type_name(SpecialCard), "Card")
+        self.assertEqual(type_name(Zone), "Zone")
+        self.assertEqual(type_name(Player), "Player")
+        self.assertEqual(type_name(GameObject), "GameObject")
+
+    def test_register(self):
+        """
+        Make sure each type gets its own ids and we can find objects by them.
+        """
+
+        cards = [Card(), SpecialCard(), Card()]
+        zone = Zone()
+        registered = self.registry.register(cards + [zone])
+        self.assertEqual(registered, cards + [zone])
+        self.assertEqual([x.game_id for x in cards], [1, 2, 3])
+        self.assertEqual(zone.game_id, 1)
+
+        self.assertIs(self.registry.get("Card", 2), cards[1])
+        self.assertIs(self.registry.get("Zone", 1), zone)
+        self.assertIsNone(self.registry.get("Card", 0))
+        self.assertIsNone(self.registry.get("Card", -1))
+        self.assertIsNone(self.registry.get("Card", 4))
+        self.assertIsNone(self.registry.get("Player", 1))
+        self.assertEqual(self.registry.all("Card"), cards)
+        self.assertEqual(self.registry.all("Player"), [])
+
+        # Registering again doesn't change anything
+        self.assertEqual(self.registry.register(cards), [])
+        self.assertEqual(self.registry.next_id("Card"), 4)
+
+    def test_deregister(self):
+        """
+        Make sure that freed ids are reused, smallest first, and never given
+        to two objects at once.
+        """
+
+        cards = [Card() for _ in range(5)]
+        self.registry.register(cards)
+        stranger = Card()
+        stranger.game_id = 2
+        removed = self.registry.deregister([cards[3], cards[1], stranger])
+        self.assertEqual(removed, [cards[3], cards[1]])
+        self.assertIsNone(cards[1].game_id)
+        self.assertIs(self.registry.get("Card", 2), None)
+        self.assertEqual(self.registry.all("Card"),
+                         [cards[0], cards[2], cards[4]])
+        self.assertEqual(self.registry.next_id("Card"), 2)
+
+        new_cards = [Card() for _ in range(3)]
+        self.registry.register(new_cards)
+        self.assertEqual([x.game_id for x in new_cards], [2, 4, 6])
+        ids = [x.game_id for x in self.registry.all("Card")]
+        self.assertEqual(ids, [1, 2, 3, 4, 5, 6])
+
+    def test_clone(self):
+        """
+        Make sure a clone has copies of every object and its own free ids.
+        """
+
+        cards = [Card(), Card()]
+        self.registry.register(cards)
+        self.registry.deregister([cards[0]])
+
+        clone = self.registry.clone(lambda x: x and ("copy", x))
+        self.assertEqual(clone.all("Card"), [("copy", cards[1])])
+        clone.register([Card()])
+        self.assertEqual(self.registry.next_id("Card"), 1)
@@ -0,0 +1,115 @@
+"""
+This module contains the tests for the sharded runner. These start real worker
+processes so keep the number of shards small.
+"""
+
+from unittest import TestCase
+
+import gevent
+from engine import game_runner, sharded_runner
+
+
+class ShardedRunnerTestCase(TestCase):
+
+    """
+    Makes sure the sharded runner behaves like the game_runner.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        sharded_runner.start(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        sharded_runner.stop()
+
+    def setUp(self):
+        self.valid_game_def = "engine/tests/mock_game"
+        self.game_id = sharded_runner.create_game(self.valid_game_def)
+
+    def tearDown(self):
+        sharded_runner.flush()
+
+    def test_create_game(self):
+        """
+        Games get their own ids and are spread over the shards.
+        """
+
+        game_id2 = sharded_runner.create_game(self.valid_game_def)
+        self.assertNotEqual(self.game_id, game_id2)
+        self.assertTrue(sharded_runner.has_game(game_id2))
+        self.assertIsNot(sharded_runner.GAMES[self.game_id][0],
+                         sharded_runner.GAMES[game_id2][0])
+
+        self.assertRaises(IOError, sharded_runner.create_game,
+                          "invalid file")
+
+    def test_concurrent_create_game(self):
+        """
+        Games created while others are waiting on a worker still get their
+        own ids.
+        """
+
+        greenlets = [gevent.spawn(sharded_runner.create_game,
+                                  self.valid_game_def) for _ in range(4)]
+        gevent.joinall(greenlets, raise_error=True)
+        game_ids = [x.value for x in greenlets]
+        self.assertEqual(len(set(game_ids + [self.game_id])), 5)
+        self.assertEqual(sharded_runner.get_num_games(), 5)
+
+    def test_definition_card_catalog(self):
+        """
+        Make sure the catalog of a definition and its version come from the
+        workers.
+        """
+
+        self.assertEqual(
+            sharded_runner.get_definition_version(self.valid_game_def),
+            game_runner.get_definition_version(self.valid_game_def))
+        self.assertEqual(
+            sharded_runner.get_definition_card_catalog(self.valid_game_def),
+            game_runner.get_definition_card_catalog(self.valid_game_def))
+
+    def test_destroy_game(self):
+        """
+        Make sure we can destroy a game and that unknown games raise.
+        """
+
+        sharded_runner.destroy_game(self.game_id)
+        self.assertFalse(sharded_runner.has_game(self.game_id))
+        self.assertRaises(KeyError, sharded_runner.get_state, self.game_id)
+
+    def test_actions(self):
+        """
+        Make sure we can add players, make actions and get the transitions
+        back from a worker.
+        """
+
+        player_id = sharded_runner.add_player(self.game_id)
+        self.assertRaises(ValueError, sharded_runner.add_player, self.game_id)
+        self.assertEqual(len(sharded_runner.get_state(self.game_id)["players"]),
+                         1)
+
+        version = sharded_runner.get_state_version(self.game_id)
+        self.assertEqual((True, None),
+                         sharded_runner.make_action(
+                             self.game_id,
+                             action_name="private_public_action",
+                             player=player_id))
+        self.assertListEqual([("public", "foobar")],
+                             sharded_runner.get_public_transitions(
+                                 self.game_id))
+        self.assertListEqual([("private", "foobaz")],
+                             sharded_runner.get_player_transitions(
+                                 self.game_id, player_id))
+        self.assertListEqual([("public", "foobar"), ("private", "foobaz")],
+                             sharded_runner.get_transitions_since(
+                                 self.game_id, version, player_id))
+        update = sharded_runner.get_action_update(
+            self.game_id, [(version, player_id), (version, None)])
+        self.assertEqual(update["transitions"],
+                         {(version, player_id): [("public", "foobar"),
+                                                 ("private", "foobaz")],
+                          (version, None): [("public", "foobar")]})
+
+        self.assertTrue(sharded_runner.remove_player(self.game_id, player_id))
@@ -0,0 +1,72 @@
+"""
+This module contains the tests for the headless simulation runner.
+"""
+
+from unittest import TestCase
+
+from engine import simulate
+
+
+class SimulateTestCase(TestCase):
+
+    """
+    Makes sure we can play games without a server.
+    """
+
+    def setUp(self):
+        self.valid_game_def = "engine/tests/mock_game"
+
+    def test_run_game(self):
+        """
+        A random agent should find its way to the end of the mock game.
+        """
+
+        stats = simulate.run_game(self.valid_game_def, seed=1)
+        self.assertTrue(stats["finished"])
+        self.assertEqual(stats["actions"], len(stats["latencies"]))
+        self.assertTrue(stats["actions"] > 0)
+
+        # The same seed plays the same game.
+        again = simulate.run_game(self.valid_game_def, seed=1)
+        self.assertEqual(stats["actions"], again["actions"])
+
+    def test_scripted_agent(self):
+        """
+        A scripted agent plays its moves in order and then stops.
+        """
+
+        class Agent(simulate.ScriptedAgent):
+
+            """
+            Makes one move and then wins.
+            """
+
+            script = [("private_public_action", {"player": 1}),
+                      ("win", {"player_id": 1})]
+
+        stats = simulate.run_game(self.valid_game_def, seed=1,
+                                  agent_class=Agent)
+        self.assertTrue(stats["finished"])
+        self.assertEqual(stats["actions"], 2)
+
+    def test_simulate(self):
+        """
+        Make sure the summary adds up.
+        """
+
+        summary = simulate.simulate(self.valid_game_def, 3, processes=1)
+        self.assertEqual(summary["games"], 3)
+        self.assertEqual(summary["finished"], 3)
+        self.assertTrue(summary["latency_ms"]["p50"] <=
+                        summary["latency_ms"]["p100"])
+
+    def test_percentile(self):
+        """
+        Test picking percentiles out of a sorted list.
+        """
+
+        values = range(101)
+        self.assertEqual(simulate.percentile(values, 0.5), 50)
+        self.assertEqual(simulate.percentile(values, 0.99), 99)
+        self.assertEqual(simulate.percentile(values, 1.0), 100)
+        self.assertEqual(simulate.percentile([], 0.5), 0)
@@ -94,3 +94,24 @@ class StatefulGameObjectTestCase(TestCase):
 
         self.assertEqual(10, self.stateful_game_object.get_value("life"))
         self.assertEqual(1, self.stateful_game_object.poison)
+
+    def test_untrack_attribute(self):
+        """
+        Make sure that untracking an attribute only changes that one object
+        and that objects share their defaults until then.
+        """
+
+        other = StatefulGameObject()
+        self.game.register([other])
+        self.assertIs(other.no_track_attributes,
+                      self.stateful_game_object.no_track_attributes)
+        self.assertIsNone(other.player_specific_attributes)
+
+        self.stateful_game_object.untrack_attribute("internal")
+        self.stateful_game_object.internal = 1
+        other.internal = 2
+
+        self.assertEqual(self.game.get_public_transitions(),
+                         [("set", "None", other.game_id, "internal", 2)])
+        self.assertIs(other.no_track_attributes,
+                      StatefulGameObject.no_track_attributes)
@@ -0,0 +1,65 @@
+"""
+This module contains all the tests for the transition helpers.
+"""
+
+from unittest import TestCase
+
+from engine.transitions import coalesce_transitions
+
+
+class CoalesceTransitionsTestCase(TestCase):
+
+    """
+    Make sure that coalescing transitions gets rid of everything redundant
+    and nothing else.
+    """
+
+    def test_repeated_sets(self):
+        """
+        Only the last value of an attribute should be kept.
+        """
+
+        transitions = [("set", "Player", 1, "money_pool", 1),
+                       ("set", "Card", 1, "face_up", True),
+                       ("set", "Player", 1, "money_pool", 3),
+                       ("set", "Player", 2, "money_pool", 2),
+                       ("Phase", "buy", 1),
+                       ("set", "Card", 1, "face_up", False)]
+
+        self.assertListEqual(coalesce_transitions(transitions),
+                             [("set", "Player", 1, "money_pool", 3),
+                              ("set", "Player", 2, "money_pool", 2),
+                              ("Phase", "buy", 1),
+                              ("set", "Card", 1, "face_up", False)])
+
+    def test_remove_then_add(self):
+        """
+        Removing a card and then adding it somewhere else is a move.
+        """
+
+        transitions = [("remove", 1),
+                       ("set", "Card", 1, "face_up", True),
+                       ("add", 1, 3),
+                       ("add", 2, 3),
+                       ("remove", 2)]
+
+        self.assertListEqual(coalesce_transitions(transitions),
+                             [("set", "Card", 1, "face_up", True),
+                              ("move", 1, 3),
+                              ("add", 2, 3),
+                              ("remove", 2)])
+
+        # A bulk move in between means the add isn't just the other half
+        transitions = [("remove", 1),
+                       ("bulk_move", [1, 2], 4),
+                       ("add", 1, 3)]
+        self.assertListEqual(coalesce_transitions(transitions), transitions)
+
+    def test_leaves_other_transitions(self):
+        """
+        Anything that isn't redundant should come back untouched.
+        """
+
+        transitions = [("step1",), ["start", 1], ("is_over", [1]), ()]
+        self.assertListEqual(coalesce_transitions(transitions), transitions)
+        self.assertListEqual(coalesce_transitions([]), [])
@@ -89,6 +89,27 @@ class ZoneTestCase(TestCase):
         self.assertFalse(temp == self.zone.get_cards())
         self.assertEqual(len(temp), len(self.zone.get_cards()))
 
+    def test_seeded_shuffle(self):
+        """
+        Zones in games with the same seed shuffle the same way.
+        """
+
+        orders = []
+        for _ in range(2):
+            game = Game()
+            game.seed_random(42)
+            zone = Zone()
+            game.register([zone])
+            cards = [Card() for _ in range(20)]
+            game.register(cards)
+            for card in cards:
+                zone.add_card(card)
+            zone.shuffle()
+            orders.append([x.game_id for x in zone.get_cards()])
+
+        self.assertEqual(orders[0], orders[1])
+        self.assertNotEqual(orders[0], range(1, 21))
+
     def test_get_num_cards(self):
         """
         Test getting the number of cards in the zone.
@@ -226,3 +247,67 @@ class ZoneTestCase(TestCase):
         cards = []
         self.zone.set_cards(cards)
         self.assertListEqual(self.zone.get_cards(), cards)
+        self.assertIsNone(self.card1.zone)
+
+    def test_set_cards_transitions(self):
+        """
+        Make sure that set_cards records a single transition for the cards
+        that were removed and one for the cards that were added, and that
+        cards are taken out of the zone they were in.
+        """
+
+        game = Game()
+        other_zone = Zone()
+        game.register([self.zone, other_zone])
+        game.register([self.card1, self.card2, self.card3])
+
+        other_zone.push(self.card3)
+        self.zone.set_cards([self.card1, self.card2])
+        game.flush_transitions()
+
+        self.zone.set_cards([self.card3])
+        self.assertListEqual(self.zone.get_cards(), [self.card3])
+        self.assertNotIn(self.card3, other_zone)
+        self.assertEqual(self.card3.zone, self.zone)
+        self.assertIsNone(self.card1.zone)
+        self.assertListEqual(game.get_public_transitions(),
+                             [("bulk_move", [2, 1], None),
+                              ("bulk_move", [3], 1)])
+
+    def test_transfer(self):
+        """
+        Make sure that we can move some or all of the cards to another zone
+        with a single transition.
+        """
+
+        game = Game()
+        other_zone = Zone()
+        game.register([self.zone, other_zone])
+        game.register([self.card1, self.card2, self.card3])
+
+        self.zone.set_cards([self.card3, self.card2, self.card1])
+        game.flush_transitions()
+
+        moved = self.zone.transfer([self.card3, self.card1, Card()],
+                                   other_zone)
+        self.assertListEqual(moved, [self.card3, self.card1])
+        self.assertListEqual(other_zone.get_cards(), [self.card3, self.card1])
+        self.assertListEqual(self.zone.get_cards(), [self.card2])
+        self.assertEqual(self.card1.zone, other_zone)
+        self.assertListEqual(game.get_public_transitions(),
+                             [("bulk_move", [3, 1], 2)])
+        game.flush_transitions()
+
+        moved = other_zone.move_all(self.zone)
+        self.assertListEqual(moved, [self.card3, self.card1])
+        self.assertListEqual(self.zone.get_cards(),
+                             [self.card2, self.card3, self.card1])
+        self.assertEqual(other_zone.get_num_cards(), 0)
+        self.assertListEqual(game.get_public_transitions(),
+                             [("bulk_move", [3, 1], 1)])
+        game.flush_transitions()
+
+        # Nothing to move means no transitions
+        self.assertListEqual(other_zone.move_all(self.zone), [])
+        self.assertListEqual(self.zone.transfer([], other_zone), [])
+        self.assertListEqual(game.get_public_transitions(), [])
@@ -0,0 +1,51 @@
+"""
+This module contains helpers for working with the lists of transitions that
+a game records.
+"""
+
+
+def coalesce_transitions(transitions):
+    """
+    Takes in a list of transitions and returns an equivalent, shorter list.
+    Specifically:
+
+        * If the same attribute on the same object is set more than once
+          only the last ("set", ...) is kept, in the place of the last one.
+        * A ("remove", card) followed later by an ("add", card, zone) for the
+          same card becomes a single ("move", card, zone) in the place of the
+          add.
+
+    Everything else is left alone and in the same order.
+    """
+
+    result = list(transitions)
+    dropped = set()
+    # (type, id, attribute) -> index of the last set for it
+    last_set = {}
+    # card id -> index of a remove that hasn't been followed by an add
+    pending_remove = {}
+
+    for i, trans in enumerate(transitions):
+        if len(trans) == 0:
+            continue
+        kind = trans[0]
+
+        if kind == "set" and len(trans) == 5:
+            key = (trans[1], trans[2], trans[3])
+            if key in last_set:
+                dropped.add(last_set[key])
+            last_set[key] = i
+        elif kind == "remove" and trans[1] is not None:
+            pending_remove[trans[1]] = i
+        elif kind == "add" and trans[1] is not None:
+            removed_at = pending_remove.pop(trans[1], None)
+            if removed_at is not None:
+                dropped.add(removed_at)
+                result[i] = ("move", trans[1], trans[2])
+        elif kind == "bulk_move":
+            for card_id in trans[1]:
+                pending_remove.pop(card_id, None)
+
+    if len(dropped) == 0:
+        return result
+    return [x for i, x in enumerate(result) if i not in dropped]
@@ -2,8 +2,7 @@
 This module provides the Zone class.
 """
 
-import random
-
+from engine.card_stack import CardStack
 from engine.game_object import GameObject
 
 
@@ -13,13 +12,15 @@ class Zone(GameObject):
     A Zone basically represents a region of the game. A zone has a
     collection of cards, and several other attributes that define how
     the zone interacts with the cards. The constructor can take in an optional
-    dictonary that defines specific attributes to be set on the zone.
+    dictonary that defines specific attributes to be set on the zone. The cards
+    are kept in a CardStack so checking for and removing a card doesn't depend
+    on the number of cards in the zone.
     """
 
     def __init__(self, config=None):
         super(Zone, self).__init__()
         self.region_id = None
-        self.cards = []
+        self.cards = CardStack()
 
         if config is None:
             config = {}
@@ -38,6 +39,7 @@ class Zone(GameObject):
             return False
 
         self.cards.append(card)
+        self.invalidate_dict_cache()
 
         if self.game is not None:
             self.game.add_transition(("add",
@@ -55,6 +57,7 @@ class Zone(GameObject):
 
         if card in self.cards:
             self.cards.remove(card)
+            self.invalidate_dict_cache()
             if self.game is not None:
                 self.game.add_transition(("remove", card.game_id))
             card.zone = None
@@ -77,6 +80,7 @@ class Zone(GameObject):
 
         if len(self.cards) > 0:
             card = self.cards.pop()
+            self.invalidate_dict_cache()
             if self.game is not None:
                 self.game.add_transition(("remove", card.game_id))
             card.zone = None
@@ -90,35 +94,112 @@ class Zone(GameObject):
         This is an ordered operation.
         """
 
-        if len(self.cards) > 0:
-            return self.cards[-1]
-
-        return None
+        return self.cards.peek()
 
     def get_cards(self):
         """
-        Get a list of all the cards in this zone.
+        Get a list of all the cards in this zone, from the bottom to the
+        top. Changing the list won't change the zone.
         """
 
-        return self.cards
+        return self.cards.to_list()
 
     def set_cards(self, cards):
         """
-        Sets the list of all cards. Sometimes faster to do than
-        push each individual one.
+        Sets the list of all cards, with the first card in the list ending up
+        on top. Any cards currently in the zone are removed and the new cards
+        are taken out of whatever zone they're in. This is done in one go and
+        only records a single bulk_move transition for the removed cards and
+        one for the new cards.
         """
 
-        # Remove all current cards
-        while len(self.cards) > 0:
-            self.pop()
+        removed = self.cards.to_list()
+        self.cards.clear()
+        self.invalidate_dict_cache()
+        for card in removed:
+            card.zone = None
+        self.add_bulk_transition(removed, None)
 
         # Since we're pushing onto a stack we actually need to reverse
         # these cards.
         cards.reverse()
 
-        # Add all the new cards
+        new_cards = []
         for card in cards:
-            self.push(card)
+            if card is None or card in self.cards:
+                continue
+            if card.zone is not None and card in card.zone:
+                card.zone.cards.remove(card)
+                card.zone.invalidate_dict_cache()
+            self.cards.append(card)
+            new_cards.append(card)
+
+        self.place_cards(new_cards)
+
+    def transfer(self, cards, target):
+        """
+        Move some of the cards in this zone onto the top of the target zone,
+        keeping the order they are given in. Cards that aren't in this zone are
+        ignored. Records a single bulk_move transition and returns the list of
+        cards that were moved.
+        """
+
+        moved = []
+        for card in cards:
+            if card is not None and card in self.cards:
+                self.cards.remove(card)
+                moved.append(card)
+
+        if len(moved) > 0:
+            self.invalidate_dict_cache()
+            for card in moved:
+                target.cards.append(card)
+            target.place_cards(moved)
+
+        return moved
+
+    def move_all(self, target):
+        """
+        Move every card in this zone onto the top of the target zone, keeping
+        their order. Records a single bulk_move transition and returns the
+        list of cards that were moved.
+        """
+
+        if target is self:
+            return []
+
+        moved = self.cards.to_list()
+        self.cards.clear()
+        self.invalidate_dict_cache()
+        for card in moved:
+            target.cards.append(card)
+        target.place_cards(moved)
+        return moved
+
+    def place_cards(self, cards):
+        """
+        Finish off adding cards that have just been put into self.cards: point
+        them at this zone and record the bulk_move transition.
+        """
+
+        self.invalidate_dict_cache()
+        for card in cards:
+            card.zone = self
+        self.add_bulk_transition(cards, self)
+
+    def add_bulk_transition(self, cards, target):
+        """
+        Record that all the cards were moved to target (or removed from play
+        if target is None) as a single transition.
+        """
+
+        if self.game is None or len(cards) == 0:
+            return
+
+        target_id = None if target is None else target.game_id
+        self.game.add_transition(("bulk_move",
+                                  [x.game_id for x in cards],
+                                  target_id))
 
     def get_info(self):
         """
@@ -134,10 +215,15 @@ class Zone(GameObject):
 
     def shuffle(self):
         """
-        Shuffle the cards in this zone.
+        Shuffle the cards in this zone. Uses the game's random number
+        generator if the zone belongs to a game.
         """
 
-        random.shuffle(self.cards)
+        if self.game is not None:
+            self.cards.shuffle(self.game.random.shuffle)
+        else:
+            self.cards.shuffle()
+        self.invalidate_dict_cache()
 
     def get_num_cards(self):
         """
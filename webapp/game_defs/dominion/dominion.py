@@ -4,7 +4,6 @@ This module provides an implementation of a game of Dominion
 """
 
 import math
-import random
 
 from engine.game import action, Game, game_step
 
@@ -57,9 +56,10 @@ class Dominion(Game):
                           ]
 
         # Select 10 random kindom cards
-        all_kingdom_cards = [x for x in self.card_set.all_cards() if
-                             x["kingdom_card"]]
-        kingdom_cards = sorted(random.sample(all_kingdom_cards, 10),
+        all_kingdom_cards = sorted((x for x in self.card_set.all_cards() if
+                                    x["kingdom_card"]),
+                                   key = lambda x: x["name"])
+        kingdom_cards = sorted(self.random.sample(all_kingdom_cards, 10),
                                key = lambda x: x["cost"], reverse = True)
         kingdom_cards = [x["name"] for x in kingdom_cards]
         kingdom_cards = [(name, 'kingdom' + str(i), 10)
@@ -79,7 +79,7 @@ class Dominion(Game):
             player.protected = False
             deck = (self.card_set.create("Copper", 7) +
                     self.card_set.create("Estate", 3))
-            random.shuffle(deck)
+            self.random.shuffle(deck)
             player.deck.set_cards(deck)
             self.register(deck)
             # We can resue the clean up step here
@@ -272,11 +272,9 @@ class Dominion(Game):
             if player.discard.get_num_cards() == 0:
                 return None
             # Trigger a reshuffle
-            while player.discard.get_num_cards() > 0:
-                card = player.discard.pop()
+            for card in player.discard.move_all(player.deck):
                 card.face_up = False
                 card.set_value("face_up", False, player)
-                player.deck.push(card)
             player.deck.shuffle()
         return player.deck.pop()
 
@@ -207,7 +207,8 @@ function updateEventBox(data) {
     _data = getEventData(data);
     transitions = {
         "start": updateEventBoxStartTransition,
-        "add": updateEventBoxAddTransition
+        "add": updateEventBoxAddTransition,
+        "move": updateEventBoxAddTransition
     };
 
     // If there is a phase transition, we can ignore other transitions
@@ -39,6 +39,20 @@ class DominionTestCase(TestCase):
         self.assertEqual(self.player1.hand.get_num_cards(), 5)
         self.assertEqual(self.player1.deck.get_num_cards(), 5)
 
+    def test_seeded_set_up(self):
+        game, config = load_game_definition("game_defs/dominion")
+        game.load_config(config)
+        game.add_player()
+        game.add_player()
+
+        self.game.seed_random(99)
+        game.seed_random(99)
+        self.game.set_up()
+        game.set_up()
+
+        # Same kingdom and the same starting hands
+        self.assertEqual(self.game.get_state(), game.get_state())
+
     def test_cellar(self):
         cellars = self.create_cards("Cellar", 5)
         coppers = self.create_cards("Copper", 4)
@@ -32,7 +32,7 @@ function updateEventBox(data) {
     console.log("parsing");
     _.each(_data.transitions, function(transition) {
         console.log(transition);
-        if (transition[0] === "add") {
+        if (transition[0] === "add" || transition[0] === "move") {
             updateEventBoxAddTransition(transition, _data, eventbox);
         }
         if (transition[0] === "start") {
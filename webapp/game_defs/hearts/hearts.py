@@ -44,8 +44,6 @@ class Hearts(Game):
         self.is_first_turn = True
 
     def set_up(self):
-        import random
-
         # We need enough players to start
         if(len(self.players) < self.min_players):
             return
@@ -57,7 +55,7 @@ class Hearts(Game):
                  for x in SUITS for y in range(2, 15)]
         self.register(all_cards)
 
-        random.shuffle(all_cards)
+        self.random.shuffle(all_cards)
 
         # Deal out among the players
         while len(all_cards) >= len(self.players):
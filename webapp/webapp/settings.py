@@ -105,3 +105,19 @@ LETTUCE_APPS = (
 JENKINS_TASKS = ('django_jenkins.tasks.run_pylint',)
 
 GAME_DEFINITION_PATH = 'game_defs/'
+
+# The number of worker processes to spread games over. With 0 every game runs
+# inside the server process.
+GAME_RUNNER_SHARDS = 0
+
+# If set, games are saved to this directory and restored when the server
+# restarts. Only used when games run inside the server process.
+GAME_STATE_PATH = None
+
+# If set, the socket server serves its metrics on this port of localhost.
+METRICS_PORT = None
+
+# How many messages, and how many bytes, can wait to be sent to a single
+# client. A client that falls further behind is told to resync instead.
+SOCKET_QUEUE_MAX_MESSAGES = 256
+SOCKET_QUEUE_MAX_BYTES = 4 * 1024 * 1024